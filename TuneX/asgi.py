@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TuneX.settings')
+os.environ.setdefault('TUNEX_ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+# What get_asgi_application() does, with a handler that can stream the
+# async views' pages (music/asgi.py).
+django.setup(set_prefix=False)
+
+from music.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
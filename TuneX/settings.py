@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'music.timing.server_timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +56,7 @@ ROOT_URLCONF = 'TuneX.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'music.timing.TimedDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR , 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,6 +65,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'music.context_processors.sidebar_playlists',
+                'music.context_processors.deezer_status',
             ],
         },
     },
@@ -71,6 +74,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'TuneX.wsgi.application'
 
+# Serve the Deezer-bound views from music/async_views.py. TuneX/asgi.py
+# turns this on; under WSGI the sync views in music/views.py are used.
+ASYNC_VIEWS = os.environ.get('TUNEX_ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -146,3 +153,105 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Deezer API client (music/deezer.py)
+# One pooled keep-alive session is shared by every view in the process.
+
+DEEZER_API_URL = os.environ.get('DEEZER_API_URL', 'https://api.deezer.com')
+DEEZER_POOL_SIZE = 20               # Max keep-alive connections kept per host
+DEEZER_CONNECT_TIMEOUT = 3.05       # Seconds
+DEEZER_READ_TIMEOUT = 10            # Seconds
+DEEZER_MAX_RETRIES = 2              # Retries on connection errors, 429 and 5xx
+DEEZER_RETRY_BACKOFF = 0.3          # Backoff factor between retries (0.3s, 0.6s, ...)
+DEEZER_FANOUT_WORKERS = 16          # Threads used to run independent Deezer calls concurrently
+DEEZER_FANOUT_DEADLINE = 8          # Seconds a page waits for all of its concurrent calls
+DEEZER_ASYNC_MAX_CONNECTIONS = 200  # In-flight connections of the async client (ASGI)
+
+# Circuit breaker around every Deezer call (music/circuit_breaker.py). It
+# opens after DEEZER_BREAKER_FAILURE_THRESHOLD consecutive failures (network
+# errors, 429/5xx, or calls slower than DEEZER_BREAKER_SLOW_CALL_SECONDS);
+# while open, calls fail fast and views serve cached payloads. One probe
+# call is let through every DEEZER_BREAKER_RESET_TIMEOUT seconds.
+DEEZER_BREAKER_FAILURE_THRESHOLD = 5
+DEEZER_BREAKER_SLOW_CALL_SECONDS = 5
+DEEZER_BREAKER_RESET_TIMEOUT = 30
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tunex-default',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Chart and editorial payloads are the same for every user. Entries are
+# served fresh for their TTL, then served stale while one background
+# refresh runs (music/caching.py).
+DEEZER_CACHE_TTLS = {
+    'chart': 15 * 60,               # /chart/0/artists, /chart/0/tracks, /chart/0/playlists
+    'editorial': 60 * 60,           # /editorial/0/releases
+}
+DEEZER_CACHE_STALE_TTL = 24 * 60 * 60  # How long a stale copy may still be served
+DEEZER_LAST_GOOD_TTL = 7 * 24 * 60 * 60  # Artist/playlist copies kept for when Deezer is down
+
+# Per-process autocomplete cache for /api/search/ (music/search_cache.py)
+SEARCH_CACHE_MAX_ENTRIES = 2000     # LRU size, in normalized queries
+SEARCH_CACHE_TTL = 5 * 60           # Seconds
+SEARCH_CACHE_PREFIX_MIN_MATCHES = 5 # Tracks a longer cached query must still match to answer a shorter one
+
+# Track payloads rendered on chart/search/artist/playlist pages, used to
+# create Song rows on like/add-to-playlist without a /track fetch.
+TRACK_PAYLOAD_CACHE_TTL = 6 * 60 * 60
+
+# Fresh preview URLs (music/preview_cache.py) are cached until
+# PREVIEW_URL_EXPIRY_MARGIN seconds before their signed 'exp=' timestamp.
+PREVIEW_URL_EXPIRY_MARGIN = 60
+PREVIEW_URL_DEFAULT_TTL = 10 * 60   # For preview URLs without an embedded expiry
+
+# Per-user sidebar playlist list (music/context_processors.py). Invalidated
+# by signals on playlist create/rename/delete; the TTL is only a backstop.
+SIDEBAR_PLAYLISTS_CACHE_TTL = 24 * 60 * 60
+
+# Keyset-paginated song lists (user playlists, liked songs): rows per page,
+# and the most a client may ask for with ?limit=.
+PLAYLIST_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+
+# Per-user liked Deezer IDs as a sorted int array (music/liked_cache.py),
+# reloaded after a like/unlike commits. On a cache miss, track lists of at most
+# LIKED_IDS_IN_QUERY_MAX tracks are checked with an IN query instead.
+LIKED_IDS_CACHE_TTL = 24 * 60 * 60
+LIKED_IDS_IN_QUERY_MAX = 10
+
+# Local full-text search over the Song catalog (music/local_search.py).
+# Once local hits exist, searches wait at most SEARCH_LOCAL_DEEZER_DEADLINE
+# seconds for Deezer before answering with what they have. Shorter terms
+# than SEARCH_LOCAL_MIN_TERM_LENGTH are ignored; None means 2, or on MySQL
+# the server's innodb_ft_min_token_size (3 by default).
+SEARCH_LOCAL_DEEZER_DEADLINE = 1.5
+SEARCH_LOCAL_MIN_TERM_LENGTH = None
+SEARCH_LOCAL_CANDIDATES_FACTOR = 3  # Candidates fetched per result, re-ranked to put liked songs first
+
+# In-process prefix index for instant autocomplete (music/prefix_index.py),
+# built per worker from the Song catalog and chart data. Entries past this
+# estimated size are skipped. A song takes about 650 bytes: 100k songs need
+# ~65MB, 1M songs ~650MB per worker.
+AUTOCOMPLETE_INDEX_MEMORY_MB = 768
+
+# Per-request timing breakdown (music/timing.py): Server-Timing header and
+# one JSON log line per request. Requests slower than REQUEST_TIMING_SLOW_MS
+# are logged with their individual Deezer calls and slowest queries, and the
+# slowest REQUEST_TIMING_SLOW_SAMPLES are listed in /api/deezer/stats/.
+REQUEST_TIMING_SLOW_MS = 1000
+REQUEST_TIMING_SLOW_SAMPLES = 20
+
+# Prometheus metrics at /metrics (music/metrics.py). With METRICS_DIR set,
+# every worker writes its values there each METRICS_FLUSH_SECONDS and
+# /metrics reports the sum over the workers of the host. When METRICS_TOKEN
+# is set, scrapers must send it as a bearer token.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
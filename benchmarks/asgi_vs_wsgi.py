@@ -0,0 +1,122 @@
+"""
+Throughput of the Deezer-bound views under WSGI (sync views, gunicorn sync
+workers) and ASGI (async views, uvicorn workers) at the same worker count,
+against the local Deezer stub with a fixed upstream latency.
+
+    pip install gunicorn uvicorn httpx
+    python -m benchmarks.asgi_vs_wsgi --workers 2 --concurrency 100 --latency-ms 200
+
+Prints one JSON object per server with throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.deezer_stub import start_stub
+from benchmarks.stats import summarize
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'TuneX.wsgi:application',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'TuneX.asgi:application',
+        '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/login/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+async def drive(base_url, path_template, total_requests, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path_template.format(i=i))
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, elapsed, errors)
+
+
+def run_server(mode, args, stub_url):
+    port = free_port()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=args.settings, DEEZER_API_URL=stub_url)
+    env.pop('TUNEX_ASYNC_VIEWS', None)
+    process = subprocess.Popen(SERVERS[mode](port, args.workers), cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+        asyncio.run(drive(base_url, args.path, min(args.concurrency, args.requests), args.concurrency))  # warm-up
+        result = asyncio.run(drive(base_url, args.path, args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    result.update({'server': mode, 'workers': args.workers, 'concurrency': args.concurrency,
+                   'upstream_latency_ms': args.latency_ms, 'path': args.path})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--path', default='/api/search/?q=bench{i}',
+                        help="Request path; '{i}' is replaced by the request number.")
+    parser.add_argument('--settings', default='TuneX.settings', help="DJANGO_SETTINGS_MODULE for the servers.")
+    parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    stub = start_stub(latency_ms=args.latency_ms)
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    try:
+        for mode in args.servers:
+            print(json.dumps(run_server(mode, args, stub_url)), flush=True)
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Local stand-in for api.deezer.com used by the benchmarks.
+
+Serves small canned payloads for the endpoints TuneX calls, after an
+artificial delay, so that view throughput can be measured without touching
+the real API. Point the app at it with DEEZER_API_URL=http://127.0.0.1:<port>.
+
+Faults can be injected: a fraction of requests answered with an HTTP
+error status (--error-rate, --error-status) and a fraction delayed by an
+extra --slow-ms (--slow-rate). Both are drawn from a seeded generator so
+that runs are reproducible.
+
+    python -m benchmarks.deezer_stub --port 8765 --latency-ms 200 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def _track(track_id):
+    return {
+        'id': track_id, 'type': 'track', 'title': f"Track {track_id}", 'title_short': f"Track {track_id}",
+        'duration': 180 + track_id % 60, 'rank': 900000 - track_id,
+        'preview': f"https://cdns-preview.example/stream/{track_id}.mp3?hdnea=exp={int(time.time()) + 900}~acl=*~hmac=0",
+        'artist': {'id': track_id % 50 + 1, 'name': f"Artist {track_id % 50 + 1}", 'picture_medium': 'https://e-cdns-images.example/artist.jpg'},
+        'album': {'id': track_id % 200 + 1, 'title': f"Album {track_id % 200 + 1}", 'cover_medium': 'https://e-cdns-images.example/cover.jpg'},
+    }
+
+
+def _artist(artist_id):
+    return {
+        'id': artist_id, 'type': 'artist', 'name': f"Artist {artist_id}",
+        'picture_small': 'https://e-cdns-images.example/artist_s.jpg', 'picture_medium': 'https://e-cdns-images.example/artist.jpg',
+        'picture_big': 'https://e-cdns-images.example/artist_b.jpg', 'picture_xl': 'https://e-cdns-images.example/artist_xl.jpg',
+        'nb_album': 12, 'nb_fan': 123456, 'link': f"https://www.deezer.com/artist/{artist_id}",
+    }
+
+
+def _album(album_id):
+    return {
+        'id': album_id, 'type': 'album', 'title': f"Album {album_id}", 'cover_medium': 'https://e-cdns-images.example/cover.jpg',
+        'release_date': '2025-01-01', 'link': f"https://www.deezer.com/album/{album_id}", 'artist': _artist(album_id % 50 + 1),
+    }
+
+
+def _playlist(playlist_id, nb_tracks=50):
+    return {
+        'id': playlist_id, 'type': 'playlist', 'title': f"Playlist {playlist_id}", 'description': '', 'duration': nb_tracks * 200,
+        'nb_tracks': nb_tracks, 'fans': 1000, 'link': f"https://www.deezer.com/playlist/{playlist_id}",
+        'picture_small': 'https://e-cdns-images.example/pl_s.jpg', 'picture_medium': 'https://e-cdns-images.example/pl.jpg',
+        'picture_big': 'https://e-cdns-images.example/pl_b.jpg', 'picture_xl': 'https://e-cdns-images.example/pl_xl.jpg',
+        'creator': {'id': 1, 'name': 'Deezer'}, 'user': {'id': 1, 'name': 'Deezer'},
+        'tracks': {'data': [_track(playlist_id * 1000 + i) for i in range(1, nb_tracks + 1)]},
+    }
+
+
+def _limit(query, default=25):
+    try:
+        return max(0, min(int(query.get('limit', [default])[0]), 100))
+    except ValueError:
+        return default
+
+
+ROUTES = [
+    (re.compile(r'^/chart/0/tracks$'), lambda m, q: {'data': [_track(i) for i in range(1, _limit(q, 10) + 1)]}),
+    (re.compile(r'^/chart/0/artists$'), lambda m, q: {'data': [_artist(i) for i in range(1, _limit(q, 10) + 1)]}),
+    (re.compile(r'^/chart/0/playlists$'), lambda m, q: {'data': [_playlist(i, 0) for i in range(1, _limit(q, 10) + 1)]}),
+    (re.compile(r'^/editorial/0/releases$'), lambda m, q: {'data': [_album(i) for i in range(1, _limit(q, 20) + 1)]}),
+    (re.compile(r'^/search$'), lambda m, q: {'data': [_track(i) for i in range(1, _limit(q) + 1)]}),
+    (re.compile(r'^/search/artist$'), lambda m, q: {'data': [_artist(i) for i in range(1, _limit(q) + 1)]}),
+    (re.compile(r'^/search/album$'), lambda m, q: {'data': [_album(i) for i in range(1, _limit(q) + 1)]}),
+    (re.compile(r'^/artist/(\d+)$'), lambda m, q: _artist(int(m.group(1)))),
+    (re.compile(r'^/artist/(\d+)/top$'), lambda m, q: {'data': [_track(int(m.group(1)) * 100 + i) for i in range(1, _limit(q, 10) + 1)]}),
+    (re.compile(r'^/playlist/(\d+)$'), lambda m, q: _playlist(int(m.group(1)))),
+    (re.compile(r'^/track/(\d+)$'), lambda m, q: _track(int(m.group(1)))),
+]
+
+
+class DeezerStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    error_rate = 0.0
+    error_status = 503
+    slow_rate = 0.0
+    slow_latency = 0.0
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def _draw_faults(self):
+        if not (self.error_rate or self.slow_rate):
+            return False, False
+        with self.rng_lock:
+            return self.rng.random() < self.error_rate, self.rng.random() < self.slow_rate
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        fail, slow = self._draw_faults()
+        delay = self.latency + (self.slow_latency if slow else 0.0)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send(self.error_status, {'error': {'type': 'Exception', 'message': 'injected failure', 'code': 0}})
+            return
+        for pattern, handler in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                payload = handler(match, query)
+                break
+        else:
+            payload = {'error': {'type': 'DataException', 'message': 'no data', 'code': 800}}
+        self._send(200, payload)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DeezerStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_stub(port=0, latency_ms=0, error_rate=0.0, error_status=503, slow_rate=0.0, slow_ms=0, seed=0):
+    """Starts the stub on a background thread and returns the server."""
+    handler = type('ConfiguredDeezerStubHandler', (DeezerStubHandler,), {
+        'latency': latency_ms / 1000.0,
+        'error_rate': error_rate, 'error_status': error_status,
+        'slow_rate': slow_rate, 'slow_latency': slow_ms / 1000.0,
+        'rng': random.Random(seed), 'rng_lock': threading.Lock(),
+    })
+    server = DeezerStubServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, name='deezer-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with --error-status.")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fraction of requests delayed by an extra --slow-ms.")
+    parser.add_argument('--slow-ms', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = start_stub(args.port, args.latency_ms, args.error_rate, args.error_status, args.slow_rate, args.slow_ms, args.seed)
+    print(f"Deezer stub listening on http://127.0.0.1:{server.server_port} (latency {args.latency_ms}ms, "
+          f"errors {args.error_rate:.0%}, slow {args.slow_rate:.0%} +{args.slow_ms}ms)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Build time, memory estimate and lookup latency of the autocomplete prefix
+index (music/prefix_index.py) at catalog scale, with synthetic entries.
+
+    python -m benchmarks.prefix_index_bench --entries 1000000 --memory-mb 768
+
+Prints one JSON object. Queries are random 1-6 character prefixes of
+indexed titles, so short, very unselective prefixes are included. They run
+twice: the first pass includes collecting the top-k list of each broad
+prefix on first use, the second (warm_*) is the steady state.
+"""
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from music.prefix_index import PrefixIndex  # noqa: E402
+
+from benchmarks.stats import percentile  # noqa: E402
+
+SYLLABLES = ['la', 'ra', 'mo', 'ne', 'ti', 'ko', 'sa', 'vi', 'du', 'pe', 'an', 'or', 'el', 'us', 'ix', 'ba', 'ze']
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+
+def synthetic_tracks(count, seed):
+    rng = random.Random(seed)
+    artists = [' '.join(word(rng) for _ in range(rng.randint(1, 2))).title() for _ in range(max(1, count // 20))]
+    for i in range(count):
+        title = ' '.join(word(rng) for _ in range(rng.randint(1, 5))).capitalize()
+        yield (i + 1, title, rng.choice(artists), None, f"{rng.randint(1, 6)}:{rng.randint(0, 59):02d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=1_000_000)
+    parser.add_argument('--memory-mb', type=int, default=768)
+    parser.add_argument('--lookups', type=int, default=10_000)
+    parser.add_argument('--inserts', type=int, default=10_000,
+                        help="Incremental add_track() calls timed after the bulk load.")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    tracks = list(synthetic_tracks(args.entries, args.seed))
+    extra_tracks = [(args.entries + track[0],) + track[1:] for track in synthetic_tracks(args.inserts, args.seed + 1)]
+
+    index = PrefixIndex(args.memory_mb * 1024 * 1024)
+    start = time.perf_counter()
+    index.bulk_load(tracks=tracks)
+    index.warm_up()
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for track in extra_tracks:
+        index.add_track(*track)
+    insert_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    titles = [track[1] for track in tracks[:50_000]]
+    queries = [rng.choice(titles)[:rng.randint(1, 6)] or rng.choice(string.ascii_lowercase) for _ in range(args.lookups)]
+    latencies, warm_latencies = [], []
+    for timings in (latencies, warm_latencies):
+        for query in queries:
+            start = time.perf_counter()
+            index.lookup(query)
+            timings.append(time.perf_counter() - start)
+
+    print(json.dumps(dict(
+        index.get_stats(),
+        build_s=round(build_s, 2),
+        insert_us=round(insert_s / max(args.inserts, 1) * 1e6, 1),
+        lookups=len(latencies),
+        p50_us=round(statistics.median(latencies) * 1e6, 1),
+        p95_us=round(percentile(latencies, 95) * 1e6, 1),
+        p99_us=round(percentile(latencies, 99) * 1e6, 1),
+        max_ms=round(max(latencies) * 1e3, 1),
+        warm_p50_us=round(statistics.median(warm_latencies) * 1e6, 1),
+        warm_p99_us=round(percentile(warm_latencies, 99) * 1e6, 1),
+    )))
+
+
+if __name__ == '__main__':
+    main()
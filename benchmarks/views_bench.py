@@ -0,0 +1,240 @@
+"""
+Latency and throughput of the main views against the local Deezer stub.
+
+Each scenario drives one view through the full Django stack (middleware,
+sessions, templates) with the test client, from --concurrency threads,
+each logged in as its own user. The app runs against a throwaway test
+database. Each scenario starts with a fresh cache and a closed Deezer
+circuit breaker, and a warm-up pass runs before the measured one.
+
+    python -m benchmarks.views_bench --concurrency 8 --requests 400 --latency-ms 50
+    python -m benchmarks.views_bench --error-rate 0.05 --output after.json --baseline before.json
+
+Prints one JSON object per scenario on stdout; anything the app prints
+goes to stderr. --output also writes every result, plus the commit and
+run parameters, to a file. --baseline compares the run with such a file,
+adding the change in percent per metric.
+
+SQLite serializes writers, so the like/add-to-playlist scenarios can
+report "database is locked" errors at higher concurrency there; point
+--settings at a MySQL configuration for representative write numbers.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ARTIST_IDS = 50         # The stub serves artists 1..50.
+TRACK_IDS = 500         # Distinct tracks liked / added to playlists.
+PLAYLISTS_PER_USER = 3
+
+
+def _track_id(i):
+    return str(1000 + i % TRACK_IDS)
+
+
+def _scenarios(reverse):
+    """name -> callable(i, user) returning (method, path, json body or None)."""
+    return {
+        'index': lambda i, user: ('get', reverse('index'), None),
+        'search_view': lambda i, user: ('get', f"{reverse('search')}?q=bench{i}", None),
+        'ajax_search_view': lambda i, user: ('get', f"{reverse('ajax_search')}?q=bench{i}", None),
+        'artist_profile_view': lambda i, user: ('get', reverse('artist_profile', args=[i % ARTIST_IDS + 1]), None),
+        'like_song_view': lambda i, user: ('post', reverse('like_song'), {'deezer_id': _track_id(i)}),
+        'add_song_to_playlists_view': lambda i, user: (
+            'post', reverse('add_song_to_playlists'), {'deezer_id': _track_id(i), 'playlist_ids': user.playlist_ids},
+        ),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Workers:
+    """Hands each worker thread its own logged-in test client and user."""
+
+    def __init__(self, users):
+        self.users = users
+        self._local = threading.local()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        from django.test import Client
+
+        if not hasattr(self._local, 'client'):
+            with self._lock:
+                user = self.users[self._next % len(self.users)]
+                self._next += 1
+            client = Client()
+            client.force_login(user)
+            self._local.client, self._local.user = client, user
+        return self._local.client, self._local.user
+
+
+def create_users(count):
+    from django.contrib.auth.models import User
+    from music.models import Playlist
+
+    users = []
+    for n in range(count):
+        user = User.objects.create_user(username=f"bench{n}", password='bench')
+        user.playlist_ids = [Playlist.objects.create(user=user, name=f"Bench {n}.{p}").id
+                             for p in range(PLAYLISTS_PER_USER)]
+        users.append(user)
+    return users
+
+
+def run_scenario(scenario, workers, total_requests, concurrency):
+    latencies, errors = [], 0
+    errors_lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        client, user = workers.current()
+        method, path, body = scenario(i, user)
+        start = time.perf_counter()
+        try:
+            if body is None:
+                response = getattr(client, method)(path)
+            else:
+                response = getattr(client, method)(path, data=json.dumps(body), content_type='application/json')
+            if response.streaming:
+                b''.join(response.streaming_content)  # Measure the whole page, not just the shell.
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        latencies.append(time.perf_counter() - start)
+        if failed:
+            with errors_lock:
+                errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(one, range(total_requests)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed, errors
+
+
+def compare(result, baseline):
+    """Percent change against the baseline result for the same scenario (negative latency = faster)."""
+    changes = {}
+    for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+        before, after = baseline.get(metric), result.get(metric)
+        if before and after is not None:
+            changes[metric] = round((after - before) / before * 100, 1)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='TuneX.settings', help="DJANGO_SETTINGS_MODULE to benchmark.")
+    parser.add_argument('--scenarios', nargs='+', help="Subset of scenarios to run (default: all).")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help="Measured requests per scenario.")
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-ms', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write all results, with run metadata, to this JSON file.")
+    parser.add_argument('--baseline', help="JSON file from an earlier --output run to compare against.")
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's log output.")
+    args = parser.parse_args()
+    results_out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        run(parser, args, results_out)
+
+
+def run(parser, args, results_out):
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+    from django.urls import reverse
+
+    from benchmarks.deezer_stub import start_stub
+    from benchmarks.stats import summarize
+    from music import deezer
+    from music.search_cache import get_search_cache
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    scenarios = _scenarios(reverse)
+    names = args.scenarios or list(scenarios)
+    unknown = set(names) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(scenarios)})")
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result['scenario']: result for result in json.load(f)['results']}
+
+    stub = start_stub(latency_ms=args.latency_ms, error_rate=args.error_rate, error_status=args.error_status,
+                      slow_rate=args.slow_rate, slow_ms=args.slow_ms, seed=args.seed)
+    settings.DEEZER_API_URL = f"http://127.0.0.1:{stub.server_port}"
+    tmp_dir = None
+    if connection.vendor == 'sqlite':
+        # The default in-memory test database can't take writes from several threads.
+        tmp_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp_dir.name, 'bench.sqlite3')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    results = []
+    try:
+        workers = Workers(create_users(args.concurrency))
+        for name in names:
+            cache.clear()
+            get_search_cache().clear()
+            deezer.get_breaker().reset()
+            run_scenario(scenarios[name], workers, min(args.requests, args.concurrency * 2), args.concurrency)  # warm-up
+            latencies, elapsed, errors = run_scenario(scenarios[name], workers, args.requests, args.concurrency)
+            result = dict(summarize(latencies, elapsed, errors), scenario=name, concurrency=args.concurrency,
+                          upstream_latency_ms=args.latency_ms, upstream_error_rate=args.error_rate,
+                          async_views=settings.ASYNC_VIEWS)
+            if name in baseline:
+                result['vs_baseline_pct'] = compare(result, baseline[name])
+            results.append(result)
+            print(json.dumps(result), file=results_out, flush=True)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        stub.shutdown()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'args': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'verbose')},
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
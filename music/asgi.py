@@ -0,0 +1,62 @@
+"""
+Streamed responses with an async body, for the async views under ASGI.
+
+Django 3.2's ASGI handler iterates a StreamingHttpResponse synchronously
+on the event loop, so a body that waits on Deezer would stall every other
+request of the process. AsyncStreamingHttpResponse takes an async
+iterator instead, and ASGIHandler (used by TuneX/asgi.py) sends it with
+`async for`, as Django 4.2 does. Elsewhere (WSGI, the test client) the
+body is collected in one go.
+"""
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers import asgi
+from django.http import StreamingHttpResponse
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """A StreamingHttpResponse over an async iterator of str or bytes chunks."""
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        return self._content_bytes(self._iterator)
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._iterator = value.__aiter__()
+
+    async def _content_bytes(self, iterator):
+        async for chunk in iterator:
+            yield self.make_bytes(chunk)
+
+    def __iter__(self):
+        async def collect():
+            return [chunk async for chunk in self.streaming_content]
+        return iter(async_to_sync(collect)())
+
+
+def _headers(response):
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Django's ASGI handler, sending AsyncStreamingHttpResponse bodies without blocking the event loop."""
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'is_async', False):
+            return await super().send_response(response, send)
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': _headers(response)})
+        async for part in response.streaming_content:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
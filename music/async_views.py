@@ -0,0 +1,290 @@
+"""
+Async versions of the upstream-bound views in views.py.
+
+They are routed instead of the sync views when settings.ASYNC_VIEWS is on
+(TuneX/asgi.py turns it on), so that a single ASGI process can keep many
+slow Deezer requests in flight without tying up a worker per request.
+Parsing is shared with views.py; only the I/O is different. Database work
+(liked flags, sidebar playlists, template rendering) is done in one
+sync_to_async hop per request, or two for streamed pages: the shell and
+the content.
+"""
+import functools
+import logging
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse, Http404
+from django.shortcuts import render
+
+from . import deezer, preview_cache, local_search, prefix_index
+from .asgi import AsyncStreamingHttpResponse
+from .caching import stale_while_revalidate, last_known_good, has_last_good
+from .search_cache import get_search_cache
+from .views import (
+    _add_is_liked_status_to_tracks, _index_context, _fresh_preview_response, _missing_top_track_artist_id,
+    _parse_artist, _parse_artist_top_tracks, _parse_deezer_playlist, _parse_search_responses,
+    _parse_top_artists, _parse_top_playlists, _parse_top_tracks, _prioritize_artists,
+    _search_requests, _store_fresh_preview, _valid_preview_url, _merge_local_tracks, _local_search_deadline,
+    _needs_local_tracks, _stream_shell, _stream_content,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _astream_page(request, template_name, content_template, aload_context, page_title=None):
+    """
+    views._stream_page() for coroutine views. `aload_context()` returns the
+    content's context and the track lists to mark liked; it runs while the
+    ASGI handler sends the body (music/asgi.py), after the shell is out.
+    """
+    head, tail = await astream_shell(request, template_name)
+
+    async def chunks():
+        yield head
+        try:
+            context, track_lists = await aload_context()
+        except Exception as e:
+            logger.error(f"Error loading the content of {request.path}: {e}", exc_info=True)
+            context, track_lists = {}, []
+        yield await apersonalize_and_render_content(request, content_template, context, track_lists, page_title)
+        yield tail
+
+    response = AsyncStreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass the shell through without waiting for the rest.
+    return response
+
+
+def async_login_required(view_func):
+    """login_required for coroutine views (Django 3.2's decorator is sync-only)."""
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'login')
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _personalize_and_render(request, template_name, context, track_lists=()):
+    for tracks in track_lists:
+        _add_is_liked_status_to_tracks(request, tracks)
+    return render(request, template_name, context)
+
+def _personalize_and_render_content(request, content_template, context, track_lists=(), page_title=None):
+    for tracks in track_lists:
+        _add_is_liked_status_to_tracks(request, tracks)
+    return _stream_content(request, content_template, context, page_title)
+
+apersonalize_and_render = sync_to_async(_personalize_and_render)
+apersonalize_and_render_content = sync_to_async(_personalize_and_render_content)
+astream_shell = sync_to_async(_stream_shell)
+aadd_is_liked_status_to_tracks = sync_to_async(_add_is_liked_status_to_tracks)
+aindex_context = sync_to_async(_index_context)
+astore_fresh_preview = sync_to_async(_store_fresh_preview)
+asearch_songs = sync_to_async(local_search.search_songs)
+
+
+@stale_while_revalidate('chart', name='get_top_artists')
+async def aget_top_artists(limit=10):
+    logger.info(f"Requesting top {limit} artists chart from Deezer (async)...")
+    try:
+        artists = _parse_top_artists(await deezer.aget_json("/chart/0/artists", params={'limit': limit}), limit)
+        prefix_index.remember_chart(artists=artists)
+        return artists
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Error making Deezer API request for top artists: {e}")
+    return []
+
+
+@stale_while_revalidate('chart', name='get_top_playlists')
+async def aget_top_playlists(limit=10):
+    logger.info(f"Requesting top {limit} playlists chart from Deezer (async)...")
+    try:
+        return _parse_top_playlists(await deezer.aget_json("/chart/0/playlists", params={'limit': limit}))
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Error (Playlists API): {e}")
+    return []
+
+
+@stale_while_revalidate('chart', name='get_top_tracks')
+async def aget_top_tracks(limit=10):
+    logger.info(f"Requesting top {limit} tracks chart from Deezer (async)...")
+    try:
+        tracks = _parse_top_tracks(await deezer.aget_json("/chart/0/tracks", params={'limit': limit}))
+        prefix_index.remember_chart(tracks=tracks)
+        return tracks
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Error (Tracks API): {e}")
+    return []
+
+
+async def asearch_deezer(query, limit_tracks=10, limit_artists=6, limit_albums=6, timeout=None):
+    logger.info(f"Searching Deezer for: '{query}' (async)")
+    responses = await deezer.agather({
+        item_type: deezer.aget_json(endpoint, params=params)
+        for item_type, (endpoint, params) in _search_requests(query, limit_tracks, limit_artists, limit_albums).items()
+    }, timeout=timeout)
+    return _parse_search_responses(query, responses, limit_tracks, limit_artists, limit_albums)
+
+
+async def asearch_catalog(request, query, limit_tracks=10, limit_artists=6, limit_albums=6):
+    """asearch_deezer() merged with local catalog hits for the current user."""
+    user_id = await sync_to_async(lambda: request.user.pk if request.user.is_authenticated else None)()
+    local_tracks = await asearch_songs(query, limit_tracks, user_id)
+    search_results = await asearch_deezer(query, limit_tracks, limit_artists, limit_albums, timeout=_local_search_deadline(local_tracks))
+    return _merge_local_tracks(search_results, local_tracks, limit_tracks)
+
+
+@last_known_good(name='get_artist_details')
+async def aget_artist_details(artist_id):
+    logger.info(f"Requesting artist details and top tracks for artist {artist_id} (async)")
+    responses = await deezer.agather({
+        'artist': deezer.aget_json(f"/artist/{artist_id}"),
+        'top': deezer.aget_json(f"/artist/{artist_id}/top", params={'limit': 10}),
+    })
+    artist_data = responses['artist']
+    if artist_data is None or 'error' in artist_data:
+        logger.error(f"Could not fetch artist details for ID {artist_id}: {artist_data.get('error') if artist_data else 'request failed'}")
+        return None
+    artist_details = _parse_artist(artist_data)
+    artist_details['top_tracks'] = _parse_artist_top_tracks(responses['top'], artist_details) if responses['top'] else []
+    return artist_details
+
+
+@last_known_good(name='get_deezer_playlist_details')
+async def aget_deezer_playlist_details(playlist_id):
+    logger.info(f"Requesting Deezer playlist details for {playlist_id} (async)")
+    try:
+        playlist_data = await deezer.aget_json(f"/playlist/{playlist_id}")
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Error (Deezer Playlist Details API ID: {playlist_id}): {e}")
+        return None
+    if 'error' in playlist_data:
+        logger.error(f"API Error fetching Deezer playlist details for ID {playlist_id}: {playlist_data.get('error')}")
+        return None
+    return _parse_deezer_playlist(playlist_data)
+
+
+@async_login_required
+async def index(request):
+    async def load_charts():
+        charts = await deezer.agather({
+            'top_artists': aget_top_artists(limit=prefix_index.CHART_LIMIT),
+            'top_tracks': aget_top_tracks(limit=prefix_index.CHART_LIMIT),
+            'top_playlists': aget_top_playlists(limit=8),
+        }, defaults={'top_artists': [], 'top_tracks': [], 'top_playlists': []})
+        return await aindex_context(request, charts), []
+    return await _astream_page(request, 'index.html', 'index_charts.html', load_charts)
+
+
+async def search_view(request):
+    query = request.GET.get('q', None)
+    context = {'query': query, 'has_results': False}
+    track_lists = []
+    if query:
+        search_results_dict = await asearch_catalog(request, query)
+        if search_results_dict:
+            track_lists.append(search_results_dict['tracks'])
+            context.update(search_results_dict)
+            context['has_results'] = any(bool(search_results_dict.get(key)) for key in ['tracks', 'artists', 'albums'])
+    else:
+        context['api_error'] = False
+    return await apersonalize_and_render(request, 'search.html', context, track_lists)
+
+
+async def ajax_search_view(request):
+    query = request.GET.get('q', None)
+    results = {'tracks': [], 'artists': []}
+    MAX_ARTISTS_DISPLAY = 5
+
+    if query and len(query.strip()) > 0:
+        logger.info(f"AJAX search initiated for query: '{query}' (async)")
+        search_limits = (10, MAX_ARTISTS_DISPLAY, 0)
+        search_results_dict = get_search_cache().get(query, search_limits)
+        local_tracks = []
+        if _needs_local_tracks(search_results_dict, 10):
+            user_id = await sync_to_async(lambda: request.user.pk if request.user.is_authenticated else None)()
+            local_tracks = await asearch_songs(query, 10, user_id)
+        if search_results_dict is None:
+            search_results_dict = await asearch_deezer(query, 10, MAX_ARTISTS_DISPLAY, 0, timeout=_local_search_deadline(local_tracks))
+            if search_results_dict is not None:
+                get_search_cache().set(query, search_limits, search_results_dict)
+        search_results_dict = _merge_local_tracks(search_results_dict, local_tracks, 10)
+        if search_results_dict:
+            raw_tracks = search_results_dict.get('tracks', [])
+            if raw_tracks:
+                results['tracks'] = await aadd_is_liked_status_to_tracks(request, list(raw_tracks))
+            artists_from_search = search_results_dict.get('artists', [])
+            detailed_artist = None
+            missing_artist_id = _missing_top_track_artist_id(results['tracks'], artists_from_search)
+            if missing_artist_id:
+                logger.info(f"Top track artist (ID: {missing_artist_id}) not in general search. Fetching details.")
+                detailed_artist = await aget_artist_details(missing_artist_id)
+            results['artists'] = _prioritize_artists(results['tracks'], artists_from_search, MAX_ARTISTS_DISPLAY, detailed_artist)
+            logger.info(f"AJAX search for '{query}' finalized. Tracks: {len(results['tracks'])}, Artists: {len(results['artists'])}.")
+        else:
+            logger.warning(f"AJAX search for '{query}' returned no results from search_deezer or an error occurred.")
+    else:
+        logger.info("AJAX search called with no or empty query.")
+
+    return JsonResponse(results)
+
+
+async def artist_profile_view(request, artist_id):
+    if not has_last_good('get_artist_details', artist_id):
+        # Never fetched (or long ago): only Deezer can tell whether it exists, so wait before answering.
+        artist_data = await aget_artist_details(artist_id)
+        if artist_data is None:
+            raise Http404("Artist not found or error fetching details from Deezer.")
+        return await apersonalize_and_render(request, 'artist_profile.html', {'artist': artist_data},
+                                             [artist_data['top_tracks']])
+
+    async def load_artist():
+        artist_data = await aget_artist_details(artist_id)
+        return {'artist': artist_data}, [artist_data['top_tracks']] if artist_data else []
+    return await _astream_page(request, 'artist_profile.html', 'artist_profile_content.html', load_artist,
+                               page_title=lambda context: context['artist'] and context['artist'].get('name'))
+
+
+async def deezer_playlist_detail_view(request, playlist_id):
+    if not has_last_good('get_deezer_playlist_details', playlist_id):
+        playlist_data = await aget_deezer_playlist_details(playlist_id)
+        if playlist_data is None:
+            raise Http404("Deezer playlist not found or error fetching details.")
+        context = {
+            'playlist': playlist_data,
+            'is_deezer_playlist': True
+        }
+        return await apersonalize_and_render(request, 'playlist_details.html', context, [playlist_data['tracks']])
+
+    async def load_playlist():
+        playlist_data = await aget_deezer_playlist_details(playlist_id)
+        return {'playlist': playlist_data, 'is_deezer_playlist': True}, [playlist_data['tracks']] if playlist_data else []
+    return await _astream_page(request, 'playlist_details.html', 'playlist_details_content.html', load_playlist,
+                               page_title=lambda context: context['playlist'] and context['playlist'].get('title'))
+
+
+@async_login_required
+async def get_fresh_preview_url_view(request, deezer_id_str):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Only GET is allowed.'}, status=405)
+    cached_preview_url = preview_cache.get_preview(deezer_id_str)
+    if cached_preview_url:
+        return JsonResponse({'preview_url': cached_preview_url})
+    try:
+        track_data = await deezer.aget_json(f"/track/{deezer_id_str}")
+        preview_url = _valid_preview_url(track_data)
+        if preview_url:
+            await astore_fresh_preview(deezer_id_str, preview_url)
+        return _fresh_preview_response(deezer_id_str, track_data)
+    except httpx.HTTPStatusError as http_err:
+        logger.error(f"HTTP error fetching fresh preview for {deezer_id_str} from Deezer: {http_err}")
+        return JsonResponse({'error': 'Failed to fetch track details from Deezer (HTTP Error).', 'preview_url': None}, status=502)
+    except httpx.RequestError as e:
+        logger.error(f"Request error fetching fresh preview for {deezer_id_str} from Deezer: {e}")
+        return JsonResponse({'error': 'Network error while fetching track details.', 'preview_url': None}, status=503)
+    except ValueError:
+        logger.error(f"Error decoding JSON for fresh preview of {deezer_id_str} from Deezer.")
+        return JsonResponse({'error': 'Invalid response from Deezer API.', 'preview_url': None}, status=500)
@@ -0,0 +1,243 @@
+import asyncio
+import datetime
+import threading
+import time
+import logging
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from . import deezer, metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'deezer'
+LAST_GOOD_PREFIX = 'deezer-last-good'
+FRAGMENT_PREFIX = 'fragment'
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(name, outcome):
+    metrics.inc('tunex_cache_lookups_total', name, outcome)
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'hit': 0, 'stale': 0, 'miss': 0, 'last_good': 0})
+        entry[outcome] += 1
+
+
+def get_stats():
+    """Returns a snapshot of hit/stale/miss (and last_good fallback) counters per cached function."""
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def get_ttl(group):
+    return getattr(settings, 'DEEZER_CACHE_TTLS', {}).get(group, 300)
+
+
+def make_key(name, args, kwargs, prefix=KEY_PREFIX):
+    parts = [str(a) for a in args] + [f"{k}={kwargs[k]}" for k in sorted(kwargs)]
+    return ':'.join([prefix, name] + parts)
+
+
+def _refresh(key, lock_key, func, args, kwargs, ttl):
+    try:
+        value = func(*args, **kwargs)
+        if value:
+            _store(key, value, ttl)
+            logger.info(f"Background refresh of '{key}' done.")
+        else:
+            logger.warning(f"Background refresh of '{key}' returned nothing; keeping stale copy.")
+    except Exception as e:
+        logger.error(f"Background refresh of '{key}' failed: {e}", exc_info=True)
+    finally:
+        cache.delete(lock_key)
+
+
+async def _arefresh(key, lock_key, func, args, kwargs, ttl):
+    try:
+        value = await func(*args, **kwargs)
+        if value:
+            _store(key, value, ttl)
+            logger.info(f"Background refresh of '{key}' done.")
+        else:
+            logger.warning(f"Background refresh of '{key}' returned nothing; keeping stale copy.")
+    except Exception as e:
+        logger.error(f"Background refresh of '{key}' failed: {e}", exc_info=True)
+    finally:
+        cache.delete(lock_key)
+
+
+def _store(key, value, ttl):
+    stale_ttl = getattr(settings, 'DEEZER_CACHE_STALE_TTL', 24 * 60 * 60)
+    cache.set(key, {'value': value, 'expires_at': time.time() + ttl}, ttl + stale_ttl)
+
+
+def _lookup(name, key):
+    """Returns (entry, refresh_lock_key); the lock key is set when this caller should refresh."""
+    entry = cache.get(key)
+    if entry is None:
+        _record(name, 'miss')
+        return None, None
+    if entry['expires_at'] > time.time():
+        _record(name, 'hit')
+        return entry, None
+    _record(name, 'stale')
+    if not deezer.is_available():
+        return entry, None  # A refresh would fail fast; keep serving the stale copy.
+    lock_key = f"{key}:refreshing"
+    if cache.add(lock_key, 1, getattr(settings, 'DEEZER_READ_TIMEOUT', 10) * 3):
+        return entry, lock_key
+    return entry, None
+
+
+def stale_while_revalidate(group, name=None):
+    """
+    Caches the decorated Deezer helper in Django's cache for the TTL
+    configured for `group` in settings.DEEZER_CACHE_TTLS. Once an entry is
+    past its TTL the stale value is still returned, while a single
+    background refresh (guarded by a cache.add lock) fetches a fresh copy.
+    Empty results are not cached so that upstream errors are retried.
+
+    Works on both plain and async functions; pass the same `name` to a sync
+    helper and its async twin so they share cache entries.
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(cache_name, args, kwargs)
+                ttl = get_ttl(group)
+                entry, lock_key = _lookup(cache_name, key)
+                if entry is None:
+                    value = await func(*args, **kwargs)
+                    if value:
+                        _store(key, value, ttl)
+                    return value
+                if lock_key:
+                    asyncio.ensure_future(_arefresh(key, lock_key, func, args, kwargs, ttl))
+                return entry['value']
+            async_wrapper.uncached = func
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(cache_name, args, kwargs)
+            ttl = get_ttl(group)
+            entry, lock_key = _lookup(cache_name, key)
+            if entry is None:
+                value = func(*args, **kwargs)
+                if value:
+                    _store(key, value, ttl)
+                return value
+            if lock_key:
+                threading.Thread(
+                    target=_refresh, args=(key, lock_key, func, args, kwargs, ttl),
+                    name=f"refresh-{cache_name}", daemon=True,
+                ).start()
+            return entry['value']
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _remember_last_good(key, value):
+    cache.set(key, {'value': value, 'stored_at': time.time()},
+              getattr(settings, 'DEEZER_LAST_GOOD_TTL', 7 * 24 * 60 * 60))
+
+
+def _last_good(name, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    _record(name, 'last_good')
+    stale_since = datetime.datetime.fromtimestamp(entry['stored_at'], tz=datetime.timezone.utc)
+    return dict(entry['value'], stale=True, stale_since=stale_since)
+
+
+def cached_value(name, *args, **kwargs):
+    """The value a stale_while_revalidate() helper holds for these arguments, fresh or stale, or None. Never calls Deezer."""
+    entry = cache.get(make_key(name, args, kwargs))
+    return entry['value'] if entry is not None else None
+
+
+def has_last_good(name, *args, **kwargs):
+    """Whether a last_known_good() helper has kept a result for these arguments, i.e. the item is known to exist."""
+    return cache.get(make_key(name, args, kwargs, prefix=LAST_GOOD_PREFIX)) is not None
+
+
+def last_known_good(name=None):
+    """
+    Degraded mode for per-item Deezer helpers that return a dict or None
+    (artist pages, playlists). Every result is kept in Django's cache for
+    DEEZER_LAST_GOOD_TTL. While the Deezer circuit breaker is not closed
+    the helper is not called at all, and a failed call (None) is replaced
+    too: the kept copy is returned with stale=True and stale_since set.
+
+    Works on both plain and async functions; pass the same `name` to a sync
+    helper and its async twin so they share entries.
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(cache_name, args, kwargs, prefix=LAST_GOOD_PREFIX)
+                if not deezer.is_available():
+                    value = _last_good(cache_name, key)
+                    if value is not None:
+                        return value
+                value = await func(*args, **kwargs)
+                if value:
+                    _remember_last_good(key, value)
+                    return value
+                return _last_good(cache_name, key) or value
+            async_wrapper.uncached = func
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(cache_name, args, kwargs, prefix=LAST_GOOD_PREFIX)
+            if not deezer.is_available():
+                value = _last_good(cache_name, key)
+                if value is not None:
+                    return value
+            value = func(*args, **kwargs)
+            if value:
+                _remember_last_good(key, value)
+                return value
+            return _last_good(cache_name, key) or value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def data_version(data):
+    """A digest of JSON-serializable data, to key whatever was rendered from it."""
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cached_fragment(name, data, render, group):
+    """
+    Returns render(data), an HTML fragment that must be the same for every
+    user, from Django's cache. Entries are keyed by `name` and the
+    data_version() of `data`, so a refreshed chart is rendered once under a
+    new key, and kept for the TTL of `group` in settings.DEEZER_CACHE_TTLS.
+    """
+    key = f"{FRAGMENT_PREFIX}:{name}:{data_version(data)}"
+    html = cache.get(key)
+    if html is None:
+        _record(name, 'miss')
+        html = render(data)
+        cache.set(key, html, get_ttl(group))
+    else:
+        _record(name, 'hit')
+    return mark_safe(html)
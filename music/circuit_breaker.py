@@ -0,0 +1,117 @@
+"""
+Circuit breaker for upstream calls (used around the Deezer client, see
+deezer.get_breaker).
+
+The breaker opens after `failure_threshold` consecutive failed calls,
+where a call slower than `slow_call_seconds` counts as failed even if it
+returned. While open, callers fail fast instead of waiting on timeouts.
+After `reset_timeout` seconds one probe call is let through (half-open):
+if it succeeds the breaker closes, otherwise it opens again.
+
+allow_request() hands out a Permit naming the state the call was admitted
+under; record() ignores, for the state machine, calls admitted before the
+last state change, so a slow call from before the breaker opened cannot
+decide a later probe's outcome.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# `generation` counts state changes; `probe` is set for the half-open probe.
+Permit = namedtuple('Permit', ['generation', 'probe'])
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=5.0, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._generation = 0
+        self._probe_in_flight = False
+        self._stats = {'opened': 0, 'rejected': 0, 'failures': 0, 'slow_calls': 0}
+        self._lock = threading.Lock()
+        metrics.set_gauge('tunex_circuit_breaker_open', name, value=0)
+
+    def _set_state(self, state):
+        if state != self._state:
+            reason = f" after {self._consecutive_failures} consecutive failures" if state == OPEN else ""
+            logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state}{reason}.")
+            self._state = state
+            self._generation += 1
+            metrics.set_gauge('tunex_circuit_breaker_open', self.name, value=int(state != CLOSED))
+
+    def allow_request(self):
+        """
+        A Permit to pass to record() if a call may go ahead, else None.
+        While open, returns None until the reset timeout has passed, then
+        lets a single probe through.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return Permit(self._generation, probe=False)
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return Permit(self._generation, probe=True)
+            self._stats['rejected'] += 1
+            return None
+
+    def record(self, permit, elapsed, failed):
+        """Reports the outcome of a call that allow_request() let through with `permit`."""
+        slow = elapsed > self.slow_call_seconds
+        with self._lock:
+            if slow:
+                self._stats['slow_calls'] += 1
+            if failed or slow:
+                self._stats['failures'] += 1
+            if permit.generation != self._generation:
+                return  # Admitted under an earlier state; says nothing about this one.
+            if permit.probe:
+                self._probe_in_flight = False
+            if not failed and not slow:
+                self._consecutive_failures = 0
+                self._set_state(CLOSED)
+                return
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._stats['opened'] += 1
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    @property
+    def state(self):
+        return self._state
+
+    def is_open(self):
+        """True while calls are being rejected, i.e. open and not yet due for a probe."""
+        with self._lock:
+            if self._state == OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self._state == HALF_OPEN and self._probe_in_flight
+
+    def get_state(self):
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return dict(self._stats, name=self.name, state=self._state,
+                        consecutive_failures=self._consecutive_failures, retry_in_seconds=retry_in)
+
+    def reset(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from . import deezer
+from .models import Playlist
+
+KEY_PREFIX = 'sidebar-playlists'
+
+
+def _key(user_id):
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def get_sidebar_playlists(user_id):
+    """Returns the user's playlists as [{'id': ..., 'name': ...}], newest first, from a per-user cache."""
+    key = _key(user_id)
+    playlists = cache.get(key)
+    if playlists is None:
+        playlists = list(Playlist.objects.filter(user_id=user_id).order_by('-id').values('id', 'name'))
+        cache.set(key, playlists, getattr(settings, 'SIDEBAR_PLAYLISTS_CACHE_TTL', 24 * 60 * 60))
+    return playlists
+
+
+def invalidate_sidebar_playlists(user_id):
+    cache.delete(_key(user_id))
+
+
+def sidebar_playlists(request):
+    """Supplies the sidebar playlist list to every template rendered with a request."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'sidebar_playlists': []}
+    return {'sidebar_playlists': get_sidebar_playlists(user.pk)}
+
+
+def deezer_status(request):
+    """Flags pages rendered while the Deezer circuit breaker is not closed (cached payloads may be stale)."""
+    return {'deezer_degraded': deezer.get_breaker().state != 'closed'}
@@ -0,0 +1,451 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+from . import metrics, timing
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+# httpx.AsyncClient is bound to the event loop it was created on, so the
+# async side keeps one pooled client per running loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+# Identical upstream calls in flight, shared by every caller asking for the
+# same endpoint and params (see get_json / aget_json).
+_inflight = {}
+_inflight_lock = threading.Lock()
+_async_inflight = weakref.WeakKeyDictionary()
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised by get() instead of calling Deezer while the breaker is open."""
+
+
+class AsyncCircuitOpenError(httpx.TransportError):
+    """Raised by aget() instead of calling Deezer while the breaker is open."""
+
+
+def _build_session():
+    """
+    Builds the process-wide requests.Session used for every Deezer call.
+    Connections are pooled and kept alive, and idempotent GETs are retried
+    with exponential backoff on connection errors and 429/5xx responses.
+    """
+    pool_size = getattr(settings, 'DEEZER_POOL_SIZE', 20)
+    retry = Retry(
+        total=getattr(settings, 'DEEZER_MAX_RETRIES', 2),
+        backoff_factor=getattr(settings, 'DEEZER_RETRY_BACKOFF', 0.3),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+    logger.info(f"Deezer session created (pool size: {pool_size}).")
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session():
+    """Closes the pooled session; the next call builds a fresh one."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def api_url():
+    return getattr(settings, 'DEEZER_API_URL', "https://api.deezer.com")
+
+
+def default_timeout():
+    return (
+        getattr(settings, 'DEEZER_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'DEEZER_READ_TIMEOUT', 10),
+    )
+
+
+def endpoint_name(path):
+    """Maps '/chart/0/tracks' -> 'chart', '/artist/27/top' -> 'artist', etc."""
+    return path.strip('/').split('/', 1)[0] or 'root'
+
+
+def _stats_entry(endpoint):
+    entry = _stats.get(endpoint)
+    if entry is None:
+        entry = _stats[endpoint] = {'count': 0, 'errors': 0, 'coalesced': 0, 'rejected': 0,
+                                     'total_seconds': 0.0, 'max_seconds': 0.0}
+    return entry
+
+
+def _is_timeout(exc):
+    """True for requests timeouts, including a read timeout that outlasted the retries."""
+    if isinstance(exc, (requests.exceptions.Timeout, httpx.TimeoutException)):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, Urllib3TimeoutError)
+
+
+def _record(endpoint, elapsed, error, outcome=None):
+    """`outcome` is 'ok', 'error' or 'timeout'; derived from `error` if not given."""
+    timing.record_upstream(endpoint, elapsed, error)
+    metrics.observe('tunex_deezer_call_duration_seconds', endpoint, value=elapsed)
+    metrics.inc('tunex_deezer_calls_total', endpoint, outcome or ('error' if error else 'ok'))
+    with _stats_lock:
+        entry = _stats_entry(endpoint)
+        entry['count'] += 1
+        entry['total_seconds'] += elapsed
+        if elapsed > entry['max_seconds']:
+            entry['max_seconds'] = elapsed
+        if error:
+            entry['errors'] += 1
+
+
+def _record_coalesced(endpoint):
+    metrics.inc('tunex_deezer_calls_skipped_total', endpoint, 'coalesced')
+    with _stats_lock:
+        _stats_entry(endpoint)['coalesced'] += 1
+
+
+def get_stats():
+    """Returns a snapshot of per-endpoint latency counters."""
+    with _stats_lock:
+        snapshot = {}
+        for endpoint, entry in _stats.items():
+            snapshot[endpoint] = dict(entry)
+            snapshot[endpoint]['avg_seconds'] = entry['total_seconds'] / entry['count'] if entry['count'] else 0.0
+        return snapshot
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_breaker():
+    """The process-wide circuit breaker shared by every sync and async Deezer call."""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'deezer',
+                    failure_threshold=getattr(settings, 'DEEZER_BREAKER_FAILURE_THRESHOLD', 5),
+                    slow_call_seconds=getattr(settings, 'DEEZER_BREAKER_SLOW_CALL_SECONDS', 5),
+                    reset_timeout=getattr(settings, 'DEEZER_BREAKER_RESET_TIMEOUT', 30),
+                )
+    return _breaker
+
+
+def is_available():
+    """
+    False while the breaker would reject a call, i.e. while views should
+    go straight to cached payloads. True again once a probe is due, so
+    that some request gets to find out whether Deezer is back.
+    """
+    return not get_breaker().is_open()
+
+
+def _record_rejected(endpoint):
+    metrics.inc('tunex_deezer_calls_skipped_total', endpoint, 'circuit_open')
+    with _stats_lock:
+        _stats_entry(endpoint)['rejected'] += 1
+
+
+def get(path, params=None, timeout=None):
+    """
+    Performs a GET against the Deezer API through the pooled session and
+    returns the raw response. `path` is relative to settings.DEEZER_API_URL.
+    Network errors propagate as requests exceptions; while the circuit
+    breaker is open, CircuitOpenError is raised without calling Deezer.
+    """
+    url = f"{api_url()}{path}"
+    endpoint = endpoint_name(path)
+    breaker = get_breaker()
+    permit = breaker.allow_request()
+    if permit is None:
+        _record_rejected(endpoint)
+        raise CircuitOpenError(f"Deezer circuit breaker is open; not calling {path}")
+    metrics.inc('tunex_deezer_calls_in_flight', endpoint)
+    start = time.perf_counter()
+    error = True
+    outcome = 'error'
+    upstream_failure = True
+    try:
+        response = get_session().get(url, params=params, timeout=timeout or default_timeout())
+        error = response.status_code >= 400
+        outcome = 'error' if error else 'ok'
+        upstream_failure = response.status_code in RETRY_STATUSES
+        return response
+    except requests.exceptions.RequestException as e:
+        if _is_timeout(e):
+            outcome = 'timeout'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.dec('tunex_deezer_calls_in_flight', endpoint)
+        _record(endpoint, elapsed, error, outcome)
+        breaker.record(permit, elapsed, upstream_failure)
+
+
+def _flight_key(path, params):
+    return (path, tuple(sorted((params or {}).items())))
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def get_json(path, params=None, timeout=None):
+    """
+    Same as get(), but raises for HTTP error statuses and returns the
+    decoded JSON body.
+
+    Identical concurrent calls (same path and params) are coalesced: the
+    first caller performs the request and every other thread waits for it
+    and gets the same parsed body (or the same exception). The shared body
+    must be treated as read-only.
+    """
+    key = _flight_key(path, params)
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    if not leader:
+        _record_coalesced(endpoint_name(path))
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        response = get(path, params=params, timeout=timeout)
+        response.raise_for_status()
+        flight.result = response.json()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        flight.done.set()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'DEEZER_FANOUT_WORKERS', 16),
+                    thread_name_prefix='deezer-fanout',
+                )
+    return _executor
+
+
+def submit(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on the shared bounded fan-out pool, in a
+    copy of the caller's context so its Deezer calls count towards the
+    calling request's timing.
+    """
+    return get_executor().submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def fanout_deadline():
+    return getattr(settings, 'DEEZER_FANOUT_DEADLINE', 8)
+
+
+def gather(tasks, timeout=None, defaults=None):
+    """
+    Runs independent Deezer fetches concurrently and waits for all of them
+    under one shared deadline. `tasks` maps a name to a zero-argument
+    callable; the result maps each name to its return value. Tasks that
+    miss the deadline or raise get their entry from `defaults` (or None),
+    so callers always receive partial results instead of an error.
+    """
+    defaults = defaults or {}
+    timeout = fanout_deadline() if timeout is None else timeout
+    futures = {name: submit(func) for name, func in tasks.items()}
+    wait(futures.values(), timeout=timeout)
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logger.warning(f"Deezer fan-out task '{name}' missed the {timeout}s deadline.")
+            results[name] = defaults.get(name)
+        elif future.exception() is not None:
+            logger.error(f"Deezer fan-out task '{name}' failed: {future.exception()}")
+            results[name] = defaults.get(name)
+        else:
+            results[name] = future.result()
+    return results
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        connect_timeout, read_timeout = default_timeout()
+        max_connections = getattr(settings, 'DEEZER_ASYNC_MAX_CONNECTIONS', 200)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=getattr(settings, 'DEEZER_POOL_SIZE', 20),
+            ),
+            headers={'Accept': 'application/json'},
+        )
+        _async_clients[loop] = client
+        logger.info(f"Async Deezer client created (max connections: {max_connections}).")
+    return client
+
+
+async def aget(path, params=None, timeout=None):
+    """
+    Async counterpart of get(), backed by a pooled httpx.AsyncClient.
+    Applies the same retry policy (connection errors, 429 and 5xx with
+    exponential backoff) and records into the same latency counters and
+    circuit breaker. Network errors propagate as httpx exceptions
+    (AsyncCircuitOpenError while the breaker is open).
+    """
+    url = f"{api_url()}{path}"
+    endpoint = endpoint_name(path)
+    breaker = get_breaker()
+    permit = breaker.allow_request()
+    if permit is None:
+        _record_rejected(endpoint)
+        raise AsyncCircuitOpenError(f"Deezer circuit breaker is open; not calling {path}")
+    if isinstance(timeout, tuple):
+        timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+    attempts = getattr(settings, 'DEEZER_MAX_RETRIES', 2) + 1
+    backoff = getattr(settings, 'DEEZER_RETRY_BACKOFF', 0.3)
+    client = get_async_client()
+    metrics.inc('tunex_deezer_calls_in_flight', endpoint)
+    start = time.perf_counter()
+    error = True
+    outcome = 'error'
+    upstream_failure = True
+    try:
+        for attempt in range(attempts):
+            try:
+                if timeout is None:
+                    response = await client.get(url, params=params)
+                else:
+                    response = await client.get(url, params=params, timeout=timeout)
+            except httpx.TransportError as e:
+                if attempt == attempts - 1:
+                    if _is_timeout(e):
+                        outcome = 'timeout'
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    error = response.status_code >= 400
+                    outcome = 'error' if error else 'ok'
+                    upstream_failure = response.status_code in RETRY_STATUSES
+                    return response
+            await asyncio.sleep(backoff * (2 ** attempt))
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.dec('tunex_deezer_calls_in_flight', endpoint)
+        _record(endpoint, elapsed, error, outcome)
+        breaker.record(permit, elapsed, upstream_failure)
+
+
+async def _afetch_json(path, params, timeout):
+    response = await aget(path, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def _forget_flight(inflight, key, task):
+    inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # Mark as retrieved even if every waiter went away.
+
+
+async def aget_json(path, params=None, timeout=None):
+    """
+    Async counterpart of get_json(), with the same coalescing of identical
+    in-flight calls within the running event loop. Waiters are shielded, so
+    a caller hitting its deadline does not cancel the shared request.
+    """
+    loop = asyncio.get_running_loop()
+    inflight = _async_inflight.setdefault(loop, {})
+    key = _flight_key(path, params)
+    task = inflight.get(key)
+    if task is not None:
+        _record_coalesced(endpoint_name(path))
+    else:
+        task = inflight[key] = asyncio.ensure_future(_afetch_json(path, params, timeout))
+        task.add_done_callback(functools.partial(_forget_flight, inflight, key))
+    return await asyncio.shield(task)
+
+
+async def agather(tasks, timeout=None, defaults=None):
+    """
+    Async counterpart of gather(): `tasks` maps a name to an awaitable.
+    Awaitables still pending at the deadline are cancelled and, like ones
+    that raise, replaced by their entry in `defaults` (or None).
+    """
+    defaults = defaults or {}
+    timeout = fanout_deadline() if timeout is None else timeout
+    futures = {name: asyncio.ensure_future(aw) for name, aw in tasks.items()}
+    await asyncio.wait(futures.values(), timeout=timeout)
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logger.warning(f"Deezer fan-out task '{name}' missed the {timeout}s deadline.")
+            results[name] = defaults.get(name)
+        elif future.cancelled() or future.exception() is not None:
+            logger.error(f"Deezer fan-out task '{name}' failed: {None if future.cancelled() else future.exception()}")
+            results[name] = defaults.get(name)
+        else:
+            results[name] = future.result()
+    return results
@@ -0,0 +1,89 @@
+"""
+Each user's liked Deezer IDs as a sorted array('q') in Django's cache.
+
+The array is stored under a per-user version, and every like or unlike
+switches the user to a new version (after its transaction commits)
+instead of editing the cached array. A read-modify-write of the array
+could lose one of two concurrent changes, and a load that queried the
+library before a change committed would store a stale array. Both now
+land under a version nobody reads any more.
+"""
+import bisect
+import uuid
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import LikedSong
+
+KEY_PREFIX = 'liked-ids'
+VERSION_PREFIX = 'liked-ids-version'
+
+
+def _ttl():
+    return getattr(settings, 'LIKED_IDS_CACHE_TTL', 24 * 60 * 60)
+
+
+def _version_key(user_id):
+    return f"{VERSION_PREFIX}:{user_id}"
+
+
+def _key(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), uuid.uuid4().hex, _ttl())
+        version = cache.get(_version_key(user_id))
+    return f"{KEY_PREFIX}:{user_id}:{version}"
+
+
+def _as_int(deezer_id):
+    try:
+        return int(deezer_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _contains(liked_ids, deezer_id):
+    index = bisect.bisect_left(liked_ids, deezer_id)
+    return index < len(liked_ids) and liked_ids[index] == deezer_id
+
+
+def _load(user_id, key):
+    deezer_ids = LikedSong.objects.filter(profile__user_id=user_id).values_list('song__deezer_id', flat=True)
+    liked_ids = array('q', sorted(i for i in map(_as_int, deezer_ids) if i is not None))
+    cache.set(key, liked_ids, _ttl())
+    return liked_ids
+
+
+def get_liked_ids(user_id):
+    """The user's liked Deezer IDs as a sorted array('q'), from the cache or loaded once."""
+    key = _key(user_id)
+    liked_ids = cache.get(key)
+    return _load(user_id, key) if liked_ids is None else liked_ids
+
+
+def liked_among(user_id, deezer_ids):
+    """
+    Returns the subset of `deezer_ids` (as str) that the user has liked.
+    Uses the cached ID array when present; on a miss, a short list is
+    answered with an IN query over just those IDs instead of loading (and
+    caching) the whole library.
+    """
+    wanted = {i for i in map(_as_int, deezer_ids) if i is not None}
+    if not wanted:
+        return set()
+    key = _key(user_id)
+    liked_ids = cache.get(key)
+    if liked_ids is None:
+        if len(wanted) <= getattr(settings, 'LIKED_IDS_IN_QUERY_MAX', 10):
+            return set(LikedSong.objects.filter(profile__user_id=user_id, song__deezer_id__in=[str(i) for i in wanted])
+                       .values_list('song__deezer_id', flat=True))
+        liked_ids = _load(user_id, key)
+    return {str(i) for i in wanted if _contains(liked_ids, i)}
+
+
+def invalidate(user_id):
+    """Call after changing the user's likes; takes effect when the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(_version_key(user_id), uuid.uuid4().hex, _ttl()))
@@ -0,0 +1,131 @@
+"""
+Full-text search over the local Song catalog, used to answer searches
+instantly (and while Deezer is slow or down) alongside the Deezer results.
+
+MySQL uses the FULLTEXT index on (title, artist_name) in boolean mode;
+SQLite uses the FTS5 table kept in sync by triggers (both created in
+migration 0007). Other backends fall back to icontains. Terms shorter
+than SEARCH_LOCAL_MIN_TERM_LENGTH are dropped; left unset, MySQL uses the
+server's innodb_ft_min_token_size, since shorter words are not indexed.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection, DatabaseError
+
+from . import liked_cache
+from .models import Song
+
+logger = logging.getLogger(__name__)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+DEFAULT_MIN_TERM_LENGTH = 2
+MYSQL_DEFAULT_MIN_TOKEN_SIZE = 3   # innodb_ft_min_token_size out of the box
+
+_mysql_min_token_size = None
+
+
+def _mysql_min_term_length():
+    global _mysql_min_token_size
+    if _mysql_min_token_size is None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT @@innodb_ft_min_token_size")
+                _mysql_min_token_size = int(cursor.fetchone()[0])
+        except (DatabaseError, TypeError, ValueError) as e:
+            logger.warning(f"Could not read innodb_ft_min_token_size ({e}); assuming {MYSQL_DEFAULT_MIN_TOKEN_SIZE}.")
+            _mysql_min_token_size = MYSQL_DEFAULT_MIN_TOKEN_SIZE
+    return _mysql_min_token_size
+
+
+def _min_term_length():
+    configured = getattr(settings, 'SEARCH_LOCAL_MIN_TERM_LENGTH', None)
+    if configured is not None:
+        return configured
+    return _mysql_min_term_length() if connection.vendor == 'mysql' else DEFAULT_MIN_TERM_LENGTH
+
+
+def _terms(query):
+    min_length = _min_term_length()
+    return [term for term in TERM_RE.findall((query or '').casefold()) if len(term) >= min_length][:8]
+
+
+def _ranked_ids_mysql(terms, limit):
+    against = ' '.join(f'+{term}*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM music_song WHERE MATCH(title, artist_name) AGAINST (%s IN BOOLEAN MODE) "
+            "ORDER BY MATCH(title, artist_name) AGAINST (%s IN BOOLEAN MODE) DESC LIMIT %s",
+            [against, against, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _ranked_ids_sqlite(terms, limit):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid FROM music_song_fts WHERE music_song_fts MATCH %s ORDER BY bm25(music_song_fts) LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _ranked_ids_fallback(terms, limit):
+    songs = Song.objects.all()
+    for term in terms:
+        songs = songs.filter(title__icontains=term) | songs.filter(artist_name__icontains=term)
+    return list(songs.values_list('id', flat=True)[:limit])
+
+
+RANKERS = {
+    'mysql': _ranked_ids_mysql,
+    'sqlite': _ranked_ids_sqlite,
+}
+
+
+def _track_dict(song):
+    return {
+        'id': int(song.deezer_id) if song.deezer_id.isdigit() else song.deezer_id,
+        'title': song.title,
+        'artist_name': song.artist_name,
+        'artist_id': None,
+        'album_cover_medium': song.album_cover_url,
+        'duration_formatted': song.duration_formatted,
+        'preview_url': song.preview_url,
+        'rank': None,
+        'duration_seconds': song.duration,
+        'source': 'local',
+    }
+
+
+def search_songs(query, limit=10, user_id=None):
+    """
+    Returns up to `limit` local tracks matching every term of `query`, as
+    track dicts shaped like the Deezer search results, best match first
+    with the user's liked songs ranked ahead of the rest (and flagged
+    with is_liked).
+    """
+    terms = _terms(query)
+    if not terms or limit <= 0:
+        return []
+    candidates = limit * getattr(settings, 'SEARCH_LOCAL_CANDIDATES_FACTOR', 3)
+    ranker = RANKERS.get(connection.vendor, _ranked_ids_fallback)
+    try:
+        ranked_ids = ranker(terms, candidates)
+    except DatabaseError as e:
+        logger.warning(f"Local full-text search for '{query}' failed ({e}); falling back to icontains.")
+        ranked_ids = _ranked_ids_fallback(terms, candidates)
+    if not ranked_ids:
+        return []
+    songs_by_id = Song.objects.in_bulk(ranked_ids)
+    songs = [songs_by_id[pk] for pk in ranked_ids if pk in songs_by_id]
+    liked = set()
+    if user_id is not None:
+        liked = liked_cache.liked_among(user_id, [song.deezer_id for song in songs])
+        songs.sort(key=lambda song: song.deezer_id not in liked)  # Stable: keeps relevance order within each group.
+    tracks = [_track_dict(song) for song in songs[:limit]]
+    for track in tracks:
+        track['is_liked'] = str(track['id']) in liked
+    return tracks
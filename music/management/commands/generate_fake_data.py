@@ -0,0 +1,161 @@
+import datetime
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from music.models import Song, UserProfile, Playlist, PlaylistEntry, LikedSong
+
+USERNAME_PREFIX = 'fake_user_'
+# Generated Deezer IDs are 12 digits starting with this, well above real Deezer track IDs.
+FAKE_ID_PREFIX = '77'
+FAKE_ID_DIGITS = 10
+FAKE_ID_REGEX = rf'^{FAKE_ID_PREFIX}[0-9]{{{FAKE_ID_DIGITS}}}$'
+SYLLABLES = ['la', 'ra', 'mo', 'ne', 'ti', 'ko', 'sa', 'vi', 'du', 'pe', 'an', 'or', 'el', 'us', 'ix',
+             'ba', 'ze', 'lu', 'mi', 'ro', 'ka', 'to', 'fa', 'ny', 'qu', 'sh', 'ch', 'be', 'da', 'go']
+
+
+def _word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def _phrase(rng, max_words):
+    return ' '.join(_word(rng) for _ in range(rng.randint(1, max_words))).title()
+
+
+def _fake_deezer_id(n):
+    return f"{FAKE_ID_PREFIX}{n:0{FAKE_ID_DIGITS}d}"
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates fake users, songs, playlists and liked songs at realistic scale, for load tests and "
+        f"the query-budget tests. Users are named {USERNAME_PREFIX}<n>; {USERNAME_PREFIX}0 is a power user "
+        "who also owns the large playlists and likes --large-playlist-size songs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--songs', type=int, default=100000)
+        parser.add_argument('--playlists-per-user', type=int, default=3)
+        parser.add_argument('--playlist-size', type=int, default=30)
+        parser.add_argument('--large-playlists', type=int, default=10)
+        parser.add_argument('--large-playlist-size', type=int, default=5000)
+        parser.add_argument('--liked-per-user', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated data first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        largest_sample = max(options['playlist_size'], options['large_playlist_size'], options['liked_per_user'])
+        if options['users'] < 1 or options['songs'] < largest_sample:
+            raise CommandError("Need at least one user and at least as many songs as the largest playlist/library.")
+        start = time.monotonic()
+        with transaction.atomic():
+            if options['clear']:
+                self._clear()
+            elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+                raise CommandError("Fake data already exists; run with --clear to replace it.")
+            songs = self._create_songs(rng, options['songs'], batch_size)
+            profiles = self._create_users(options['users'], batch_size)
+            playlist_count, entry_count = self._create_playlists(rng, songs, profiles, options, batch_size)
+            like_count = self._create_likes(rng, songs, profiles, options, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(songs)} songs, {len(profiles)} users, {playlist_count} playlists "
+            f"({entry_count} entries) and {like_count} likes in {time.monotonic() - start:.1f}s."
+        ))
+
+    def _clear(self):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Song.objects.filter(deezer_id__regex=FAKE_ID_REGEX).delete()
+
+    def _create_songs(self, rng, count, batch_size):
+        """Returns [(pk, album_cover_url)] of the new songs."""
+        artists = [_phrase(rng, 2) for _ in range(max(1, count // 20))]
+        albums = max(1, count // 12)
+
+        def songs():
+            for n in range(count):
+                album = rng.randrange(albums)
+                yield Song(
+                    deezer_id=_fake_deezer_id(n), title=_phrase(rng, 4), artist_name=rng.choice(artists),
+                    album_cover_url=f"https://e-cdns-images.dzcdn.net/images/cover/fake{album}/250x250-000000-80-0-0.jpg",
+                    duration=rng.randint(90, 420),
+                )
+        for chunk in _chunks(songs(), batch_size):
+            Song.objects.bulk_create(chunk)
+        # bulk_create does not set primary keys on MySQL/SQLite; read them back.
+        return list(Song.objects.filter(deezer_id__regex=FAKE_ID_REGEX).order_by('pk')
+                    .values_list('pk', 'album_cover_url'))
+
+    def _create_users(self, count, batch_size):
+        """Returns [(profile pk, user pk)], fake_user_0 first. bulk_create skips the profile signal."""
+        password = make_password('fake-password')
+        for chunk in _chunks((User(username=f"{USERNAME_PREFIX}{n}", password=password) for n in range(count)), batch_size):
+            User.objects.bulk_create(chunk)
+        user_ids = dict(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', 'pk'))
+        ordered_user_ids = [user_ids[f"{USERNAME_PREFIX}{n}"] for n in range(count)]
+        for chunk in _chunks((UserProfile(user_id=user_id) for user_id in ordered_user_ids), batch_size):
+            UserProfile.objects.bulk_create(chunk)
+        profile_ids = dict(UserProfile.objects.filter(user_id__in=ordered_user_ids).values_list('user_id', 'pk'))
+        return [(profile_ids[user_id], user_id) for user_id in ordered_user_ids]
+
+    def _create_playlists(self, rng, songs, profiles, options, batch_size):
+        plan = []   # (user pk, name, [(song pk, cover)])
+        for _, user_id in profiles:
+            for p in range(options['playlists_per_user']):
+                plan.append((user_id, f"{_phrase(rng, 3)} {p + 1}", rng.sample(songs, options['playlist_size'])))
+        power_user_id = profiles[0][1]
+        for p in range(options['large_playlists']):
+            plan.append((power_user_id, f"Everything {p + 1}", rng.sample(songs, options['large_playlist_size'])))
+
+        for chunk in _chunks(plan, batch_size):
+            Playlist.objects.bulk_create([
+                Playlist(user_id=user_id, name=name, song_count=len(picked),
+                         cover_image_url=next((cover for _, cover in picked if cover), None))
+                for user_id, name, picked in chunk
+            ])
+        playlist_ids = list(Playlist.objects.filter(user__username__startswith=USERNAME_PREFIX)
+                            .order_by('pk').values_list('pk', flat=True))
+        added_at = timezone.now()
+        entries = (
+            PlaylistEntry(playlist_id=playlist_id, song_id=song_id, position=position, added_at=added_at)
+            for playlist_id, (_, _, picked) in zip(playlist_ids, plan)
+            for position, (song_id, _) in enumerate(picked)
+        )
+        entry_count = 0
+        for chunk in _chunks(entries, batch_size):
+            PlaylistEntry.objects.bulk_create(chunk)
+            entry_count += len(chunk)
+        return len(playlist_ids), entry_count
+
+    def _create_likes(self, rng, songs, profiles, options, batch_size):
+        now = timezone.now()
+
+        def likes():
+            for n, (profile_id, _) in enumerate(profiles):
+                count = max(options['liked_per_user'], options['large_playlist_size']) if n == 0 else options['liked_per_user']
+                for song_id, _ in rng.sample(songs, count):
+                    yield LikedSong(profile_id=profile_id, song_id=song_id,
+                                    liked_at=now - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 365)))
+        like_count = 0
+        for chunk in _chunks(likes(), batch_size):
+            LikedSong.objects.bulk_create(chunk)
+            like_count += len(chunk)
+        return like_count
@@ -0,0 +1,234 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Counters, gauges and histograms are plain dicts keyed by label values
+behind one lock, so recording a value costs a dict update. Every metric
+is declared in METRICS with its type, label names and help text; callers
+pass label values positionally, e.g.
+inc('tunex_deezer_calls_total', 'chart', 'ok').
+
+Each worker process keeps its own values. With METRICS_DIR set (a local
+directory shared by the workers of one host), every worker writes its
+values to <METRICS_DIR>/<pid>.json at most every METRICS_FLUSH_SECONDS,
+after a request, and /metrics adds up the files of all workers: counters
+and histograms of exited workers keep counting, their gauges are
+dropped. Empty the directory when deploying. Without METRICS_DIR, /metrics
+reports the worker that serves it.
+
+Hit ratios, error rates and average latencies are left to PromQL, e.g.
+rate(tunex_cache_lookups_total{result="hit"}[5m]) / rate(tunex_cache_lookups_total[5m]).
+"""
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEEZER_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+
+# name -> (type, label names, help[, buckets])
+METRICS = {
+    'tunex_deezer_call_duration_seconds': (
+        HISTOGRAM, ('endpoint',), "Deezer API call latency, retries included.", DEEZER_BUCKETS),
+    'tunex_deezer_calls_total': (
+        COUNTER, ('endpoint', 'outcome'), "Deezer API calls by outcome: ok, error (network or HTTP status) or timeout."),
+    'tunex_deezer_calls_skipped_total': (
+        COUNTER, ('endpoint', 'reason'), "Deezer API calls not made: coalesced with an identical call, or circuit_open."),
+    'tunex_deezer_calls_in_flight': (
+        GAUGE, ('endpoint',), "Deezer API calls currently waiting on a response."),
+    'tunex_circuit_breaker_open': (
+        GAUGE, ('breaker',), "Workers whose circuit breaker is open or half-open."),
+    'tunex_cache_lookups_total': (
+        COUNTER, ('cache', 'result'), "Lookups of cached Deezer data by result (hit, prefix_hit, stale, miss, last_good)."),
+    'tunex_http_requests_total': (
+        COUNTER, ('view', 'method', 'status'), "Requests handled, by URL name."),
+    'tunex_http_request_duration_seconds': (
+        HISTOGRAM, ('view',), "Request latency, by URL name.", REQUEST_BUCKETS),
+    'tunex_http_requests_in_flight': (
+        GAUGE, (), "Requests currently being handled."),
+    'tunex_db_queries_total': (
+        COUNTER, ('view',), "DB queries run, by URL name."),
+    'tunex_db_query_seconds_total': (
+        COUNTER, ('view',), "Time spent in DB queries, by URL name."),
+}
+
+_values = {}        # (name, label values) -> number, for counters and gauges
+_histograms = {}    # (name, label values) -> [count per bucket..., count above the last bucket, sum]
+_lock = threading.Lock()
+
+_last_flush = 0.0
+
+
+def inc(name, *labels, amount=1):
+    """Adds `amount` (negative for gauges going down) to a counter or gauge."""
+    key = (name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def dec(name, *labels):
+    inc(name, *labels, amount=-1)
+
+
+def set_gauge(name, *labels, value):
+    with _lock:
+        _values[(name, labels)] = value
+
+
+def observe(name, *labels, value):
+    """Records one observation in a histogram."""
+    buckets = METRICS[name][3]
+    key = (name, labels)
+    index = bisect.bisect_left(buckets, value)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[index] += 1
+        counts[-1] += value
+
+
+def snapshot():
+    """This worker's values: {'values': [[name, labels, value]], 'histograms': [[name, labels, counts]]}."""
+    with _lock:
+        return {
+            'values': [[name, list(labels), value] for (name, labels), value in _values.items()],
+            'histograms': [[name, list(labels), list(counts)] for (name, labels), counts in _histograms.items()],
+        }
+
+
+def reset():
+    with _lock:
+        _values.clear()
+        _histograms.clear()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def flush():
+    """Writes this worker's snapshot to METRICS_DIR, if set."""
+    global _last_flush
+    directory = metrics_dir()
+    if not directory:
+        return
+    _last_flush = time.monotonic()
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    try:
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(dict(snapshot(), pid=os.getpid()), f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.error(f"Could not write metrics to {path}: {e}")
+
+
+def maybe_flush():
+    """flush(), at most every METRICS_FLUSH_SECONDS. Called after each request."""
+    if metrics_dir() and time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        flush()
+
+
+atexit.register(flush)
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(total, snap, with_gauges):
+    for name, labels, value in snap['values']:
+        if name not in METRICS or (METRICS[name][0] == GAUGE and not with_gauges):
+            continue
+        key = (name, tuple(labels))
+        total['values'][key] = total['values'].get(key, 0) + value
+    for name, labels, counts in snap['histograms']:
+        if name not in METRICS or len(counts) != len(METRICS[name][3]) + 2:
+            continue  # Buckets changed since this file was written.
+        key = (name, tuple(labels))
+        merged = total['histograms'].get(key)
+        if merged is None:
+            total['histograms'][key] = list(counts)
+        else:
+            total['histograms'][key] = [a + b for a, b in zip(merged, counts)]
+
+
+def collect():
+    """Values of every worker (METRICS_DIR) or of this one, keyed by (name, label values)."""
+    total = {'values': {}, 'histograms': {}}
+    directory = metrics_dir()
+    if not directory:
+        _add(total, snapshot(), with_gauges=True)
+        return total
+    flush()
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snap = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics file {filename}: {e}")
+            continue
+        _add(total, snap, with_gauges=_is_alive(snap.get('pid')))
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def render(total=None):
+    """The Prometheus text exposition (format 0.0.4) of collect()."""
+    total = collect() if total is None else total
+    lines = []
+    for name, (kind, label_names, help_text, *rest) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == HISTOGRAM:
+            buckets = rest[0]
+            for (metric, labels), counts in sorted(total['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, [('le', _number(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(counts[-1])}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+        else:
+            for (metric, labels), value in sorted(total['values'].items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
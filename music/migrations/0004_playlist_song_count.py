@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_song_count(apps, schema_editor):
+    Playlist = apps.get_model('music', 'Playlist')
+    for playlist in Playlist.objects.annotate(num_songs=Count('songs')).only('id').iterator():
+        Playlist.objects.filter(pk=playlist.pk).update(song_count=playlist.num_songs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0003_playlist_cover_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='song_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_song_count, migrations.RunPython.noop),
+    ]
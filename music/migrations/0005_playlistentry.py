@@ -0,0 +1,61 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_positions(apps, schema_editor):
+    PlaylistEntry = apps.get_model('music', 'PlaylistEntry')
+    playlist_ids = PlaylistEntry.objects.values_list('playlist_id', flat=True).distinct()
+    for playlist_id in playlist_ids.iterator():
+        entries = list(PlaylistEntry.objects.filter(playlist_id=playlist_id).order_by('id').only('id'))
+        for position, entry in enumerate(entries):
+            entry.position = position
+        PlaylistEntry.objects.bulk_update(entries, ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0004_playlist_song_count'),
+    ]
+
+    operations = [
+        # Turn the auto-created Playlist.songs table into an explicit through
+        # model without touching the database, then add the new columns.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PlaylistEntry',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='music.playlist')),
+                        ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='music.song')),
+                    ],
+                    options={
+                        'db_table': 'music_playlist_songs',
+                        'unique_together': {('playlist', 'song')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='playlist',
+                    name='songs',
+                    field=models.ManyToManyField(blank=True, through='music.PlaylistEntry', to='music.Song'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='playlistentry',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='playlistentry',
+            name='added_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='playlistentry',
+            index=models.Index(fields=['playlist', 'position'], name='playlist_entry_position_idx'),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0005_playlistentry'),
+    ]
+
+    operations = [
+        # Turn the auto-created UserProfile.liked_songs table into an explicit
+        # through model without touching the database, then add liked_at.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='LikedSong',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('profile', models.ForeignKey(db_column='userprofile_id', on_delete=django.db.models.deletion.CASCADE, to='music.userprofile')),
+                        ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='music.song')),
+                    ],
+                    options={
+                        'db_table': 'music_userprofile_liked_songs',
+                        'unique_together': {('profile', 'song')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='userprofile',
+                    name='liked_songs',
+                    field=models.ManyToManyField(blank=True, related_name='liked_by', through='music.LikedSong', to='music.Song'),
+                ),
+            ],
+        ),
+        # Existing likes get the migration time; the row id still orders them.
+        migrations.AddField(
+            model_name='likedsong',
+            name='liked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='likedsong',
+            index=models.Index(fields=['profile', 'liked_at'], name='liked_song_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+MYSQL_INDEX = 'song_title_artist_ft'
+SQLITE_TABLE = 'music_song_fts'
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE {SQLITE_TABLE} USING fts5(title, artist_name, content='music_song', content_rowid='id')",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_ai AFTER INSERT ON music_song BEGIN
+        INSERT INTO {SQLITE_TABLE}(rowid, title, artist_name) VALUES (new.id, new.title, new.artist_name);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_ad AFTER DELETE ON music_song BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, title, artist_name) VALUES ('delete', old.id, old.title, old.artist_name);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_au AFTER UPDATE OF title, artist_name ON music_song BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, title, artist_name) VALUES ('delete', old.id, old.title, old.artist_name);
+        INSERT INTO {SQLITE_TABLE}(rowid, title, artist_name) VALUES (new.id, new.title, new.artist_name);
+    END""",
+    f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {SQLITE_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {SQLITE_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {SQLITE_TABLE}_au",
+    f"DROP TABLE IF EXISTS {SQLITE_TABLE}",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    """MySQL FULLTEXT index, or an external-content FTS5 table kept in sync by triggers on SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE music_song ADD FULLTEXT INDEX {MYSQL_INDEX} (title, artist_name)")
+    elif vendor == 'sqlite':
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE music_song DROP INDEX {MYSQL_INDEX}")
+    elif vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0006_likedsong'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
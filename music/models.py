@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-import random 
+from django.utils import timezone
 
 class Song(models.Model):
     deezer_id = models.CharField(max_length=20, unique=True)
@@ -24,38 +26,125 @@ class Song(models.Model):
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    liked_songs = models.ManyToManyField(Song, related_name='liked_by', blank=True) 
+    liked_songs = models.ManyToManyField(Song, through='LikedSong', related_name='liked_by', blank=True) 
 
     def __str__(self):
         return self.user.username
 
+class LikedSong(models.Model):
+    """A song in a user's library, with when it was liked."""
+    id = models.AutoField(primary_key=True)  # Same column type as the former auto-created table.
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_column='userprofile_id')
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    liked_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Keeps the table of the former auto-created UserProfile.liked_songs through model.
+        db_table = 'music_userprofile_liked_songs'
+        unique_together = [('profile', 'song')]
+        indexes = [models.Index(fields=['profile', 'liked_at'], name='liked_song_recent_idx')]
+
+    def __str__(self):
+        return f"{self.profile_id} ♥ {self.song_id}"
+
+def _has_cover(prefix=''):
+    return Q(**{f'{prefix}album_cover_url__isnull': False}) & ~Q(**{f'{prefix}album_cover_url': ''})
+
+class PlaylistQuerySet(models.QuerySet):
+    """Set-based song_count/cover maintenance, used by the m2m_changed handler in signals.py."""
+
+    def _songs_through(self):
+        return self.model.songs.through.objects.filter(playlist_id=OuterRef('pk'))
+
+    def recount_songs(self):
+        counts = self._songs_through().values('playlist_id').annotate(n=Count('pk')).values('n')
+        return self.update(song_count=Coalesce(Subquery(counts), 0))
+
+    def fill_missing_covers(self, song_ids):
+        """Gives the playlists that have no cover the cover of one of `song_ids`."""
+        cover = Song.objects.filter(_has_cover(), pk__in=song_ids).values('album_cover_url')[:1]
+        return self.filter(Q(cover_image_url__isnull=True) | Q(cover_image_url='')).update(cover_image_url=Subquery(cover))
+
+    def repick_covers(self, removed_covers):
+        """
+        Playlists whose cover belonged to a removed song, and that no longer
+        contain a song with that cover, get the cover of a random remaining
+        song (picked in the database), or none if nothing is left.
+        """
+        still_present = self._songs_through().filter(song__album_cover_url=OuterRef('cover_image_url'))
+        random_cover = (self._songs_through().filter(_has_cover('song__'))
+                        .order_by('?').values('song__album_cover_url')[:1])
+        return (self.filter(cover_image_url__in=[c for c in removed_covers if c])
+                .exclude(Exists(still_present))
+                .update(cover_image_url=Subquery(random_cover)))
+
 class Playlist(models.Model):
     name = models.CharField(max_length=200)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    songs = models.ManyToManyField(Song, blank=True)
+    songs = models.ManyToManyField(Song, through='PlaylistEntry', blank=True)
     cover_image_url = models.URLField(max_length=500, blank=True, null=True)
+    # Kept in sync with `songs` by the m2m_changed handler in signals.py.
+    song_count = models.PositiveIntegerField(default=0)
+
+    objects = PlaylistQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     def update_cover_image(self):
         """
-        Updates the playlist's cover_image_url with the album cover
-        of a random song in the playlist.
-        If the playlist is empty, clears the cover_image_url.
+        Sets cover_image_url to the album cover of a random song in the
+        playlist (picked in the database), or clears it if there is none.
+        Adds and removes maintain the cover themselves; see signals.py.
+        """
+        random_cover = (Playlist.songs.through.objects.filter(_has_cover('song__'), playlist_id=self.pk)
+                        .order_by('?').values_list('song__album_cover_url', flat=True).first())
+        if self.cover_image_url != random_cover:
+            self.cover_image_url = random_cover
+            self.save(update_fields=['cover_image_url'])
+
+
+class PlaylistEntryQuerySet(models.QuerySet):
+
+    def assign_positions(self, playlist_ids):
+        """
+        Appends the entries of `playlist_ids` that have no position yet
+        (rows inserted by songs.add()/bulk_create) after each playlist's
+        current last position, in insertion order. Must run inside a
+        transaction: the playlist rows stay locked until it commits, so
+        concurrent adds to one playlist take turns instead of reading the
+        same last position.
         """
-        if self.songs.exists():
-            songs_with_covers = self.songs.exclude(album_cover_url__isnull=True).exclude(album_cover_url__exact='')
-            if songs_with_covers.exists():
-                random_song = random.choice(list(songs_with_covers))
-                if self.cover_image_url != random_song.album_cover_url:
-                    self.cover_image_url = random_song.album_cover_url
-                    self.save(update_fields=['cover_image_url'])
-            else:
-                if self.cover_image_url is not None:
-                    self.cover_image_url = None
-                    self.save(update_fields=['cover_image_url'])
-        else:
-            if self.cover_image_url is not None:
-                self.cover_image_url = None
-                self.save(update_fields=['cover_image_url'])
+        # Lock in playlist order so that adds to overlapping playlists can't deadlock.
+        list(Playlist.objects.select_for_update().filter(pk__in=playlist_ids).order_by('pk').values_list('pk', flat=True))
+        unplaced = list(self.filter(playlist_id__in=playlist_ids, position__isnull=True).order_by('id').only('id', 'playlist_id'))
+        if not unplaced:
+            return 0
+        last_positions = dict(self.filter(playlist_id__in={e.playlist_id for e in unplaced})
+                              .values('playlist_id').annotate(last=Max('position')).values_list('playlist_id', 'last'))
+        for entry in unplaced:
+            last = last_positions.get(entry.playlist_id)
+            entry.position = 0 if last is None else last + 1
+            last_positions[entry.playlist_id] = entry.position
+        return self.bulk_update(unplaced, ['position'])
+
+
+class PlaylistEntry(models.Model):
+    """A song in a playlist, in the order it was added."""
+    id = models.AutoField(primary_key=True)  # Same column type as the former auto-created table.
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    # Set by PlaylistEntryQuerySet.assign_positions() right after the row is inserted.
+    position = models.PositiveIntegerField(null=True, blank=True)
+    added_at = models.DateTimeField(default=timezone.now)
+
+    objects = PlaylistEntryQuerySet.as_manager()
+
+    class Meta:
+        # Keeps the table of the former auto-created Playlist.songs through model.
+        db_table = 'music_playlist_songs'
+        unique_together = [('playlist', 'song')]
+        indexes = [models.Index(fields=['playlist', 'position'], name='playlist_entry_position_idx')]
+
+    def __str__(self):
+        return f"{self.playlist_id}#{self.position}: {self.song_id}"
@@ -0,0 +1,383 @@
+"""
+In-process prefix index for instant autocomplete.
+
+Keys are normalized (see search_cache.normalize_query) word-start suffixes
+of track titles, "artist title" strings and artist names, kept in one
+sorted list with a parallel array of entry numbers. Entries come from the
+local Song catalog (built once per worker, in the background, on first
+use) and from chart data: the charts already cached when the build runs,
+then each fetch; new Song rows are added incrementally by a post_save
+handler.
+
+A lookup bisects to the range of keys starting with the query. Short
+ranges are scanned; for a prefix matching more than DIRECT_SCAN_LIMIT keys
+(one or two letters, common words) the best TOP_K entries of each kind
+are collected once and kept up to date on insert, so every later lookup
+of that prefix reads a short list instead of scanning. The build collects
+them for all one- and two-character prefixes up front.
+
+Additions go to a small sorted buffer that is merged into the main arrays
+once it grows past MERGE_THRESHOLD (or 1/32 of the index, if larger), so
+inserts stay cheap at 1M entries.
+The index stops accepting entries once its estimated size reaches
+AUTOCOMPLETE_INDEX_MEMORY_MB. Each entry is one packed string, for about
+650 bytes per song with its keys and cover URL.
+"""
+import bisect
+import heapq
+import logging
+import sys
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from .search_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+CHART_LIMIT = 10          # The limit the index page fetches the track and artist charts with.
+MAX_KEY_LENGTH = 48       # Longer keys (and queries) are truncated; prefixes that long are rare.
+MAX_SUFFIXES = 4          # Word-start suffixes indexed per title/name.
+MERGE_THRESHOLD = 4096    # Minimum buffer size before a merge; grows with the index (see _insert).
+DIRECT_SCAN_LIMIT = 64    # Prefixes matching more keys get a kept top-k list.
+SCAN_LIMIT = 500          # Keys scanned at most once the memory budget leaves no room for another top-k list.
+TOP_K = 16                # Entries kept per kind in a top-k list; lookups ask for at most 10.
+KEY_OVERHEAD = 70         # Approximate bytes per key: str object, list slot and array item.
+ENTRY_OVERHEAD = 110      # Approximate bytes per entry besides its packed string: list slot and dict item.
+WARM_PREFIX_LENGTH = 2    # Prefixes up to this length get their top-k lists at build time.
+TOP_BYTES = 250 + 16 * TOP_K   # Approximate bytes per prefix with top-k lists: dict item and two arrays.
+
+TRACK, ARTIST = 'track', 'artist'
+SEPARATOR = '\x1f'
+NUMBER_MASK = 0xffffffff
+
+
+def _suffixes(normalized):
+    words = normalized.split()
+    return [' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(min(len(words), MAX_SUFFIXES))]
+
+
+def _format_duration(seconds):
+    if seconds is None or seconds < 0:
+        return "0:00"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _offer(top, packed, number):
+    """Adds (key length << 32 | entry number) to a sorted top-k array, keeping one item per entry."""
+    for position, item in enumerate(top):
+        if item & NUMBER_MASK == number:
+            if item <= packed:
+                return
+            del top[position]
+            break
+    if len(top) < TOP_K or packed < top[-1]:
+        bisect.insort(top, packed)
+        if len(top) > TOP_K:
+            top.pop()
+
+
+class PrefixIndex:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.approx_bytes = 0
+        self.full = False
+        self._main = ([], array('I'))     # (sorted keys, entry number per key), replaced wholesale on merge
+        self._pending = ([], [])          # same shape, small and updated in place
+        self._entries = []                # "kind<SEP>id<SEP>payload fields" per entry number
+        self._entry_numbers = {}          # (kind, id) -> entry number
+        self._artist_numbers = set()      # entry numbers of artists; the rest are tracks
+        self._top = {}                    # prefix -> (track top-k, artist top-k) as sorted array('Q')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._main[0]) + len(self._pending[0])
+
+    def _new_entry(self, kind, entry_id, payload, keys):
+        """Registers an entry; returns [(key, entry number)] to insert, or [] if known or over budget."""
+        if (kind, entry_id) in self._entry_numbers or not keys:
+            return []
+        packed = SEPARATOR.join([kind, entry_id] + ['' if field is None else str(field).replace(SEPARATOR, ' ') for field in payload])
+        cost = sys.getsizeof(packed) + ENTRY_OVERHEAD + sum(len(key) + KEY_OVERHEAD for key in keys)
+        if self.approx_bytes + cost > self.max_bytes:
+            if not self.full:
+                self.full = True
+                logger.warning(f"Autocomplete prefix index reached its {self.max_bytes // (1024 * 1024)}MB budget "
+                               f"at {len(self)} keys; further entries are skipped.")
+            return []
+        self.approx_bytes += cost
+        number = len(self._entries)
+        self._entries.append(packed)
+        self._entry_numbers[(kind, entry_id)] = number
+        if kind == ARTIST:
+            self._artist_numbers.add(number)
+        return [(key, number) for key in keys]
+
+    def _track_pairs(self, track_id, title, artist_name, cover_url, duration_formatted, artist_id=None):
+        normalized_title = normalize_query(title)
+        keys = set(_suffixes(normalized_title))
+        keys.add(f"{normalize_query(artist_name)} {normalized_title}".strip()[:MAX_KEY_LENGTH])
+        payload = (title, artist_name, artist_id, cover_url, duration_formatted)
+        return self._new_entry(TRACK, str(track_id), payload, [k for k in keys if k])
+
+    def _artist_pairs(self, artist_id, name, picture_url):
+        return self._new_entry(ARTIST, str(artist_id), (name, picture_url), _suffixes(normalize_query(name)))
+
+    def bulk_load(self, tracks=(), artists=()):
+        """
+        Replaces the index contents with `tracks` (tuples of id, title,
+        artist_name, cover_url, duration_formatted) and `artists` (tuples of
+        id, name, picture_url), sorting once. Used for the initial build.
+        """
+        with self._lock:
+            pairs = []
+            for track in tracks:
+                pairs.extend(self._track_pairs(*track))
+            for artist in artists:
+                pairs.extend(self._artist_pairs(*artist))
+            pairs.extend(zip(*self._pending))
+            pairs.extend(zip(*self._main))
+            pairs.sort()
+            self._main = ([key for key, _ in pairs], array('I', (number for _, number in pairs)))
+            self._pending = ([], [])
+            self.approx_bytes -= len(self._top) * TOP_BYTES
+            self._top.clear()
+
+    def _insert(self, pairs):
+        with self._lock:
+            pending_keys, pending_numbers = self._pending
+            for key, number in pairs:
+                position = bisect.bisect_right(pending_keys, key)
+                pending_keys.insert(position, key)
+                pending_numbers.insert(position, number)
+                if self._top:
+                    self._offer_to_tops(key, number)
+            # Merging rewrites the main arrays, so let the buffer grow with
+            # the index to keep the amortized cost per insert flat.
+            if len(pending_keys) >= max(MERGE_THRESHOLD, len(self._main[0]) // 32):
+                merged = list(heapq.merge(zip(*self._main), zip(pending_keys, pending_numbers)))
+                self._main = ([key for key, _ in merged], array('I', (number for _, number in merged)))
+                self._pending = ([], [])
+
+    def _offer_to_tops(self, key, number):
+        packed = len(key) << 32 | number
+        is_artist = number in self._artist_numbers
+        for length in range(1, len(key) + 1):
+            tops = self._top.get(key[:length])
+            if tops is not None:
+                _offer(tops[is_artist], packed, number)
+
+    def add_track(self, track_id, title, artist_name, cover_url=None, duration_formatted="0:00", artist_id=None):
+        with self._lock:
+            pairs = self._track_pairs(track_id, title, artist_name, cover_url, duration_formatted, artist_id)
+        if pairs:
+            self._insert(pairs)
+
+    def add_artist(self, artist_id, name, picture_url=None):
+        with self._lock:
+            pairs = self._artist_pairs(artist_id, name, picture_url)
+        if pairs:
+            self._insert(pairs)
+
+    @staticmethod
+    def _range(keys, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        return start, bisect.bisect_left(keys, prefix + '\U0010ffff', start)
+
+    @staticmethod
+    def _scan(keys, numbers, start, end, candidates):
+        for key, number in zip(keys[start:end], numbers[start:end]):
+            length = len(key)
+            if candidates.get(number, length + 1) > length:
+                candidates[number] = length
+
+    def _build_top(self, prefix, ranges):
+        """Collects the top-k lists of `prefix` from its full key ranges. Called with the lock held."""
+        best = {}   # entry number -> length of its shortest matching key
+        for (keys, numbers), (start, end) in ranges:
+            self._scan(keys, numbers, start, end, best)
+        artists = self._artist_numbers
+        tops = (array('Q', heapq.nsmallest(TOP_K, (length << 32 | number for number, length in best.items()
+                                                   if number not in artists))),
+                array('Q', sorted(length << 32 | number for number, length in best.items() if number in artists)[:TOP_K]))
+        self._top[prefix] = tops
+        self.approx_bytes += TOP_BYTES
+        return tops
+
+    def _candidates(self, prefix):
+        """{entry number: length of its shortest matching key} for the best entries starting with `prefix`."""
+        with self._lock:
+            tops = self._top.get(prefix)
+            if tops is None:
+                ranges = [(self._main, self._range(self._main[0], prefix)),
+                          (self._pending, self._range(self._pending[0], prefix))]
+                size = sum(end - start for _, (start, end) in ranges)
+                if size <= DIRECT_SCAN_LIMIT:
+                    candidates = {}
+                    for (keys, numbers), (start, end) in ranges:
+                        self._scan(keys, numbers, start, end, candidates)
+                    return candidates
+                if self.approx_bytes + TOP_BYTES > self.max_bytes:
+                    candidates = {}
+                    for (keys, numbers), (start, end) in ranges:
+                        self._scan(keys, numbers, start, min(end, start + SCAN_LIMIT), candidates)
+                    return candidates
+                tops = self._build_top(prefix, ranges)
+            return {item & NUMBER_MASK: item >> 32 for top in tops for item in top}
+
+    def warm_up(self, max_length=WARM_PREFIX_LENGTH):
+        """Collects the top-k lists of every broad prefix of up to `max_length` characters."""
+        keys = self._main[0]
+        for length in range(1, max_length + 1):
+            position = 0
+            while position < len(keys):
+                prefix = keys[position][:length]
+                self._candidates(prefix)
+                position = bisect.bisect_left(keys, prefix + '\U0010ffff', position)
+
+    def lookup(self, query, limit_tracks=10, limit_artists=5):
+        """
+        Entries whose title/name (or "artist title") has a word starting
+        with `query`, shortest matching key first. Returns
+        {'tracks': [...], 'artists': [...]} shaped like the search results.
+        """
+        prefix = normalize_query(query)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return {'tracks': [], 'artists': []}
+        candidates = self._candidates(prefix)
+        results = {'tracks': [], 'artists': []}
+        for number in sorted(candidates, key=lambda number: (candidates[number], number)):
+            kind, entry_id, *payload = self._entries[number].split(SEPARATOR)
+            entry_id = int(entry_id) if entry_id.isdigit() else entry_id
+            if kind == TRACK and len(results['tracks']) < limit_tracks:
+                title, artist_name, artist_id, cover_url, duration_formatted = payload
+                results['tracks'].append({
+                    'id': entry_id, 'title': title, 'artist_name': artist_name,
+                    'artist_id': int(artist_id) if artist_id.isdigit() else (artist_id or None),
+                    'album_cover_medium': cover_url or None, 'duration_formatted': duration_formatted,
+                    'preview_url': None,
+                })
+            elif kind == ARTIST and len(results['artists']) < limit_artists:
+                name, picture_url = payload
+                results['artists'].append({'id': entry_id, 'name': name, 'picture_medium': picture_url or None})
+            if len(results['tracks']) >= limit_tracks and len(results['artists']) >= limit_artists:
+                break
+        return results
+
+    def get_stats(self):
+        return {'keys': len(self), 'entries': len(self._entries), 'top_k_prefixes': len(self._top),
+                'approx_bytes': self.approx_bytes, 'max_bytes': self.max_bytes, 'full': self.full}
+
+
+_index = None
+_ready = threading.Event()
+_index_lock = threading.Lock()
+_backlog = []   # (method name, args) added while the initial build runs
+
+
+def _add_cached_charts(index):
+    """
+    Adds the charts already in Django's cache: the index page usually
+    fetches them before the first instant search starts the build, and
+    remember_chart() only sees fetches made once the index exists.
+    """
+    from . import caching
+
+    tracks = caching.cached_value('get_top_tracks', limit=CHART_LIMIT) or ()
+    artists = caching.cached_value('get_top_artists', limit=CHART_LIMIT) or ()
+    for method, args in _chart_entries(tracks, artists):
+        getattr(index, method)(*args)
+
+
+def _build(index):
+    from django.db import connection
+
+    from .models import Song
+
+    start = time.monotonic()
+    songs = (Song.objects.order_by('-id')
+             .values_list('deezer_id', 'title', 'artist_name', 'album_cover_url', 'duration')
+             .iterator(chunk_size=5000))
+    try:
+        index.bulk_load(tracks=((deezer_id, title, artist_name, cover_url, _format_duration(duration))
+                                for deezer_id, title, artist_name, cover_url, duration in songs))
+        _add_cached_charts(index)
+        index.warm_up()
+        logger.info(f"Autocomplete prefix index built: {index.get_stats()} in {time.monotonic() - start:.2f}s.")
+    except Exception as e:
+        logger.error(f"Building the autocomplete prefix index failed: {e}", exc_info=True)
+    finally:
+        connection.close()   # This thread's connection would otherwise stay open until the server drops it.
+        with _index_lock:
+            backlog = list(_backlog)
+            _backlog.clear()
+            _ready.set()
+        for method, args in backlog:
+            getattr(index, method)(*args)
+
+
+def get_prefix_index():
+    """
+    The worker's prefix index, or None while it is still being built. The
+    first call starts the build in a background thread.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PrefixIndex(getattr(settings, 'AUTOCOMPLETE_INDEX_MEMORY_MB', 768) * 1024 * 1024)
+                threading.Thread(target=_build, args=(_index,), name="prefix-index-build", daemon=True).start()
+    return _index if _ready.is_set() else None
+
+
+def reset():
+    """Drops this worker's index; the next get_prefix_index() call builds a new one."""
+    global _index
+    with _index_lock:
+        _index = None
+        _backlog.clear()
+        _ready.clear()
+
+
+def get_stats():
+    if _index is None:
+        return None
+    return dict(_index.get_stats(), ready=_ready.is_set())
+
+
+def _add(method, *args):
+    if _index is None:
+        return
+    if not _ready.is_set():
+        with _index_lock:
+            if not _ready.is_set():
+                _backlog.append((method, args))
+                return
+    getattr(_index, method)(*args)
+
+
+def remember_song(song):
+    """post_save hook: adds a new Song row to the index if this worker has one."""
+    _add('add_track', song.deezer_id, song.title, song.artist_name, song.album_cover_url,
+         _format_duration(song.duration))
+
+
+def remember_chart(tracks=(), artists=()):
+    """
+    Adds freshly fetched chart data to the index if this worker has one:
+    `tracks` as parsed track dicts, `artists` as the (name, id, picture_url)
+    tuples returned by _parse_top_artists.
+    """
+    for method, args in _chart_entries(tracks, artists):
+        _add(method, *args)
+
+
+def _chart_entries(tracks, artists):
+    for track in tracks:
+        yield 'add_track', (track['id'], track['title'], track['artist_name'], track.get('album_cover_medium'),
+                            track.get('duration_formatted', "0:00"), track.get('artist_id'))
+    for name, artist_id, picture_url in artists:
+        yield 'add_artist', (artist_id, name, picture_url)
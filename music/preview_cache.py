@@ -0,0 +1,65 @@
+import re
+import time
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'preview-url'
+
+# Signed Deezer preview URLs carry their expiry as a Unix timestamp, e.g.
+# ...mp3?hdnea=exp=1715961234~acl=/api/preview/*~data=...~hmac=...
+EXPIRY_RE = re.compile(r'(?:^|[?&~])exp=(\d+)')
+
+
+def _key(deezer_id):
+    return f"{KEY_PREFIX}:{deezer_id}"
+
+
+def parse_expiry(preview_url):
+    """Returns the embedded expiry timestamp of a preview URL, or None if unsigned."""
+    match = EXPIRY_RE.search(preview_url or '')
+    return int(match.group(1)) if match else None
+
+
+def cache_timeout(preview_url, now=None):
+    """
+    Seconds the URL may be handed out for: until PREVIEW_URL_EXPIRY_MARGIN
+    before its embedded expiry, or PREVIEW_URL_DEFAULT_TTL for URLs without
+    one. Returns 0 when the URL is (almost) expired.
+    """
+    expires_at = parse_expiry(preview_url)
+    if expires_at is None:
+        return getattr(settings, 'PREVIEW_URL_DEFAULT_TTL', 10 * 60)
+    now = time.time() if now is None else now
+    return max(0, int(expires_at - now - getattr(settings, 'PREVIEW_URL_EXPIRY_MARGIN', 60)))
+
+
+def get_preview(deezer_id):
+    preview_url = cache.get(_key(deezer_id))
+    metrics.inc('tunex_cache_lookups_total', 'preview', 'miss' if preview_url is None else 'hit')
+    return preview_url
+
+
+def remember_preview(deezer_id, preview_url):
+    timeout = cache_timeout(preview_url)
+    if timeout > 0:
+        cache.set(_key(deezer_id), preview_url, timeout)
+    return timeout
+
+
+def remember_previews(tracks):
+    """Seeds the cache from rendered track dicts ({'id': ..., 'preview_url': ...})."""
+    now = time.time()
+    by_timeout = {}
+    for track in tracks or []:
+        if isinstance(track, dict) and track.get('id') and track.get('preview_url'):
+            timeout = cache_timeout(track['preview_url'], now)
+            if timeout > 0:
+                by_timeout.setdefault(timeout, {})[_key(track['id'])] = track['preview_url']
+    for timeout, entries in by_timeout.items():
+        cache.set_many(entries, timeout)
@@ -0,0 +1,140 @@
+import bisect
+import copy
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+
+
+def normalize_query(query):
+    """
+    Folds a search query for cache lookups: Unicode compatibility
+    decomposition with accents dropped, casefolded, whitespace collapsed.
+    'Beyoncé ', 'beyonce' and 'BEYONCE' all map to 'beyonce'.
+    """
+    text = query or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def _track_matches(track, normalized_query):
+    haystack = normalize_query(f"{track.get('title') or ''} {track.get('artist_name') or ''}")
+    return normalized_query in haystack
+
+
+def _artist_matches(artist, normalized_query):
+    return normalized_query in normalize_query(artist.get('name') or '')
+
+
+class SearchCache:
+    """
+    In-process LRU + TTL cache of autocomplete search results, keyed on the
+    normalized query and the result limits.
+
+    A query that is not cached itself can be answered from a cached longer
+    query starting with it (the user typed 'daft p', backspaced to 'daft'),
+    provided that enough of the longer result's tracks still match the
+    shorter query. Results are deep-copied on the way out because views
+    annotate tracks in place (is_liked).
+    """
+
+    def __init__(self, max_entries=2000, ttl=300, prefix_min_matches=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix_min_matches = prefix_min_matches
+        self._entries = OrderedDict()
+        self._sorted_keys = []
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'prefix_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _remove(self, key):
+        del self._entries[key]
+        index = bisect.bisect_left(self._sorted_keys, key)
+        if index < len(self._sorted_keys) and self._sorted_keys[index] == key:
+            del self._sorted_keys[index]
+
+    def _from_longer_query(self, normalized, limits, now):
+        index = bisect.bisect_right(self._sorted_keys, (normalized, limits))
+        candidates = []
+        while index < len(self._sorted_keys) and self._sorted_keys[index][0].startswith(normalized):
+            key = self._sorted_keys[index]
+            if key[1] == limits and self._entries[key][0] > now:
+                candidates.append(key)
+            index += 1
+        for key in sorted(candidates, key=lambda k: len(k[0])):
+            results = self._entries[key][1]
+            tracks = [t for t in results.get('tracks', []) if _track_matches(t, normalized)]
+            if len(tracks) >= self.prefix_min_matches:
+                self._entries.move_to_end(key)
+                artists = [a for a in results.get('artists', []) if _artist_matches(a, normalized)]
+                albums = [a for a in results.get('albums', []) if normalized in normalize_query(a.get('title') or '')]
+                return {'tracks': tracks, 'artists': artists, 'albums': albums}
+        return None
+
+    def get(self, query, limits):
+        normalized = normalize_query(query)
+        key = (normalized, tuple(limits))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    metrics.inc('tunex_cache_lookups_total', 'search', 'hit')
+                    return copy.deepcopy(entry[1])
+                self._remove(key)
+            results = self._from_longer_query(normalized, key[1], now)
+            if results is not None:
+                self._stats['prefix_hits'] += 1
+                metrics.inc('tunex_cache_lookups_total', 'search', 'prefix_hit')
+                return copy.deepcopy(results)
+            self._stats['misses'] += 1
+            metrics.inc('tunex_cache_lookups_total', 'search', 'miss')
+            return None
+
+    def set(self, query, limits, results):
+        key = (normalize_query(query), tuple(limits))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(results))
+            bisect.insort(self._sorted_keys, key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sorted_keys = []
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats['hits'] + stats['prefix_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['prefix_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache(
+                    max_entries=getattr(settings, 'SEARCH_CACHE_MAX_ENTRIES', 2000),
+                    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 300),
+                    prefix_min_matches=getattr(settings, 'SEARCH_CACHE_PREFIX_MIN_MATCHES', 5),
+                )
+    return _search_cache
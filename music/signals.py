@@ -1,8 +1,12 @@
 # music/signals.py
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import UserProfile
+from . import prefix_index, timing
+from .context_processors import invalidate_sidebar_playlists
+from .models import UserProfile, Playlist, Song
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -29,3 +33,69 @@ def save_user_profile(sender, instance, **kwargs):
         UserProfile.objects.create(user=instance)
         print(f"UserProfile was missing, created and saved for {instance.username}")
 
+
+@receiver(connection_created)
+def time_queries_on_new_connection(sender, connection, **kwargs):
+    timing.install_query_timer(connection)
+
+@receiver(post_save, sender=Song)
+def add_new_song_to_prefix_index(sender, instance, created, **kwargs):
+    if created:
+        prefix_index.remember_song(instance)
+
+@receiver(post_save, sender=Playlist)
+def invalidate_sidebar_on_playlist_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drops the owner's cached sidebar list when a playlist is created or
+    renamed. Saves limited to other fields (e.g. the cover image) keep it.
+    """
+    if created or update_fields is None or 'name' in update_fields:
+        invalidate_sidebar_playlists(instance.user_id)
+
+@receiver(post_delete, sender=Playlist)
+def invalidate_sidebar_on_playlist_delete(sender, instance, **kwargs):
+    invalidate_sidebar_playlists(instance.user_id)
+
+@receiver(m2m_changed, sender=Playlist.songs.through)
+def maintain_playlist_song_count_and_cover(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps Playlist.song_count and cover_image_url in step with
+    Playlist.songs for adds, removes and clears from either side of the
+    relation, with set-based UPDATEs that never load the song list, and
+    appends newly added entries at the end of their playlist.
+
+    For adds Django only puts the rows it actually inserted in pk_set, so a
+    delta is enough, and only playlists without a cover get one. Removes
+    report whatever was asked for, so those recount, and re-pick the cover
+    only where it belonged to a removed song.
+    """
+    if action == 'pre_clear' and reverse:
+        # song.playlist_set.clear(): remember which playlists lose the song.
+        instance._cleared_playlist_ids = list(sender.objects.filter(song_id=instance.pk).values_list('playlist_id', flat=True))
+    elif action == 'post_add' and pk_set:
+        if reverse:
+            playlists = Playlist.objects.filter(pk__in=pk_set)
+            playlists.update(song_count=F('song_count') + 1)
+            playlists.fill_missing_covers([instance.pk])
+            sender.objects.assign_positions(pk_set)
+        else:
+            playlists = Playlist.objects.filter(pk=instance.pk)
+            playlists.update(song_count=F('song_count') + len(pk_set))
+            playlists.fill_missing_covers(pk_set)
+            sender.objects.assign_positions([instance.pk])
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            playlists = Playlist.objects.filter(pk__in=pk_set)
+            removed_covers = [instance.album_cover_url]
+        else:
+            playlists = Playlist.objects.filter(pk=instance.pk)
+            removed_covers = list(Song.objects.filter(pk__in=pk_set).values_list('album_cover_url', flat=True).distinct())
+        playlists.recount_songs()
+        playlists.repick_covers(removed_covers)
+    elif action == 'post_clear':
+        if reverse:
+            playlists = Playlist.objects.filter(pk__in=getattr(instance, '_cleared_playlist_ids', []))
+            playlists.recount_songs()
+            playlists.repick_covers([instance.album_cover_url])
+        else:
+            Playlist.objects.filter(pk=instance.pk).update(song_count=0, cover_image_url=None)
@@ -1,3 +1,805 @@
-from django.test import TestCase
+"""
+Query-count and Deezer-call budgets per view, at realistic data scale.
 
-# Create your tests here.
+The data comes from the generate_fake_data command. By default the tests
+use fewer users and songs than the command does, but always the full
+5,000-track playlists and 5,000-song library for the power user
+(fake_user_0), which setUpTestData checks. Set TUNEX_BUDGET_FULL_SCALE=1
+to run at the command's full defaults.
+Deezer is the local stub from benchmarks/. Every request starts with
+empty caches, so the budgets are cold-cache worst cases.
+
+A budget is a fixed number, so a view whose queries or upstream calls
+grow with the size of a playlist or library fails here.
+"""
+import datetime
+import html
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from benchmarks.deezer_stub import start_stub
+
+from . import async_views, caching, deezer, liked_cache, prefix_index, views
+from .asgi import ASGIHandler
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .models import LikedSong, Playlist, PlaylistEntry, Song, UserProfile
+from .prefix_index import PrefixIndex
+from .search_cache import SearchCache, get_search_cache
+
+FULL_SCALE = os.environ.get('TUNEX_BUDGET_FULL_SCALE') == '1'
+LARGE_SIZE = 5000   # Tracks in the power user's large playlists, and songs in their library
+DATA_SCALE = {} if FULL_SCALE else {
+    'users': 200, 'songs': 20000, 'liked_per_user': 50, 'large_playlists': 2, 'large_playlist_size': LARGE_SIZE,
+}
+
+
+def _deezer_calls():
+    return sum(entry['count'] for entry in deezer.get_stats().values())
+
+
+# Loads add_to_playlist_modal.js and infinite_scroll.js into a minimal DOM,
+# appends one row per track ID of argv[2] (a JSON list), clicks each row's
+# add-to-playlist button before and after bindTrackRowActions, and prints
+# whether the modal was shown each time.
+ROW_ACTIONS_SCRIPT = r"""
+const fs = require('fs'), path = require('path'), vm = require('vm');
+function element(dataset = {}) {
+    const listeners = {};
+    return {
+        dataset, style: {}, innerHTML: '', classList: { add() {}, remove() {} },
+        getAttribute(name) { return this.dataset[name.replace(/^data-/, '').replace(/-(.)/g, (_, c) => c.toUpperCase())]; },
+        addEventListener(type, fn) { (listeners[type] = listeners[type] || []).push(fn); },
+        appendChild() {},
+        click() { (listeners.click || []).forEach(fn => fn.call(this, { target: this, stopPropagation() {} })); },
+    };
+}
+const ids = {};
+['playlist-selection-modal', 'playlist-list', 'cancel-add-to-playlist', 'confirm-add-to-playlist']
+    .forEach(id => { ids[id] = element(); });
+const buttons = [], ready = [];
+const context = vm.createContext({
+    console: { log() {}, warn() {}, error() {} },
+    document: {
+        getElementById: id => ids[id] || null,
+        querySelector: () => ({ getAttribute: () => 'token' }),
+        querySelectorAll: selector => selector === '.add-to-playlist-button' ? buttons.slice() : [],
+        createElement: () => element(),
+        addEventListener: (type, fn) => { if (type === 'DOMContentLoaded') ready.push(fn); },
+    },
+    fetch: async () => ({ ok: true, json: async () => ({ playlists: [] }) }),
+    setTimeout, IntersectionObserver: class {},
+});
+context.window = context;
+for (const name of ['add_to_playlist_modal.js', 'infinite_scroll.js']) {
+    vm.runInContext(fs.readFileSync(path.join(process.argv[1], name), 'utf8'), context);
+}
+ready.forEach(fn => fn());
+const modal = ids['playlist-selection-modal'];
+async function clickShowsModal(button) {
+    modal.style.display = 'none';
+    button.click();
+    await new Promise(resolve => setImmediate(resolve));
+    return modal.style.display === 'flex';
+}
+(async () => {
+    const results = [];
+    for (const trackId of JSON.parse(process.argv[2])) {
+        const button = element({ trackId });
+        const row = { querySelectorAll: selector => selector === '.add-to-playlist-button' ? [button] : [] };
+        buttons.push(button);
+        const before = await clickShowsModal(button);
+        context.bindTrackRowActions([row]);
+        results.push([before, await clickShowsModal(button)]);
+    }
+    console.log(JSON.stringify(results));
+})();
+"""
+
+
+def _click_appended_add_buttons(test, rows_html):
+    """[shown before binding, shown after] for each add-to-playlist button of `rows_html`, appended by infinite scroll."""
+    node = shutil.which('node')
+    if node is None:
+        test.skipTest("node is not installed")
+    track_ids = re.findall(r'class="add-to-playlist-button"\s+data-track-id="([^"]+)"', rows_html)
+    test.assertTrue(track_ids, "appended rows must carry add-to-playlist buttons")
+    output = subprocess.run(
+        [node, '-e', ROW_ACTIONS_SCRIPT, os.path.join(settings.BASE_DIR, 'static', 'js'), json.dumps(track_ids)],
+        capture_output=True, text=True, check=True, timeout=30,
+    ).stdout
+    return json.loads(output)
+
+
+class ViewBudgetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = start_stub()
+        cls.stub_settings = override_settings(DEEZER_API_URL=f"http://127.0.0.1:{cls.stub.server_port}")
+        cls.stub_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.stub_settings.disable()
+        cls.stub.shutdown()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_fake_data', verbosity=0, stdout=open(os.devnull, 'w'), **DATA_SCALE)
+        cls.user = User.objects.get(username='fake_user_0')
+        playlists = Playlist.objects.filter(user=cls.user).order_by('-song_count', 'id')
+        cls.large_playlist = playlists[0]
+        cls.playlist_ids = list(playlists.values_list('id', flat=True))
+        cls.song_in_library = Song.objects.filter(liked_by__user=cls.user).first()
+        cls.song_elsewhere = Song.objects.exclude(liked_by__user=cls.user).exclude(playlist__user=cls.user).first()
+        assert cls.large_playlist.song_count >= LARGE_SIZE, cls.large_playlist.song_count
+        assert LikedSong.objects.filter(profile__user=cls.user).count() >= LARGE_SIZE
+
+    def setUp(self):
+        cache.clear()
+        get_search_cache().clear()
+        deezer.get_breaker().reset()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, method, path, max_queries, max_deezer_calls, json_body=None):
+        calls_before = _deezer_calls()
+        with CaptureQueriesContext(connection) as queries:
+            if json_body is None:
+                response = getattr(self.client, method)(path)
+            else:
+                response = getattr(self.client, method)(path, data=json.dumps(json_body), content_type='application/json')
+            if response.streaming:
+                b''.join(response.streaming_content)  # The body runs the upstream calls and queries.
+        calls = _deezer_calls() - calls_before
+        self.assertLess(response.status_code, 400, f"{method.upper()} {path} returned {response.status_code}")
+        self.assertLessEqual(len(queries), max_queries, "\n".join(
+            [f"{method.upper()} {path} ran {len(queries)} queries (budget {max_queries}):"]
+            + [query['sql'] for query in queries.captured_queries]))
+        self.assertLessEqual(calls, max_deezer_calls,
+                             f"{method.upper()} {path} made {calls} Deezer calls (budget {max_deezer_calls})")
+        return response
+
+    def test_index(self):
+        self.assertWithinBudget('get', reverse('index'), max_queries=5, max_deezer_calls=3)
+
+    def test_search_view(self):
+        self.assertWithinBudget('get', f"{reverse('search')}?q=la", max_queries=7, max_deezer_calls=3)
+
+    def test_ajax_search_view(self):
+        self.assertWithinBudget('get', f"{reverse('ajax_search')}?q=la", max_queries=6, max_deezer_calls=4)
+
+    def test_ajax_search_view_cached_skips_local_search(self):
+        path = f"{reverse('ajax_search')}?q=la"
+        self.client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.assertWithinBudget('get', path, max_queries=4, max_deezer_calls=0)
+        self.assertEqual(len(response.json()['tracks']), 10)
+        self.assertFalse([query for query in queries.captured_queries if 'music_song_fts' in query['sql']])
+
+    def test_artist_profile_view(self):
+        self.assertWithinBudget('get', reverse('artist_profile', args=[27]), max_queries=5, max_deezer_calls=2)
+
+    def test_deezer_playlist_detail_view(self):
+        self.assertWithinBudget('get', reverse('deezer_playlist_detail', args=[5]), max_queries=5, max_deezer_calls=1)
+
+    def test_known_artists_and_playlists_are_streamed(self):
+        for name, item_id, title in (('artist_profile', 28, 'Artist 28'), ('deezer_playlist_detail', 6, 'Playlist 6')):
+            with self.subTest(name=name):
+                first = self.client.get(reverse(name, args=[item_id]))
+                self.assertFalse(first.streaming)
+                self.assertContains(first, f"<title>{title} - TuneX</title>")
+                second = self.client.get(reverse(name, args=[item_id]))
+                self.assertTrue(second.streaming)
+                body = b''.join(second.streaming_content).decode()
+                self.assertIn('id="page-loading"', body)
+                self.assertIn(f'document.title = "{title} - TuneX"', body)
+
+    def test_unknown_artists_and_playlists_are_404(self):
+        failing = start_stub(error_rate=1.0, error_status=400)
+        try:
+            with override_settings(DEEZER_API_URL=f"http://127.0.0.1:{failing.server_port}"):
+                for name in ('artist_profile', 'deezer_playlist_detail'):
+                    with self.subTest(name=name):
+                        self.assertEqual(self.client.get(reverse(name, args=[404404])).status_code, 404)
+        finally:
+            failing.shutdown()
+
+    def test_new_releases_view(self):
+        self.assertWithinBudget('get', reverse('new_releases'), max_queries=4, max_deezer_calls=1)
+
+    def test_my_playlists_view(self):
+        self.assertWithinBudget('get', reverse('my_playlists'), max_queries=5, max_deezer_calls=0)
+
+    def test_user_playlist_detail_view_large_playlist(self):
+        self.assertWithinBudget('get', reverse('user_playlist_detail', args=[self.large_playlist.id]),
+                                max_queries=8, max_deezer_calls=0)
+
+    def test_playlist_songs_api_view_large_playlist(self):
+        response = self.assertWithinBudget('get', reverse('playlist_songs_api', args=[self.large_playlist.id]),
+                                           max_queries=7, max_deezer_calls=0)
+        next_after = response.json()['next_after']
+        self.assertWithinBudget('get', f"{reverse('playlist_songs_api', args=[self.large_playlist.id])}?after={next_after}",
+                                max_queries=7, max_deezer_calls=0)
+
+    def test_liked_songs_list_view_large_library(self):
+        self.assertWithinBudget('get', reverse('liked_songs'), max_queries=6, max_deezer_calls=0)
+        self.assertWithinBudget('get', f"{reverse('liked_songs')}?sort=title", max_queries=6, max_deezer_calls=0)
+
+    def test_liked_songs_api_view_large_library(self):
+        self.assertWithinBudget('get', reverse('liked_songs_api'), max_queries=6, max_deezer_calls=0)
+
+    def test_list_user_playlists_view(self):
+        self.assertWithinBudget('get', reverse('list_user_playlists'), max_queries=4, max_deezer_calls=0)
+
+    def test_like_song_view_known_song(self):
+        self.assertWithinBudget('post', reverse('like_song'), max_queries=7, max_deezer_calls=0,
+                                json_body={'deezer_id': self.song_in_library.deezer_id})
+
+    def test_like_song_view_new_song(self):
+        self.assertWithinBudget('post', reverse('like_song'), max_queries=12, max_deezer_calls=1,
+                                json_body={'deezer_id': '3135556'})
+
+    def test_add_song_to_playlists_view(self):
+        self.assertWithinBudget('post', reverse('add_song_to_playlists'), max_queries=14, max_deezer_calls=0,
+                                json_body={'deezer_id': self.song_elsewhere.deezer_id, 'playlist_ids': self.playlist_ids})
+
+    def test_add_and_remove_song_large_playlist(self):
+        url = reverse('add_song_to_playlist', args=[self.large_playlist.id])
+        self.assertWithinBudget('post', url, max_queries=13, max_deezer_calls=0,
+                                json_body={'deezer_id': self.song_elsewhere.deezer_id})
+        self.assertWithinBudget('post', reverse('remove_song_from_playlist', args=[self.large_playlist.id]),
+                                max_queries=10, max_deezer_calls=0,
+                                json_body={'deezer_id': self.song_elsewhere.deezer_id})
+
+    def test_save_deezer_playlist_view(self):
+        self.assertWithinBudget('post', reverse('save_deezer_playlist', args=[5]), max_queries=13, max_deezer_calls=1)
+
+
+class PlaylistPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='paging', password='x')
+        cls.playlist = Playlist.objects.create(user=cls.user, name='Paging')
+        songs = Song.objects.bulk_create([Song(deezer_id=str(900 + n), title=f"Song {n}", artist_name='A') for n in range(7)])
+        songs = list(Song.objects.filter(deezer_id__in=[song.deezer_id for song in songs]).order_by('pk'))
+        # Two rows share position 1 (concurrent adds before positions were locked); two never got one.
+        positions = [0, 1, 1, 2, 3, None, None]
+        PlaylistEntry.objects.bulk_create([
+            PlaylistEntry(playlist=cls.playlist, song=song, position=position) for song, position in zip(songs, positions)
+        ])
+        cls.expected = [song.deezer_id for song in songs]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _all_pages(self, limit):
+        url = reverse('playlist_songs_api', args=[self.playlist.id])
+        seen, after = [], None
+        while True:
+            response = self.client.get(url, {'limit': limit, **({'after': after} if after else {})})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            seen += [song['deezer_id'] for song in data['songs']]
+            after = data['next_after']
+            if after is None:
+                return seen
+
+    def test_every_row_is_paged_exactly_once(self):
+        for limit in range(1, 9):
+            with self.subTest(limit=limit):
+                self.assertEqual(self._all_pages(limit), self.expected)
+
+    def test_appended_rows_open_the_add_to_playlist_modal(self):
+        page = self.client.get(reverse('user_playlist_detail', args=[self.playlist.id])).content.decode()
+        self.assertIn('bindTrackRowActions(newRows, initLikeButtons);', page)
+        url = reverse('playlist_songs_api', args=[self.playlist.id])
+        after = self.client.get(url, {'limit': 2}).json()['next_after']
+        data = self.client.get(url, {'limit': 3, 'after': after}).json()
+        self.assertEqual(_click_appended_add_buttons(self, data['html']), [[False, True]] * 3)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(reverse('playlist_songs_api', args=[self.playlist.id]), {'after': 'x|y'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_adds_place_unplaced_rows_then_append(self):
+        song = Song.objects.create(deezer_id='999', title='New', artist_name='A')
+        self.playlist.songs.add(song)
+        entries = PlaylistEntry.objects.filter(playlist=self.playlist)
+        self.assertFalse(entries.filter(position__isnull=True).exists())
+        self.assertEqual(entries.get(song=song).position, 6)
+        self.assertEqual(self._all_pages(3), self.expected + ['999'])
+
+
+class LikedSongsPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='liker', password='x')
+        profile, _ = UserProfile.objects.get_or_create(user=cls.user)
+        cls.count = 150
+        Song.objects.bulk_create([
+            Song(deezer_id=str(5000 + n), title=f"Title {n % 40:02d} & co", artist_name='A') for n in range(cls.count)
+        ])
+        songs = Song.objects.filter(deezer_id__startswith='5').order_by('pk')
+        now = timezone.now()
+        # Every third like shares its timestamp with the previous one.
+        LikedSong.objects.bulk_create([
+            LikedSong(profile=profile, song=song, liked_at=now - datetime.timedelta(seconds=n - n % 3))
+            for n, song in enumerate(songs)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _scroll(self, sort):
+        """Loads the library page, then follows its infinite-scroll cursor like infinite_scroll.js does."""
+        page = self.client.get(reverse('liked_songs'), {'sort': sort}).content.decode()
+        track_list = re.search(r'<div class="track-list"([^>]*)>', page).group(1)
+        page_url = html.unescape(re.search(r'data-page-url="([^"]*)"', track_list).group(1))
+        next_after = re.search(r'data-next-after="([^"]*)"', track_list)
+        self.assertIsNotNone(next_after, "a library larger than one page must carry a cursor")
+        after = html.unescape(next_after.group(1))
+        seen = re.findall(r'<div class="track-item"\s+data-track-id="(\d+)"', page)
+        while after is not None:
+            data = self.client.get(f"{page_url}&{urlencode({'after': after})}").json()
+            seen += [song['deezer_id'] for song in data['songs']]
+            after = data['next_after']
+        return seen
+
+    def test_scrolls_whole_library_in_both_sorts(self):
+        self.assertGreater(self.count, settings.PLAYLIST_PAGE_SIZE)
+        for sort in ('recent', 'title'):
+            with self.subTest(sort=sort):
+                seen = self._scroll(sort)
+                self.assertEqual(len(seen), self.count)
+                self.assertEqual(len(set(seen)), self.count)
+
+    def test_appended_rows_open_the_add_to_playlist_modal(self):
+        page = self.client.get(reverse('liked_songs')).content.decode()
+        self.assertIn('bindTrackRowActions(newRows);', page)
+        after = html.unescape(re.search(r'data-next-after="([^"]*)"', page).group(1))
+        data = self.client.get(reverse('liked_songs_api'), {'sort': 'recent', 'after': after}).json()
+        self.assertEqual(_click_appended_add_buttons(self, data['html']), [[False, True]] * len(data['songs']))
+
+    def test_sort_toggle_links_both_orders(self):
+        page = self.client.get(reverse('liked_songs'), {'sort': 'title'}).content.decode()
+        self.assertIn('href="?sort=recent"', page)
+        self.assertIn('href="?sort=title" class="sort-option active"', page)
+
+
+class LikedCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cached', password='x')
+        cls.profile, _ = UserProfile.objects.get_or_create(user=cls.user)
+        Song.objects.bulk_create([
+            Song(deezer_id=str(7000 + n), title=f"Song {n}", artist_name='A') for n in range(3)
+        ])
+        cls.songs = list(Song.objects.filter(deezer_id__startswith='700').order_by('deezer_id'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _like(self, song):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like_song'), {'deezer_id': song.deezer_id})
+
+    def test_likes_and_unlikes_show_up_after_commit(self):
+        self.assertEqual(list(liked_cache.get_liked_ids(self.user.pk)), [])
+        self._like(self.songs[0])
+        self._like(self.songs[1])
+        self.assertEqual(list(liked_cache.get_liked_ids(self.user.pk)), [7000, 7001])
+        self._like(self.songs[0])
+        self.assertEqual(liked_cache.liked_among(self.user.pk, ['7000', '7001', '7002']), {'7001'})
+
+    def test_stale_load_does_not_outlive_a_change(self):
+        # A load that read the library before a like committed stores its array under the old version.
+        key = liked_cache._key(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            LikedSong.objects.create(profile=self.profile, song=self.songs[2])
+            liked_cache.invalidate(self.user.pk)
+        cache.set(key, liked_cache.array('q'))
+        self.assertEqual(list(liked_cache.get_liked_ids(self.user.pk)), [7002])
+
+    def test_invalidate_waits_for_commit(self):
+        liked_cache.get_liked_ids(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            LikedSong.objects.create(profile=self.profile, song=self.songs[2])
+            liked_cache.invalidate(self.user.pk)
+        self.assertEqual(list(liked_cache.get_liked_ids(self.user.pk)), [])
+        callbacks[0]()
+        self.assertEqual(list(liked_cache.get_liked_ids(self.user.pk)), [7002])
+
+
+class PrefixIndexTests(SimpleTestCase):
+
+    def _index(self):
+        index = PrefixIndex(64 * 1024 * 1024)
+        index.bulk_load(tracks=[(n, f"{'la ' * (n % 4)}{word}{n}", f"Band {n % 7}", None, "3:00")
+                                for n, word in enumerate(['lalo', 'lamp', 'land', 'love', 'mono'] * 60)],
+                        artists=[(900 + n, f"La {n}", None) for n in range(30)])
+        index.warm_up()
+        return index
+
+    def _expected(self, index, prefix, limit_tracks=10, limit_artists=5):
+        """What a full scan of every key returns."""
+        keys, numbers = index._main
+        best = {}
+        for key, number in list(zip(keys, numbers)) + list(zip(*index._pending)):
+            if key.startswith(prefix) and best.get(number, len(key) + 1) > len(key):
+                best[number] = len(key)
+        ranked = sorted(best, key=lambda number: (best[number], number))
+        tracks = [n for n in ranked if n not in index._artist_numbers][:limit_tracks]
+        artists = [n for n in ranked if n in index._artist_numbers][:limit_artists]
+        return ([index._entries[n].split('\x1f')[1] for n in tracks],
+                [index._entries[n].split('\x1f')[1] for n in artists])
+
+    def _ids(self, results):
+        return ([str(track['id']) for track in results['tracks']],
+                [str(artist['id']) for artist in results['artists']])
+
+    def test_broad_prefixes_match_a_full_scan(self):
+        index = self._index()
+        self.assertGreater(index.get_stats()['top_k_prefixes'], 0)
+        for query in ('l', 'La', 'la l', 'lam', 'm', 'band 3', 'mono1'):
+            with self.subTest(query=query):
+                self.assertEqual(self._ids(index.lookup(query)), self._expected(index, query.lower()))
+
+    def test_inserts_reach_kept_top_lists(self):
+        index = self._index()
+        index.lookup('la')
+        index.add_track(5000, 'La', 'X', None, '1:00')
+        index.add_artist(6000, 'L', None)
+        self.assertEqual(self._ids(index.lookup('la'))[0][0], '5000')
+        self.assertEqual(self._ids(index.lookup('l'))[1][0], '6000')
+        for query in ('l', 'la'):
+            with self.subTest(query=query):
+                self.assertEqual(self._ids(index.lookup(query)), self._expected(index, query))
+
+
+
+class PrefixIndexChartTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_stub()
+        cls.stub_settings = override_settings(DEEZER_API_URL=f"http://127.0.0.1:{cls.stub.server_port}")
+        cls.stub_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub_settings.disable()
+        cls.stub.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        deezer.get_breaker().reset()
+        prefix_index.reset()
+        self.addCleanup(prefix_index.reset)
+
+    def _instant(self, query):
+        url = reverse('ajax_instant_search')
+        deadline = time.monotonic() + 10
+        while not self.client.get(url, {'q': query}).json()['ready'] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self.client.get(url, {'q': query}).json()
+
+    def test_charts_fetched_before_the_build_are_indexed(self):
+        self.assertEqual(len(views.get_top_tracks(limit=prefix_index.CHART_LIMIT)), 10)
+        self.assertEqual(len(views.get_top_artists(limit=prefix_index.CHART_LIMIT)), 10)
+        self.assertIsNone(prefix_index.get_stats())
+        self.assertIn('Artist 1', [artist['name'] for artist in self._instant('artist 1')['artists']])
+        self.assertEqual(sorted(track['id'] for track in self._instant('track 1')['tracks']), [1, 10])
+
+class AsyncStreamingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = start_stub(latency_ms=300)
+        cls.stub_settings = override_settings(DEEZER_API_URL=f"http://127.0.0.1:{cls.stub.server_port}")
+        cls.stub_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.stub_settings.disable()
+        cls.stub.shutdown()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='streamer', password='x')
+
+    def setUp(self):
+        cache.clear()
+        deezer.get_breaker().reset()
+
+    def _send(self, view, *args):
+        """Runs an async view and sends its response as the ASGI handler does; returns [(seconds, body)]."""
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        async def run():
+            sent = []
+            start = time.perf_counter()
+
+            async def send(message):
+                if message.get('body'):
+                    sent.append((time.perf_counter() - start, message['body'].decode()))
+            await ASGIHandler().send_response(await view(request, *args), send)
+            return sent
+        return async_to_sync(run)()
+
+    def test_known_artist_shell_goes_out_before_deezer_answers(self):
+        async_to_sync(async_views.aget_artist_details)(29)
+        sent = self._send(async_views.artist_profile_view, 29)
+        self.assertIn('id="page-loading"', sent[0][1])
+        self.assertLess(sent[0][0], 0.2)
+        content_at = next(at for at, body in sent[1:] if 'Artist 29' in body)
+        self.assertGreaterEqual(content_at, 0.3)
+
+    def test_unknown_artist_is_answered_in_one_piece(self):
+        sent = self._send(async_views.artist_profile_view, 30)
+        self.assertEqual(len(sent), 1)
+        self.assertIn('<title>Artist 30 - TuneX</title>', sent[0][1])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def _call(self, breaker, failed=True, elapsed=0.01, times=1):
+        for _ in range(times):
+            permit = breaker.allow_request()
+            self.assertIsNotNone(permit)
+            breaker.record(permit, elapsed, failed=failed)
+
+    def test_opens_after_consecutive_failures_then_probes_once(self):
+        breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=0.05)
+        self._call(breaker, times=2)
+        self._call(breaker, failed=False)
+        self._call(breaker, times=2)
+        self.assertEqual(breaker.state, CLOSED)
+        self._call(breaker)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertTrue(breaker.is_open())
+        self.assertIsNone(breaker.allow_request())
+        time.sleep(0.06)
+        self.assertFalse(breaker.is_open())
+        probe = breaker.allow_request()
+        self.assertTrue(probe.probe)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertIsNone(breaker.allow_request(), "only one probe at a time")
+        breaker.record(probe, 0.01, failed=False)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.get_state()['rejected'], 2)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+        self._call(breaker)
+        time.sleep(0.06)
+        self._call(breaker)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertIsNone(breaker.allow_request())
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, slow_call_seconds=0.5)
+        self._call(breaker, failed=False, elapsed=0.6, times=2)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.get_state()['slow_calls'], 2)
+
+    def test_calls_admitted_before_a_state_change_do_not_decide_the_probe(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+        late_success, late_failure = breaker.allow_request(), breaker.allow_request()
+        self._call(breaker)
+        time.sleep(0.06)
+        probe = breaker.allow_request()
+        breaker.record(late_success, 0.01, failed=False)
+        breaker.record(late_failure, 0.01, failed=True)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertIsNone(breaker.allow_request(), "the probe is still in flight")
+        breaker.record(probe, 0.01, failed=False)
+        self.assertEqual(breaker.state, CLOSED)
+
+
+class StaleWhileRevalidateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        deezer.get_breaker().reset()
+
+    def _fetcher(self, name, values):
+        calls = []
+
+        @caching.stale_while_revalidate('chart', name=name)
+        def fetch(n):
+            calls.append(n)
+            return values.pop(0)
+        return fetch, calls
+
+    def test_serves_stale_copy_while_one_background_refresh_runs(self):
+        fetch, calls = self._fetcher('test_swr', ['v1', 'v2'])
+        self.assertEqual(fetch(1), 'v1')
+        self.assertEqual(fetch(1), 'v1')
+        self.assertEqual(calls, [1])
+        key = caching.make_key('test_swr', (1,), {})
+        entry = cache.get(key)
+        cache.set(key, dict(entry, expires_at=0))
+        self.assertEqual(fetch(1), 'v1')
+        deadline = time.monotonic() + 5
+        while cache.get(key)['value'] != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(fetch(1), 'v2')
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(caching.get_stats()['test_swr'], {'hit': 2, 'stale': 1, 'miss': 1, 'last_good': 0})
+
+    def test_empty_results_are_not_cached(self):
+        fetch, calls = self._fetcher('test_swr_empty', [[], ['x']])
+        self.assertEqual(fetch(1), [])
+        self.assertEqual(fetch(1), ['x'])
+        self.assertEqual(calls, [1, 1])
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_stub(latency_ms=200)
+        cls.stub_settings = override_settings(DEEZER_API_URL=f"http://127.0.0.1:{cls.stub.server_port}")
+        cls.stub_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub_settings.disable()
+        cls.stub.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        deezer.get_breaker().reset()
+        deezer.reset_stats()
+
+    def test_identical_concurrent_calls_share_one_request(self):
+        results = [None] * 5
+
+        def fetch(i, path):
+            results[i] = deezer.get_json(path)
+        threads = [threading.Thread(target=fetch, args=(i, '/artist/7')) for i in range(4)]
+        threads.append(threading.Thread(target=fetch, args=(4, '/artist/8')))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(result is results[0] for result in results[:4]))
+        self.assertEqual(results[4]['id'], 8)
+        stats = deezer.get_stats()['artist']
+        self.assertEqual((stats['count'], stats['coalesced']), (2, 3))
+
+
+
+class SearchFanoutTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_stub(latency_ms=300)
+        cls.stub_settings = override_settings(DEEZER_API_URL=f"http://127.0.0.1:{cls.stub.server_port}")
+        cls.stub_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub_settings.disable()
+        cls.stub.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        deezer.get_breaker().reset()
+
+    def test_searches_run_as_sibling_pool_tasks(self):
+        submitted_from = []
+        submit = deezer.submit
+
+        def spy(func, *args, **kwargs):
+            submitted_from.append(threading.current_thread().name)
+            return submit(func, *args, **kwargs)
+        with mock.patch.object(deezer, 'submit', spy):
+            started = time.monotonic()
+            self.assertIsNone(views.search_deezer('late', timeout=0.1))
+            self.assertLess(time.monotonic() - started, 0.25)
+            time.sleep(0.4)     # Let the late calls finish; none of them may submit more work.
+        self.assertEqual(len(submitted_from), 3)
+        self.assertFalse([name for name in submitted_from if name.startswith('deezer-fanout')])
+
+    def test_search_merges_tracks_artists_and_albums(self):
+        results = views.search_deezer('daft', limit_tracks=10, limit_artists=6, limit_albums=4)
+        self.assertEqual([len(results[key]) for key in ('tracks', 'artists', 'albums')], [10, 6, 4])
+
+class SearchCacheTests(SimpleTestCase):
+    LIMITS = (10, 5, 0)
+
+    def setUp(self):
+        self.cache = SearchCache(prefix_min_matches=2)
+        self.cache.set('Daft P', self.LIMITS, {
+            'tracks': [{'id': 1, 'title': 'One More Time', 'artist_name': 'Daft Punk'},
+                       {'id': 2, 'title': 'Aerodynamic', 'artist_name': 'Daft Punk'},
+                       {'id': 3, 'title': 'Daftendirekt', 'artist_name': 'Daft Punk'}],
+            'artists': [{'id': 27, 'name': 'Daft Punk'}],
+            'albums': [],
+        })
+
+    def test_shorter_query_is_answered_from_a_longer_one(self):
+        results = self.cache.get('daft', self.LIMITS)
+        self.assertEqual([track['id'] for track in results['tracks']], [1, 2, 3])
+        self.assertEqual(self.cache.get_stats()['prefix_hits'], 1)
+        results['tracks'][0]['is_liked'] = True
+        self.assertNotIn('is_liked', self.cache.get('daft p', self.LIMITS)['tracks'][0])
+
+    def test_prefix_reuse_needs_enough_matches_and_the_same_limits(self):
+        self.assertIsNone(self.cache.get('daft', (10, 6, 0)))
+        self.assertIsNone(self.cache.get('aero', self.LIMITS))
+        self.assertEqual(self.cache.get_stats()['prefix_hits'], 0)
+
+
+class PlaylistSongsSignalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='curator', password='x')
+        Song.objects.bulk_create([
+            Song(deezer_id='8001', title='A', artist_name='X', album_cover_url='https://covers.example/a.jpg'),
+            Song(deezer_id='8002', title='B', artist_name='X', album_cover_url='https://covers.example/b.jpg'),
+            Song(deezer_id='8003', title='C', artist_name='X', album_cover_url=''),
+        ])
+        cls.a, cls.b, cls.c = Song.objects.filter(deezer_id__startswith='800').order_by('deezer_id')
+
+    def setUp(self):
+        self.playlist = Playlist.objects.create(user=self.user, name='Mix')
+
+    def _state(self):
+        self.playlist.refresh_from_db()
+        positions = list(PlaylistEntry.objects.filter(playlist=self.playlist).order_by('position')
+                         .values_list('song__deezer_id', 'position'))
+        return self.playlist.song_count, self.playlist.cover_image_url, positions
+
+    def test_adds_from_either_side_count_cover_and_append(self):
+        self.playlist.songs.add(self.c)
+        self.assertEqual(self._state(), (1, None, [('8003', 0)]))
+        self.playlist.songs.add(self.a)
+        self.b.playlist_set.add(self.playlist)
+        self.assertEqual(self._state(), (3, 'https://covers.example/a.jpg', [('8003', 0), ('8001', 1), ('8002', 2)]))
+
+    def test_removes_and_clears_recount_and_repick_the_cover(self):
+        self.playlist.songs.add(self.a)
+        self.playlist.songs.add(self.b, self.c)
+        self.playlist.songs.remove(self.a)
+        self.assertEqual(self._state()[:2], (2, 'https://covers.example/b.jpg'))
+        self.b.playlist_set.clear()
+        self.assertEqual(self._state()[:2], (1, None))
+        self.playlist.songs.add(self.a)
+        self.playlist.songs.clear()
+        self.assertEqual(self._state(), (0, None, []))
@@ -0,0 +1,275 @@
+"""
+Per-request timing breakdown: upstream (Deezer) HTTP time and call count,
+DB query time and count, and template render time.
+
+server_timing_middleware starts a RequestTiming for every request and
+keeps it in a context variable. Deezer calls report into it from
+deezer._record, including calls made on the fan-out pool, because
+deezer.submit copies the context. DB queries report through an execute
+wrapper installed on every connection (signals.py), and template
+rendering reports through the TimedDjangoTemplates backend. Upstream time
+is summed over calls, so concurrent fan-out calls can add up to more than
+the request's total. Render time includes any queries run while
+rendering, e.g. in context processors.
+
+The totals go out as a Server-Timing header, as one JSON log line per
+request and as per-view metrics (music/metrics.py). Requests slower than
+REQUEST_TIMING_SLOW_MS are also logged with their individual upstream
+calls and slowest queries, and the slowest REQUEST_TIMING_SLOW_SAMPLES of
+them are kept for /api/deezer/stats/.
+
+For streamed pages the header can only cover the work done before the
+first byte. The body is produced in the request's context, so its
+upstream calls and queries still count, and the log line and metrics
+cover the whole response once the last chunk is out.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_QUERIES_KEPT = 5
+UPSTREAM_CALLS_KEPT = 50
+MAX_SQL_LENGTH = 300
+
+_current = contextvars.ContextVar('request_timing', default=None)
+
+_slow_requests = []   # min-heap of (total_ms, sequence, breakdown)
+_slow_lock = threading.Lock()
+_sequence = itertools.count()
+
+
+class RequestTiming:
+    __slots__ = ('start', 'upstream_seconds', 'upstream_count', 'upstream_calls',
+                 'db_seconds', 'db_count', 'slowest_queries', 'render_seconds', '_lock')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.upstream_seconds = 0.0
+        self.upstream_count = 0
+        self.upstream_calls = []
+        self.db_seconds = 0.0
+        self.db_count = 0
+        self.slowest_queries = []   # min-heap of (seconds, sql)
+        self.render_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_upstream(self, endpoint, seconds, error):
+        with self._lock:
+            self.upstream_seconds += seconds
+            self.upstream_count += 1
+            if len(self.upstream_calls) < UPSTREAM_CALLS_KEPT:
+                self.upstream_calls.append((endpoint, seconds, error))
+
+    def add_query(self, sql, seconds):
+        with self._lock:
+            self.db_seconds += seconds
+            self.db_count += 1
+            if len(self.slowest_queries) < SLOWEST_QUERIES_KEPT:
+                heapq.heappush(self.slowest_queries, (seconds, sql))
+            elif seconds > self.slowest_queries[0][0]:
+                heapq.heapreplace(self.slowest_queries, (seconds, sql))
+
+    def add_render(self, seconds):
+        with self._lock:
+            self.render_seconds += seconds
+
+
+def current():
+    """The RequestTiming of the request being handled, or None outside a request."""
+    return _current.get()
+
+
+def record_upstream(endpoint, seconds, error):
+    timing = _current.get()
+    if timing is not None:
+        timing.add_upstream(endpoint, seconds, error)
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_timer(connection):
+    """Adds the timing execute wrapper to a DB connection (once)."""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class _TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.add_render(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time reported to the current RequestTiming."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _server_timing(timing, total_seconds):
+    return ', '.join([
+        f'upstream;dur={_ms(timing.upstream_seconds)};desc="{timing.upstream_count} calls"',
+        f'db;dur={_ms(timing.db_seconds)};desc="{timing.db_count} queries"',
+        f'render;dur={_ms(timing.render_seconds)}',
+        f'total;dur={_ms(total_seconds)}',
+    ])
+
+
+def _remember_slow(total_ms, breakdown):
+    max_samples = getattr(settings, 'REQUEST_TIMING_SLOW_SAMPLES', 20)
+    with _slow_lock:
+        item = (total_ms, next(_sequence), breakdown)
+        if len(_slow_requests) < max_samples:
+            heapq.heappush(_slow_requests, item)
+        elif total_ms > _slow_requests[0][0]:
+            heapq.heapreplace(_slow_requests, item)
+
+
+def get_slow_requests():
+    """The slowest sampled requests since startup, slowest first, with their full breakdown."""
+    with _slow_lock:
+        return [breakdown for _, _, breakdown in sorted(_slow_requests, reverse=True)]
+
+
+def _report(request, response, timing):
+    metrics.dec('tunex_http_requests_in_flight')
+    total_seconds = time.perf_counter() - timing.start
+    match = getattr(request, 'resolver_match', None)
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'total_ms': _ms(total_seconds),
+        'upstream_ms': _ms(timing.upstream_seconds),
+        'upstream_calls': timing.upstream_count,
+        'db_ms': _ms(timing.db_seconds),
+        'db_queries': timing.db_count,
+        'render_ms': _ms(timing.render_seconds),
+    }
+    view = record['view'] or 'unmatched'
+    metrics.inc('tunex_http_requests_total', view, request.method, str(response.status_code))
+    metrics.observe('tunex_http_request_duration_seconds', view, value=total_seconds)
+    metrics.inc('tunex_db_queries_total', view, amount=timing.db_count)
+    metrics.inc('tunex_db_query_seconds_total', view, amount=timing.db_seconds)
+    if record['total_ms'] >= getattr(settings, 'REQUEST_TIMING_SLOW_MS', 1000):
+        record['upstream'] = [{'endpoint': endpoint, 'ms': _ms(seconds), 'error': error}
+                              for endpoint, seconds, error in timing.upstream_calls]
+        record['slowest_queries'] = [{'sql': sql[:MAX_SQL_LENGTH], 'ms': _ms(seconds)}
+                                     for seconds, sql in sorted(timing.slowest_queries, reverse=True)]
+        _remember_slow(record['total_ms'], record)
+        logger.warning(f"Slow request: {json.dumps(record)}")
+    elif logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record))
+    metrics.maybe_flush()
+
+
+def _stream_then_report(chunks, context, request, response, timing):
+    try:
+        while True:
+            try:
+                chunk = context.run(next, chunks)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        _report(request, response, timing)
+
+
+async def _astream_then_report(chunks, request, response, timing):
+    # The body runs in the ASGI handler's task, after the middleware has
+    # returned; point it at this request's timing for its Deezer calls and
+    # queries. The task ends with the response, so there is nothing to reset.
+    _current.set(timing)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        _report(request, response, timing)
+
+
+def _finish(request, response, timing, context):
+    header = _server_timing(timing, time.perf_counter() - timing.start)
+    response['Server-Timing'] = f"{response['Server-Timing']}, {header}" if response.has_header('Server-Timing') else header
+    if getattr(response, 'is_async', False):
+        response.streaming_content = _astream_then_report(response.streaming_content, request, response, timing)
+    elif response.streaming:
+        chunks = iter(response.streaming_content)
+        response.streaming_content = _stream_then_report(chunks, context, request, response, timing)
+    else:
+        _report(request, response, timing)
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Outermost middleware: times each request and adds the Server-Timing header."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            timing = RequestTiming()
+            token = _current.set(timing)
+            context = contextvars.copy_context()
+            metrics.inc('tunex_http_requests_in_flight')
+            try:
+                response = await get_response(request)
+            except BaseException:
+                metrics.dec('tunex_http_requests_in_flight')
+                raise
+            finally:
+                _current.reset(token)
+            return _finish(request, response, timing, context)
+    else:
+        def middleware(request):
+            timing = RequestTiming()
+            token = _current.set(timing)
+            context = contextvars.copy_context()
+            metrics.inc('tunex_http_requests_in_flight')
+            try:
+                response = get_response(request)
+            except BaseException:
+                metrics.dec('tunex_http_requests_in_flight')
+                raise
+            finally:
+                _current.reset(token)
+            return _finish(request, response, timing, context)
+    return middleware
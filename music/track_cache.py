@@ -0,0 +1,46 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, preview_cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'track-payload'
+
+# Fields of a rendered track dict that are enough to create a Song row.
+PAYLOAD_FIELDS = ('title', 'artist_name', 'album_cover_medium', 'preview_url', 'duration_seconds')
+
+
+def _key(deezer_id):
+    return f"{KEY_PREFIX}:{deezer_id}"
+
+
+def remember_tracks(tracks):
+    """
+    Keeps the payload of tracks we are about to render (charts, search,
+    artist top tracks, Deezer playlists) so that liking or saving one of
+    them can create its Song row without another /track round trip.
+    """
+    payloads = {}
+    for track in tracks or []:
+        if isinstance(track, dict) and track.get('id') and track.get('title') and track.get('artist_name'):
+            payloads[_key(track['id'])] = {field: track.get(field) for field in PAYLOAD_FIELDS}
+    if payloads:
+        cache.set_many(payloads, getattr(settings, 'TRACK_PAYLOAD_CACHE_TTL', 6 * 60 * 60))
+    preview_cache.remember_previews(tracks)
+
+
+def get_track_payload(deezer_id):
+    payload = cache.get(_key(deezer_id))
+    metrics.inc('tunex_cache_lookups_total', 'track_payload', 'miss' if payload is None else 'hit')
+    return payload
+
+
+def get_track_payloads(deezer_ids):
+    """Returns {deezer_id: payload} for the IDs that have a remembered payload."""
+    found = cache.get_many([_key(deezer_id) for deezer_id in deezer_ids])
+    metrics.inc('tunex_cache_lookups_total', 'track_payload', 'hit', amount=len(found))
+    metrics.inc('tunex_cache_lookups_total', 'track_payload', 'miss', amount=len(deezer_ids) - len(found))
+    return {deezer_id: found[_key(deezer_id)] for deezer_id in deezer_ids if _key(deezer_id) in found}
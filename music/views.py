@@ -1,18 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse, Http404
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.contrib.auth.models import User
 from django.contrib import messages, auth
 from django.contrib.auth.decorators import login_required
-from .models import Song, UserProfile, Playlist 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.urls import reverse
+from django.template.loader import render_to_string
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escapejs
+from django.utils.safestring import mark_safe
+from .models import Song, UserProfile, LikedSong, Playlist, PlaylistEntry
 from .forms import PlaylistForm 
+from . import deezer, caching, track_cache, preview_cache, liked_cache, local_search, prefix_index, timing, metrics
+from .caching import stale_while_revalidate, last_known_good
+from .search_cache import get_search_cache
 import requests
 import json
 import logging 
+import time
+import functools
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 logger = logging.getLogger(__name__) 
 
-DEEZER_API_URL = "https://api.deezer.com"
-
 def format_duration_helper(seconds_str):
     """Helper function to format seconds string into M:SS. Handles None or invalid."""
     try:
@@ -25,70 +40,98 @@ def format_duration_helper(seconds_str):
     except (ValueError, TypeError):
         return "0:00" 
 
-def get_or_create_song(deezer_id_str): 
+def _track_payload_from_api(track_data):
+    """Maps a Deezer /track response to the rendered-track payload shape used by track_cache."""
+    return {
+        'title': track_data.get('title_short') or track_data.get('title'),
+        'artist_name': track_data.get('artist', {}).get('name'),
+        'album_cover_medium': track_data.get('album', {}).get('cover_medium', ''),
+        'preview_url': track_data.get('preview', ''),
+        'duration_seconds': track_data.get('duration'),
+    }
+
+def _song_fields(deezer_id_str, payload):
+    title = payload.get('title')
+    artist_name = payload.get('artist_name')
+    if not title or not artist_name:
+        logger.error(f"Missing essential data (title or artist) for Deezer track {deezer_id_str}. Title: {title}, Artist: {artist_name}")
+        return None
+    album_cover_url = payload.get('album_cover_medium')
+    preview_url = payload.get('preview_url')
+    duration_seconds = payload.get('duration_seconds')
+    duration_to_save = None
+    if duration_seconds is not None:
+        try:
+            duration_to_save = int(duration_seconds)
+        except (ValueError, TypeError):
+            logger.warning(f"Could not convert duration '{duration_seconds}' to int for track {deezer_id_str}. Saving duration as None.")
+    return {
+        'title': title[:200],
+        'artist_name': artist_name[:200],
+        'album_cover_url': album_cover_url[:499] if album_cover_url else '',
+        'preview_url': preview_url[:499] if preview_url else '',
+        'duration': duration_to_save,
+    }
+
+def _fetch_track_payload(deezer_id_str):
+    track_data = deezer.get_json(f"/track/{deezer_id_str}")
+    if track_data.get('id') == 0 or 'error' in track_data:
+        logger.error(f"Deezer API error for track {deezer_id_str}: {track_data.get('error')}")
+        return None
+    return _track_payload_from_api(track_data)
+
+def get_or_create_song(deezer_id_str):
     """
-    Retrieves a song from the database by its Deezer ID (string) or creates it
-    by fetching details (including duration) from the Deezer API.
+    Retrieves a song from the database by its Deezer ID (string) or creates
+    it, through get_or_create_songs(): from a track payload we rendered
+    recently (see track_cache) when available, otherwise from the Deezer API.
     """
     if not deezer_id_str:
         logger.error("get_or_create_song called with empty or None deezer_id_str")
         return None
     try:
-        song = Song.objects.get(deezer_id=str(deezer_id_str))
-        logger.info(f"Song '{song.title}' (Deezer ID: {deezer_id_str}) found in DB.")
-        return song
-    except Song.DoesNotExist:
-        logger.info(f"Song with Deezer ID {deezer_id_str} not in DB. Fetching from Deezer...")
-        track_endpoint = f"{DEEZER_API_URL}/track/{deezer_id_str}"
-        try:
-            response = requests.get(track_endpoint, timeout=10)
-            response.raise_for_status() 
-            track_data = response.json()
-            if track_data.get('id') == 0 or 'error' in track_data:
-                error_details = track_data.get('error', {'message': 'Track not found by Deezer (id was 0 or error field present)'})
-                logger.error(f"Deezer API error for track {deezer_id_str}: {error_details}")
-                return None
-            title = track_data.get('title_short') or track_data.get('title')
-            artist_name = track_data.get('artist', {}).get('name')
-            album_cover_url = track_data.get('album', {}).get('cover_medium', '') 
-            preview_url = track_data.get('preview', '') 
-            duration_seconds_api = track_data.get('duration')
-            if not title or not artist_name:
-                logger.error(f"Missing essential data (title or artist) for Deezer track {deezer_id_str}. Title: {title}, Artist: {artist_name}")
-                return None
-            album_cover_url = album_cover_url[:499] if album_cover_url else ''
-            preview_url = preview_url[:499] if preview_url else ''
-            duration_to_save = None
-            if duration_seconds_api is not None:
-                try:
-                    duration_to_save = int(duration_seconds_api)
-                except (ValueError, TypeError):
-                    logger.warning(f"Could not convert duration '{duration_seconds_api}' to int for track {deezer_id_str}. Saving duration as None.")
-            song = Song.objects.create(
-                deezer_id=str(deezer_id_str), 
-                title=title,
-                artist_name=artist_name,
-                album_cover_url=album_cover_url,
-                preview_url=preview_url,
-                duration=duration_to_save
-            )
-            logger.info(f"Song '{title}' (Deezer ID: {deezer_id_str}) created in DB with duration: {duration_to_save}s.")
-            return song
-        except requests.exceptions.HTTPError as http_err:
-            logger.error(f"HTTP error fetching song {deezer_id_str} from Deezer API: {http_err}. Response: {response.text if 'response' in locals() and hasattr(response, 'text') else 'N/A'}")
-            return None
-        except requests.exceptions.RequestException as e: 
-            logger.error(f"Request error fetching song {deezer_id_str} from Deezer API: {e}")
-            return None
-        except json.JSONDecodeError:
-            logger.error(f"Error decoding JSON for song {deezer_id_str} from Deezer API. Response: {response.text if 'response' in locals() and hasattr(response, 'text') else 'N/A'}")
-            return None
-        except Exception as e: 
-            logger.error(f"An unexpected error occurred in get_or_create_song (API fetch part) for {deezer_id_str}: {e}", exc_info=True)
-            return None
-    except Exception as e: 
+        song = get_or_create_songs([deezer_id_str]).get(str(deezer_id_str))
+    except Exception as e:
         logger.error(f"Database or other error during get_or_create_song for {deezer_id_str}: {e}", exc_info=True)
         return None
+    if song is None:
+        logger.error(f"Could not resolve Deezer track {deezer_id_str} to a song.")
+    return song
+
+def get_or_create_songs(deezer_ids):
+    """
+    Resolves many Deezer IDs (get_or_create_song resolves one). Existing rows
+    are found with one deezer_id__in query; missing tracks are built from
+    recently rendered payloads or fetched concurrently (bounded by the
+    fan-out pool), then inserted with a single bulk_create. Returns a dict
+    mapping each resolvable Deezer ID (string) to its Song.
+    """
+    ids = list(dict.fromkeys(str(deezer_id) for deezer_id in deezer_ids if deezer_id))
+    if not ids:
+        return {}
+    songs = {song.deezer_id: song for song in Song.objects.filter(deezer_id__in=ids)}
+    missing_ids = [deezer_id for deezer_id in ids if deezer_id not in songs]
+    if not missing_ids:
+        return songs
+    payloads = track_cache.get_track_payloads(missing_ids)
+    ids_to_fetch = [deezer_id for deezer_id in missing_ids if deezer_id not in payloads]
+    if ids_to_fetch:
+        logger.info(f"Fetching {len(ids_to_fetch)} tracks from Deezer for bulk song resolution.")
+        fetched = deezer.gather({deezer_id: functools.partial(_fetch_track_payload, deezer_id) for deezer_id in ids_to_fetch})
+        payloads.update({deezer_id: payload for deezer_id, payload in fetched.items() if payload})
+    new_songs = []
+    for deezer_id in missing_ids:
+        fields = _song_fields(deezer_id, payloads[deezer_id]) if deezer_id in payloads else None
+        if fields:
+            new_songs.append(Song(deezer_id=deezer_id, **fields))
+    if new_songs:
+        Song.objects.bulk_create(new_songs, ignore_conflicts=True)
+        # ignore_conflicts leaves primary keys unset, so read the rows back.
+        songs.update({song.deezer_id: song for song in Song.objects.filter(deezer_id__in=[song.deezer_id for song in new_songs])})
+        for song in new_songs:
+            prefix_index.remember_song(song)  # bulk_create sends no post_save
+        logger.info(f"Bulk-created {len(new_songs)} songs ({len(ids_to_fetch)} fetched from Deezer).")
+    return songs
 
 @login_required(login_url='login')
 def like_song_view(request):
@@ -116,11 +159,13 @@ def like_song_view(request):
             is_liked_after_action = False
             if user_profile.liked_songs.filter(pk=song.pk).exists(): 
                 user_profile.liked_songs.remove(song)
+                liked_cache.invalidate(request.user.pk)
                 is_liked_after_action = False
                 action_taken = 'unliked'
                 logger.info(f"User {request.user.username} unliked song '{song.title}' (ID: {song.deezer_id})")
             else:
                 user_profile.liked_songs.add(song)
+                liked_cache.invalidate(request.user.pk)
                 is_liked_after_action = True
                 action_taken = 'liked'
                 logger.info(f"User {request.user.username} liked song '{song.title}' (ID: {song.deezer_id})")
@@ -140,15 +185,18 @@ def like_song_view(request):
     return JsonResponse({'error': 'Invalid request method. Only POST is allowed.'}, status=405)
 
 def _add_is_liked_status_to_tracks(request, tracks_list):
+    # Every Deezer track list we render passes through here; keep its
+    # payloads so like/add-to-playlist can create Song rows without a fetch.
+    track_cache.remember_tracks(tracks_list)
     if request.user.is_authenticated and tracks_list:
         try:
-            user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-            if created:
-                logger.info(f"UserProfile created for {request.user.username} in _add_is_liked_status_to_tracks")
-            liked_song_deezer_ids = set(user_profile.liked_songs.values_list('deezer_id', flat=True))
+            liked_song_deezer_ids = liked_cache.liked_among(request.user.pk, [
+                track.get('id') if isinstance(track, dict) else getattr(track, 'deezer_id', None)
+                for track in tracks_list if isinstance(track, dict) or hasattr(track, 'deezer_id')
+            ])
             logger.debug(f"_add_is_liked_status_to_tracks: Liked song Deezer IDs for user {request.user.username}: {liked_song_deezer_ids}")
         except Exception as e: 
-            logger.error(f"Error accessing UserProfile or liked_songs for {request.user.username}: {e}", exc_info=True)
+            logger.error(f"Error reading liked songs for {request.user.username}: {e}", exc_info=True)
             liked_song_deezer_ids = set()
             logger.debug(f"_add_is_liked_status_to_tracks: Liked song Deezer IDs set to empty due to error.")
         for i, track in enumerate(tracks_list):
@@ -171,28 +219,102 @@ def _add_is_liked_status_to_tracks(request, tracks_list):
             elif hasattr(track, 'deezer_id'): track.is_liked = False 
     return tracks_list
 
+STREAM_MARKER = '<!--stream-->'
+STREAM_PLACEHOLDER = mark_safe(
+    '<div id="page-loading" role="status" style="color: var(--text-muted); padding: 24px 0;">Loading…</div>'
+    + STREAM_MARKER
+)
+
+def _stream_shell(request, template_name):
+    """The page rendered around STREAM_PLACEHOLDER, as (head, tail)."""
+    shell = render_to_string(template_name, {'stream_marker': STREAM_PLACEHOLDER}, request=request)
+    head, tail = shell.split(STREAM_MARKER, 1)
+    return head, tail
+
+def _stream_content(request, content_template, context, page_title=None):
+    """The streamed content, followed by the script that drops the placeholder."""
+    content = render_to_string(content_template, context, request=request)
+    title = page_title(context) if page_title and context else None
+    title_script = f'document.title = "{escapejs(title)} - TuneX";' if title else ''
+    return f"{content}<script>document.getElementById('page-loading').remove();{title_script}</script>"
+
+def _stream_page(request, template_name, content_template, load_context, page_title=None):
+    """
+    Streams a page whose content needs Deezer. The shell (head, sidebar,
+    player, and the page template up to its stream_marker) is rendered and
+    sent right away. load_context() then runs while the browser is already
+    drawing the shell, and its context renders `content_template` into
+    the marked spot. The page scripts still run on DOMContentLoaded, after
+    the content has arrived.
+
+    The status is sent with the shell, so views only stream pages of items
+    known to exist (see artist_profile_view) and answer the others after
+    the lookup, with a 404 when there is nothing. The content templates
+    render their own "not found" state if load_context() fails anyway.
+    `page_title(context)` may return a title to set once the content is in.
+    """
+    head, tail = _stream_shell(request, template_name)
+
+    def chunks():
+        yield head
+        try:
+            context = load_context()
+        except Exception as e:
+            logger.error(f"Error loading the content of {request.path}: {e}", exc_info=True)
+            context = {}
+        yield _stream_content(request, content_template, context, page_title)
+        yield tail
+
+    response = StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass the shell through without waiting for the rest.
+    return response
+
+CHART_FRAGMENT_TEMPLATES = {
+    'top_artists': 'chart_artists.html',
+    'top_tracks': 'chart_tracks.html',
+    'top_playlists': 'chart_playlists.html',
+}
+
+def _render_chart_section(section, data):
+    if section == 'top_tracks':
+        track_cache.remember_tracks(data)
+    return render_to_string(CHART_FRAGMENT_TEMPLATES[section], {section: data})
+
+def _index_context(request, charts):
+    """
+    The chart sections of the home page, which are rendered once per chart
+    version and shared by every user. The user's liked top tracks go along
+    as a list of IDs that the page applies to the hearts.
+    """
+    chart_fragments = {
+        section: caching.cached_fragment(f"index_{section}", charts[section],
+                                         functools.partial(_render_chart_section, section), 'chart')
+        for section in CHART_FRAGMENT_TEMPLATES
+    }
+    try:
+        liked_track_ids = sorted(liked_cache.liked_among(
+            request.user.pk, [track.get('id') for track in charts['top_tracks'] if isinstance(track, dict)]))
+    except Exception as e:
+        logger.error(f"Error reading liked songs for {request.user.username}: {e}", exc_info=True)
+        liked_track_ids = []
+    return {'chart_fragments': chart_fragments, 'liked_track_ids': liked_track_ids}
+
 @login_required(login_url='login') 
 def index(request):
-    top_artists_list = get_top_artists(limit=10)
-    top_tracks_list = get_top_tracks(limit=10)
-    top_playlists_list = get_top_playlists(limit=8)
-    top_tracks_list = _add_is_liked_status_to_tracks(request, top_tracks_list)
-    playlists = []
-    if request.user.is_authenticated:
-        playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context = {
-        'top_artists': top_artists_list,
-        'top_tracks': top_tracks_list,
-        'top_playlists': top_playlists_list,
-        'playlists': playlists, 
-    }
-    return render(request , 'index.html', context)
+    def load_charts():
+        charts = deezer.gather({
+            'top_artists': lambda: get_top_artists(limit=prefix_index.CHART_LIMIT),
+            'top_tracks': lambda: get_top_tracks(limit=prefix_index.CHART_LIMIT),
+            'top_playlists': lambda: get_top_playlists(limit=8),
+        }, defaults={'top_artists': [], 'top_tracks': [], 'top_playlists': []})
+        return _index_context(request, charts)
+    return _stream_page(request, 'index.html', 'index_charts.html', load_charts)
 
 def search_view(request):
     query = request.GET.get('q', None)
     context = {'query': query, 'has_results': False}
     if query:
-        search_results_dict = search_deezer(query) 
+        search_results_dict = search_catalog(request, query) 
         if search_results_dict:
             if 'tracks' in search_results_dict:
                 search_results_dict['tracks'] = _add_is_liked_status_to_tracks(request, search_results_dict['tracks'])
@@ -200,44 +322,42 @@ def search_view(request):
             context['has_results'] = any(bool(search_results_dict.get(key)) for key in ['tracks', 'artists', 'albums'])
     else: 
         context['api_error'] = True if query else False 
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
     return render(request, 'search.html', context)
 
 def artist_profile_view(request, artist_id):
-    artist_data = get_artist_details(artist_id) 
-    if artist_data is None:
-        raise Http404("Artist not found or error fetching details from Deezer.")
-    logger.debug(f"Artist Profile View: Before adding is_liked, top_tracks type: {type(artist_data.get('top_tracks'))}, count: {len(artist_data.get('top_tracks', []))}")
-    if artist_data.get('top_tracks'):
-        artist_data['top_tracks'] = _add_is_liked_status_to_tracks(request, artist_data['top_tracks'])
-        logger.debug(f"Artist Profile View: After adding is_liked, top_tracks count: {len(artist_data.get('top_tracks', []))}")
-        if artist_data['top_tracks']:
-            logger.debug(f"Artist Profile View: Sample track after adding is_liked: {artist_data['top_tracks'][0]}")
-    context = {'artist': artist_data}
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
-    return render(request, 'artist_profile.html', context)
+    def load_artist():
+        artist_data = get_artist_details(artist_id)
+        if artist_data is None:
+            logger.warning(f"Artist Profile View: artist {artist_id} not found or error fetching details from Deezer.")
+            return {'artist': None}
+        if artist_data.get('top_tracks'):
+            artist_data['top_tracks'] = _add_is_liked_status_to_tracks(request, artist_data['top_tracks'])
+            logger.debug(f"Artist Profile View: After adding is_liked, top_tracks count: {len(artist_data.get('top_tracks', []))}")
+        return {'artist': artist_data}
+    if not caching.has_last_good('get_artist_details', artist_id):
+        # Never fetched (or long ago): only Deezer can tell whether it exists, so wait before answering.
+        context = load_artist()
+        if context['artist'] is None:
+            raise Http404("Artist not found or error fetching details from Deezer.")
+        return render(request, 'artist_profile.html', context)
+    return _stream_page(request, 'artist_profile.html', 'artist_profile_content.html', load_artist,
+                        page_title=lambda context: context['artist'] and context['artist'].get('name'))
 
 def deezer_playlist_detail_view(request, playlist_id):
-    playlist_data = get_deezer_playlist_details(playlist_id)
-    if playlist_data is None:
-        raise Http404("Deezer playlist not found or error fetching details.")
-    if playlist_data.get('tracks'):
-        playlist_data['tracks'] = _add_is_liked_status_to_tracks(request, playlist_data['tracks'])
-    context = {
-        'playlist': playlist_data,
-        'is_deezer_playlist': True
-        }
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
-    return render(request, 'playlist_details.html', context)
+    def load_playlist():
+        playlist_data = get_deezer_playlist_details(playlist_id)
+        if playlist_data is None:
+            logger.warning(f"Deezer playlist {playlist_id} not found or error fetching details.")
+        elif playlist_data.get('tracks'):
+            playlist_data['tracks'] = _add_is_liked_status_to_tracks(request, playlist_data['tracks'])
+        return {'playlist': playlist_data, 'is_deezer_playlist': True}
+    if not caching.has_last_good('get_deezer_playlist_details', playlist_id):
+        context = load_playlist()
+        if context['playlist'] is None:
+            raise Http404("Deezer playlist not found or error fetching details.")
+        return render(request, 'playlist_details.html', context)
+    return _stream_page(request, 'playlist_details.html', 'playlist_details_content.html', load_playlist,
+                        page_title=lambda context: context['playlist'] and context['playlist'].get('title'))
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -294,19 +414,78 @@ def logout_view(request):
     messages.info(request, "You have been successfully logged out.")
     return redirect('login')
 
+# Keyset orderings of the liked-songs library: ?sort= -> (order_by, cursor key of a LikedSong).
+LIKED_SONGS_SORTS = {
+    'recent': (('-liked_at', '-id'), lambda entry: entry.liked_at.isoformat()),
+    'title': (('song__title', 'id'), lambda entry: entry.song.title),
+}
+
+def _liked_songs_page(profile, sort='recent', after=None, limit=None):
+    """
+    One keyset page of a user's liked songs. `after` is the opaque
+    '<key>|<id>' cursor of the previous page's last row. Returns
+    (songs, next_after); next_after is None on the last page. Raises
+    ValueError for a malformed cursor.
+    """
+    limit = limit or getattr(settings, 'PLAYLIST_PAGE_SIZE', 100)
+    ordering, cursor_key = LIKED_SONGS_SORTS[sort]
+    entries = LikedSong.objects.filter(profile=profile).select_related('song')
+    if after:
+        key, _, last_id = after.rpartition('|')
+        last_id = int(last_id)
+        if sort == 'recent':
+            liked_at = parse_datetime(key)
+            if liked_at is None:
+                raise ValueError(f"Invalid liked-songs cursor: {after!r}")
+            entries = entries.filter(Q(liked_at__lt=liked_at) | Q(liked_at=liked_at, id__lt=last_id))
+        else:
+            entries = entries.filter(Q(song__title__gt=key) | Q(song__title=key, id__gt=last_id))
+    entries = list(entries.order_by(*ordering)[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    songs = []
+    for entry in entries:
+        entry.song.is_liked = True
+        entry.song.liked_at = entry.liked_at
+        songs.append(entry.song)
+    next_after = f"{cursor_key(entries[-1])}|{entries[-1].id}" if has_more else None
+    return songs, next_after
+
 @login_required(login_url='login')
 def liked_songs_list_view(request):
     user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-    liked_songs_list = user_profile.liked_songs.all().order_by('title')
-    for song in liked_songs_list:
-        song.is_liked = True
-    context = {'liked_songs': liked_songs_list}
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
+    sort = request.GET.get('sort') if request.GET.get('sort') in LIKED_SONGS_SORTS else 'recent'
+    liked_songs_list, next_after = _liked_songs_page(user_profile, sort)
+    context = {'liked_songs': liked_songs_list, 'next_after': next_after, 'sort': sort}
     return render(request, 'liked_songs.html', context)
 
+@login_required(login_url='login')
+def liked_songs_api_view(request):
+    """GET ?sort=recent|title&after=<cursor>&limit=<n>: the next keyset page of the user's liked songs."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Only GET is allowed.'}, status=405)
+    sort = request.GET.get('sort', 'recent')
+    limit = _page_limit(request, getattr(settings, 'PLAYLIST_PAGE_SIZE', 100))
+    if sort not in LIKED_SONGS_SORTS or limit is None:
+        return JsonResponse({'error': f"'sort' must be one of {sorted(LIKED_SONGS_SORTS)} and 'limit' an integer."}, status=400)
+    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
+    try:
+        songs, next_after = _liked_songs_page(user_profile, sort, request.GET.get('after') or None, limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'songs': [{
+            'deezer_id': song.deezer_id,
+            'title': song.title,
+            'artist_name': song.artist_name,
+            'album_cover_url': song.album_cover_url,
+            'duration_formatted': song.duration_formatted,
+            'liked_at': song.liked_at.isoformat(),
+        } for song in songs],
+        'html': render_to_string('liked_song_rows.html', {'liked_songs': songs}, request=request),
+        'next_after': next_after,
+    })
+
 @login_required(login_url='login')
 def create_playlist_view(request):
     if request.method == 'POST':
@@ -321,35 +500,141 @@ def create_playlist_view(request):
             messages.error(request, "Please correct the errors in the form.")
     else:
         form = PlaylistForm()
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context = {'form': form, 'playlists': user_playlists}
+    context = {'form': form}
     return render(request, 'create_playlist.html', context)
 
+@login_required(login_url='login')
+def save_deezer_playlist_view(request, playlist_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method. Only POST is allowed.'}, status=405)
+    playlist_data = get_deezer_playlist_details(playlist_id)
+    if playlist_data is None:
+        return JsonResponse({'error': 'Deezer playlist not found or error fetching details.'}, status=404)
+    tracks = playlist_data.get('tracks', [])
+    track_cache.remember_tracks(tracks)
+    try:
+        songs_by_id = get_or_create_songs([track['id'] for track in tracks])
+        ordered_songs = [songs_by_id[str(track['id'])] for track in tracks if str(track['id']) in songs_by_id]
+        ordered_songs = list({song.pk: song for song in ordered_songs}.values())  # Deezer playlists can repeat a track
+        with transaction.atomic():
+            playlist = Playlist.objects.create(
+                name=(playlist_data.get('title') or f"Deezer playlist {playlist_id}")[:200],
+                user=request.user,
+                cover_image_url=playlist_data.get('picture_medium'),
+            )
+            # Explicit positions keep the Deezer track order, which songs.add() would not.
+            PlaylistEntry.objects.bulk_create([
+                PlaylistEntry(playlist=playlist, song=song, position=position)
+                for position, song in enumerate(ordered_songs)
+            ])
+            m2m_changed.send(sender=PlaylistEntry, instance=playlist, action='post_add', reverse=False,
+                             model=Song, pk_set={song.pk for song in ordered_songs}, using=PlaylistEntry.objects.db)
+    except Exception as e:
+        logger.error(f"User {request.user.username}: Error saving Deezer playlist {playlist_id}: {e}", exc_info=True)
+        return JsonResponse({'error': 'An internal server error occurred while saving the playlist.'}, status=500)
+    logger.info(f"User {request.user.username} saved Deezer playlist {playlist_id} as playlist {playlist.id} with {len(ordered_songs)} songs.")
+    return JsonResponse({
+        'success': True,
+        'message': f"Saved '{playlist.name}' to your playlists ({len(ordered_songs)} songs).",
+        'playlist_id': playlist.id,
+        'url': reverse('user_playlist_detail', args=[playlist.id]),
+        'added': len(ordered_songs),
+        'skipped': len(tracks) - len(ordered_songs),
+    })
+
 @login_required(login_url='login')
 def my_playlists_view(request):
     playlists = Playlist.objects.filter(user=request.user).order_by('-id')
     context = {'playlists': playlists}
     return render(request, 'my_playlists.html', context)
 
+def _page_limit(request, default):
+    """Reads ?limit= for the keyset-paginated endpoints, capped at MAX_PAGE_SIZE; None if invalid."""
+    try:
+        limit = int(request.GET.get('limit', default))
+    except (TypeError, ValueError):
+        return None
+    return max(1, min(limit, getattr(settings, 'MAX_PAGE_SIZE', 200)))
+
+def _playlist_songs_page(request, playlist, after=None, limit=None):
+    """
+    One keyset page of a playlist's songs in playlist order, (position, id).
+    `after` is the opaque '<position>|<id>' cursor of the previous page's
+    last row. Entries still without a position come last, by id, with an
+    empty position in their cursor. Returns (songs, next_after);
+    next_after is None on the last page. Each song carries its entry's
+    `position` and `added_at`. Raises ValueError for a malformed cursor.
+    """
+    limit = limit or getattr(settings, 'PLAYLIST_PAGE_SIZE', 100)
+    playlist_entries = PlaylistEntry.objects.filter(playlist=playlist).select_related('song')
+    placed = playlist_entries.filter(position__isnull=False).order_by('position', 'id')
+    unplaced = playlist_entries.filter(position__isnull=True).order_by('id')
+    if after:
+        position, _, last_id = after.rpartition('|')
+        last_id = int(last_id)
+        if position:
+            position = int(position)
+            placed = placed.filter(Q(position__gt=position) | Q(position=position, id__gt=last_id))
+        else:
+            placed = placed.none()
+            unplaced = unplaced.filter(id__gt=last_id)
+    entries = list(placed[:limit + 1])
+    if len(entries) <= limit:
+        entries += list(unplaced[:limit + 1 - len(entries)])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    songs = []
+    for entry in entries:
+        entry.song.position = entry.position
+        entry.song.added_at = entry.added_at
+        songs.append(entry.song)
+    songs = _add_is_liked_status_to_tracks(request, songs)
+    next_after = None
+    if has_more:
+        last = entries[-1]
+        next_after = f"{'' if last.position is None else last.position}|{last.id}"
+    return songs, next_after
+
 @login_required(login_url='login')
 def user_playlist_detail_view(request, playlist_id):
     playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
-    playlist_songs_qs = playlist.songs.all().order_by('title')
-    playlist_songs_list = list(playlist_songs_qs) 
-    playlist_songs_list = _add_is_liked_status_to_tracks(request, playlist_songs_list)
+    playlist_songs_list, next_after = _playlist_songs_page(request, playlist)
     context = {
         'playlist': playlist,
         'playlist_songs': playlist_songs_list, 
+        'next_after': next_after,
         'is_deezer_playlist': False
     }
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
     return render(request, 'user_playlist_detail.html', context)
 
+@login_required(login_url='login')
+def playlist_songs_api_view(request, playlist_id):
+    """GET ?after=<cursor>&limit=<n>: the next keyset page of a user playlist, as data and as rendered rows."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Only GET is allowed.'}, status=405)
+    playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
+    limit = _page_limit(request, getattr(settings, 'PLAYLIST_PAGE_SIZE', 100))
+    if limit is None:
+        return JsonResponse({'error': "'limit' must be an integer."}, status=400)
+    try:
+        songs, next_after = _playlist_songs_page(request, playlist, request.GET.get('after') or None, limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'songs': [{
+            'deezer_id': song.deezer_id,
+            'title': song.title,
+            'artist_name': song.artist_name,
+            'album_cover_url': song.album_cover_url,
+            'duration_formatted': song.duration_formatted,
+            'is_liked': song.is_liked,
+            'position': song.position,
+            'added_at': song.added_at.isoformat(),
+        } for song in songs],
+        'html': render_to_string('playlist_song_rows.html', {'playlist': playlist, 'playlist_songs': songs}, request=request),
+        'next_after': next_after,
+    })
+
 @login_required(login_url='login')
 def add_song_to_playlist_view(request, playlist_id):
     if request.method == 'POST':
@@ -376,7 +661,6 @@ def add_song_to_playlist_view(request, playlist_id):
             response_data = {'success': False, 'message': f"'{song.title}' is already in '{playlist.name}'.", 'song_id': song.deezer_id}
         else:
             playlist.songs.add(song)
-            playlist.update_cover_image() 
             response_data = {'success': True, 'message': f"Added '{song.title}' to '{playlist.name}'", 'song_id': song.deezer_id}
         return JsonResponse(response_data)
     return JsonResponse({'error': 'Invalid request method. Only POST is allowed.'}, status=405)
@@ -406,7 +690,6 @@ def remove_song_from_playlist_view(request, playlist_id):
         response_data = {}
         if playlist.songs.filter(pk=song.pk).exists():
             playlist.songs.remove(song)
-            playlist.update_cover_image()
             response_data = {'success': True, 'message': f"Removed '{song.title}' from '{playlist.name}'", 'song_id': song.deezer_id}
         else:
             response_data = {'success': False, 'message': f"'{song.title}' was not found in this playlist.", 'song_id': song.deezer_id}
@@ -458,19 +741,29 @@ def add_song_to_playlists_view(request):
                  owned_ids = set(user_owned_playlists.values_list('id', flat=True))
                  unowned_or_missing_ids = [pid for pid in playlist_ids_from_request if pid not in owned_ids]
                  logger.warning(f"User {request.user.username}: Attempted to add song to playlists not owned or missing: {unowned_or_missing_ids}")
-            for playlist in user_owned_playlists:
-                try:
-                    if playlist.songs.filter(pk=song.pk).exists():
+            through_model = Playlist.songs.through
+            try:
+                with transaction.atomic():
+                    existing_ids = set(through_model.objects.filter(song=song, playlist__in=user_owned_playlists).values_list('playlist_id', flat=True))
+                    new_ids = {playlist.id for playlist in user_owned_playlists} - existing_ids
+                    if new_ids:
+                        through_model.objects.bulk_create(
+                            [through_model(playlist_id=playlist_id, song_id=song.pk) for playlist_id in new_ids],
+                            ignore_conflicts=True,
+                        )
+                        # bulk_create skips m2m_changed; send it so song_count and covers follow.
+                        m2m_changed.send(sender=through_model, instance=song, action='post_add', reverse=True,
+                                         model=Playlist, pk_set=new_ids, using=through_model.objects.db)
+                for playlist in user_owned_playlists:
+                    if playlist.id in existing_ids:
                         results[playlist.id] = {'success': False, 'message': f"Already in '{playlist.name}'"}
-                        logger.info(f"User {request.user.username}: Song '{song.title}' (ID: {song.deezer_id}) already in playlist '{playlist.name}' (ID: {playlist.id}).")
                     else:
-                        playlist.songs.add(song)
-                        playlist.update_cover_image() 
                         results[playlist.id] = {'success': True, 'message': f"Added to '{playlist.name}'"}
-                        logger.info(f"User {request.user.username}: Added song '{song.title}' (ID: {song.deezer_id}) to playlist '{playlist.name}' (ID: {playlist.id}).")
-                except Exception as add_e:
+                logger.info(f"User {request.user.username}: Added song '{song.title}' (ID: {song.deezer_id}) to playlists {sorted(new_ids)}; already in {sorted(existing_ids)}.")
+            except Exception as add_e:
+                logger.error(f"User {request.user.username}: Error adding song {song.deezer_id} to playlists {playlist_ids_from_request}: {add_e}", exc_info=True)
+                for playlist in user_owned_playlists:
                     results[playlist.id] = {'success': False, 'message': f"Error adding to '{playlist.name}'"}
-                    logger.error(f"User {request.user.username}: Error adding song {song.deezer_id} to playlist {playlist.id}: {add_e}", exc_info=True)
             for requested_id in playlist_ids_from_request:
                  if requested_id not in results:
                       results[requested_id] = {'success': False, 'message': 'Playlist not found or not owned'}
@@ -485,26 +778,46 @@ def add_song_to_playlists_view(request):
     logger.warning(f"User {request.user.username}: Invalid request method ({request.method}) for add_song_to_playlists_view.")
     return JsonResponse({'error': 'Invalid request method. Only POST is allowed.'}, status=405)
 
+def _valid_preview_url(track_data):
+    if track_data.get('id') == 0 or 'error' in track_data:
+        return None
+    preview_url = track_data.get('preview', None) 
+    if preview_url and isinstance(preview_url, str) and preview_url.strip():
+        return preview_url.strip()
+    return None
+
+def _fresh_preview_response(deezer_id_str, track_data):
+    if track_data.get('id') == 0 or 'error' in track_data:
+        error_details = track_data.get('error', {'message': 'Track not found by Deezer (id was 0 or error field present)'})
+        logger.error(f"Deezer API error fetching fresh preview for track {deezer_id_str}: {error_details}")
+        return JsonResponse({'error': 'Track not found or Deezer API error.', 'preview_url': None}, status=404)
+    preview_url = _valid_preview_url(track_data)
+    if preview_url:
+        logger.info(f"Fresh preview URL for {deezer_id_str}: {preview_url}")
+        return JsonResponse({'preview_url': preview_url})
+    else:
+        logger.warning(f"No valid preview URL returned from Deezer for track {deezer_id_str}. Raw preview: '{track_data.get('preview')}'")
+        return JsonResponse({'preview_url': None, 'message': 'Preview not available for this track.'})
+
+def _store_fresh_preview(deezer_id_str, preview_url):
+    """Caches a fresh preview URL until shortly before its expiry and writes it back to the Song row."""
+    preview_cache.remember_preview(deezer_id_str, preview_url)
+    Song.objects.filter(deezer_id=str(deezer_id_str)).exclude(preview_url=preview_url[:499]).update(preview_url=preview_url[:499])
+
 @login_required(login_url='login') 
 def get_fresh_preview_url_view(request, deezer_id_str):
     if request.method == 'GET':
         logger.info(f"User {request.user.username} requesting fresh preview for Deezer ID: {deezer_id_str}")
-        track_endpoint = f"{DEEZER_API_URL}/track/{deezer_id_str}"
+        cached_preview_url = preview_cache.get_preview(deezer_id_str)
+        if cached_preview_url:
+            return JsonResponse({'preview_url': cached_preview_url})
+        track_endpoint = f"/track/{deezer_id_str}"
         try:
-            response = requests.get(track_endpoint, timeout=10)
-            response.raise_for_status() 
-            track_data = response.json()
-            if track_data.get('id') == 0 or 'error' in track_data:
-                error_details = track_data.get('error', {'message': 'Track not found by Deezer (id was 0 or error field present)'})
-                logger.error(f"Deezer API error fetching fresh preview for track {deezer_id_str}: {error_details}")
-                return JsonResponse({'error': 'Track not found or Deezer API error.', 'preview_url': None}, status=404)
-            preview_url = track_data.get('preview', None) 
-            if preview_url and isinstance(preview_url, str) and preview_url.strip():
-                logger.info(f"Fresh preview URL for {deezer_id_str}: {preview_url}")
-                return JsonResponse({'preview_url': preview_url.strip()})
-            else:
-                logger.warn(f"No valid preview URL returned from Deezer for track {deezer_id_str}. Raw preview: '{preview_url}'")
-                return JsonResponse({'preview_url': None, 'message': 'Preview not available for this track.'})
+            track_data = deezer.get_json(track_endpoint)
+            preview_url = _valid_preview_url(track_data)
+            if preview_url:
+                _store_fresh_preview(deezer_id_str, preview_url)
+            return _fresh_preview_response(deezer_id_str, track_data)
         except requests.exceptions.HTTPError as http_err:
             logger.error(f"HTTP error fetching fresh preview for {deezer_id_str} from Deezer: {http_err}")
             return JsonResponse({'error': 'Failed to fetch track details from Deezer (HTTP Error).', 'preview_url': None}, status=502) 
@@ -519,30 +832,35 @@ def get_fresh_preview_url_view(request, deezer_id_str):
             return JsonResponse({'error': 'An internal server error occurred.', 'preview_url': None}, status=500)
     return JsonResponse({'error': 'Invalid request method. Only GET is allowed.'}, status=405)
 
+def _parse_top_artists(response_data, limit):
+    artists_info = []
+    processed_artist_ids = set()
+    if 'data' in response_data and isinstance(response_data['data'], list):
+        for artist_data in response_data['data']:
+             if len(artists_info) >= limit: break
+             if not isinstance(artist_data, dict): continue
+             artist_id = artist_data.get('id')
+             artist_name = artist_data.get('name')
+             if not artist_id or not artist_name: continue
+             if artist_id not in processed_artist_ids:
+                 artists_info.append((artist_name, artist_id, artist_data.get('picture_medium')))
+                 processed_artist_ids.add(artist_id)
+    elif 'error' in response_data:
+        logger.error(f"API Error fetching top artists: {response_data.get('error')}")
+    else:
+        logger.warning("Warning: 'data' key not found or not a list in Deezer Top Artists API response.")
+    return artists_info
+
+@stale_while_revalidate('chart')
 def get_top_artists(limit=10):
-    endpoint = f"{DEEZER_API_URL}/chart/0/artists"
+    endpoint = f"/chart/0/artists"
     params = {'limit': limit}
     artists_info = []
-    processed_artist_ids = set()
     logger.info(f"Requesting top {limit} artists chart from Deezer...")
     try:
-        response = requests.get(endpoint, params=params, timeout=10)
-        response.raise_for_status()
-        response_data = response.json()
-        if 'data' in response_data and isinstance(response_data['data'], list):
-            for artist_data in response_data['data']:
-                 if len(artists_info) >= limit: break
-                 if not isinstance(artist_data, dict): continue
-                 artist_id = artist_data.get('id')
-                 artist_name = artist_data.get('name')
-                 if not artist_id or not artist_name: continue
-                 if artist_id not in processed_artist_ids:
-                     artists_info.append((artist_name, artist_id, artist_data.get('picture_medium')))
-                     processed_artist_ids.add(artist_id)
-        elif 'error' in response_data:
-            logger.error(f"API Error fetching top artists: {response_data.get('error')}")
-        else:
-            logger.warning("Warning: 'data' key not found or not a list in Deezer Top Artists API response.")
+        response_data = deezer.get_json(endpoint, params=params)
+        artists_info = _parse_top_artists(response_data, limit)
+        prefix_index.remember_chart(artists=artists_info)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error making Deezer API request for top artists: {e}")
     except json.JSONDecodeError:
@@ -551,34 +869,38 @@ def get_top_artists(limit=10):
         logger.error(f"An unexpected error occurred fetching top artists: {e}", exc_info=True)
     return artists_info
 
+def _parse_top_playlists(response_data):
+    playlists_info = []
+    if 'data' in response_data and isinstance(response_data['data'], list):
+        for playlist_data in response_data['data']:
+             if not isinstance(playlist_data, dict): continue
+             playlist_id = playlist_data.get('id')
+             playlist_title = playlist_data.get('title')
+             if not playlist_id or not playlist_title: continue
+             user_data = playlist_data.get('user')
+             creator_name = user_data.get('name', 'Deezer') if user_data else 'Deezer'
+             description = playlist_data.get('description', '')
+             subtitle = description if description else f"By {creator_name}"
+             playlists_info.append({
+                 'id': playlist_id,
+                 'title': playlist_title,
+                 'picture_medium': playlist_data.get('picture_medium'),
+                 'subtitle': subtitle,
+                 'link': playlist_data.get('link')
+             })
+    elif 'error' in response_data:
+        logger.error(f"API Error fetching top playlists: {response_data.get('error')}")
+    return playlists_info
+
+@stale_while_revalidate('chart')
 def get_top_playlists(limit=10):
-    endpoint = f"{DEEZER_API_URL}/chart/0/playlists"
+    endpoint = f"/chart/0/playlists"
     params = {'limit': limit}
     playlists_info = []
     logger.info(f"Requesting top {limit} playlists chart from Deezer...")
     try:
-        response = requests.get(endpoint, params=params, timeout=10)
-        response.raise_for_status()
-        response_data = response.json()
-        if 'data' in response_data and isinstance(response_data['data'], list):
-            for playlist_data in response_data['data']:
-                 if not isinstance(playlist_data, dict): continue
-                 playlist_id = playlist_data.get('id')
-                 playlist_title = playlist_data.get('title')
-                 if not playlist_id or not playlist_title: continue
-                 user_data = playlist_data.get('user')
-                 creator_name = user_data.get('name', 'Deezer') if user_data else 'Deezer'
-                 description = playlist_data.get('description', '')
-                 subtitle = description if description else f"By {creator_name}"
-                 playlists_info.append({
-                     'id': playlist_id,
-                     'title': playlist_title,
-                     'picture_medium': playlist_data.get('picture_medium'),
-                     'subtitle': subtitle,
-                     'link': playlist_data.get('link')
-                 })
-        elif 'error' in response_data:
-            logger.error(f"API Error fetching top playlists: {response_data.get('error')}")
+        response_data = deezer.get_json(endpoint, params=params)
+        playlists_info = _parse_top_playlists(response_data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error (Playlists API): {e}")
     except json.JSONDecodeError:
@@ -587,35 +909,40 @@ def get_top_playlists(limit=10):
         logger.error(f"Unexpected error (Playlists API): {e}", exc_info=True)
     return playlists_info
 
+def _parse_top_tracks(response_data):
+    tracks_info = []
+    if 'data' in response_data and isinstance(response_data['data'], list):
+        for track_data in response_data['data']:
+             if not isinstance(track_data, dict): continue
+             track_id = track_data.get('id')
+             track_title = track_data.get('title_short') or track_data.get('title')
+             artist_data = track_data.get('artist')
+             album_data = track_data.get('album')
+             duration_seconds = track_data.get('duration')
+             if not all([track_id, track_title, artist_data, album_data, duration_seconds is not None]): continue
+             tracks_info.append({
+                 'id': track_id,
+                 'title': track_title,
+                 'artist_name': artist_data.get('name', 'Unknown Artist'),
+                 'album_cover_medium': album_data.get('cover_medium'),
+                 'duration_formatted': format_duration_helper(duration_seconds),
+                 'preview_url': track_data.get('preview'),
+                 'duration_seconds': duration_seconds
+             })
+    elif 'error' in response_data:
+        logger.error(f"API Error fetching top tracks: {response_data.get('error')}")
+    return tracks_info
+
+@stale_while_revalidate('chart')
 def get_top_tracks(limit=10):
-    endpoint = f"{DEEZER_API_URL}/chart/0/tracks"
+    endpoint = f"/chart/0/tracks"
     params = {'limit': limit}
     tracks_info = []
     logger.info(f"Requesting top {limit} tracks chart from Deezer...")
     try:
-        response = requests.get(endpoint, params=params, timeout=10)
-        response.raise_for_status()
-        response_data = response.json()
-        if 'data' in response_data and isinstance(response_data['data'], list):
-            for track_data in response_data['data']:
-                 if not isinstance(track_data, dict): continue
-                 track_id = track_data.get('id')
-                 track_title = track_data.get('title_short') or track_data.get('title')
-                 artist_data = track_data.get('artist')
-                 album_data = track_data.get('album')
-                 duration_seconds = track_data.get('duration')
-                 if not all([track_id, track_title, artist_data, album_data, duration_seconds is not None]): continue
-                 tracks_info.append({
-                     'id': track_id,
-                     'title': track_title,
-                     'artist_name': artist_data.get('name', 'Unknown Artist'),
-                     'album_cover_medium': album_data.get('cover_medium'),
-                     'duration_formatted': format_duration_helper(duration_seconds),
-                     'preview_url': track_data.get('preview'),
-                     'duration_seconds': duration_seconds
-                 })
-        elif 'error' in response_data:
-            logger.error(f"API Error fetching top tracks: {response_data.get('error')}")
+        response_data = deezer.get_json(endpoint, params=params)
+        tracks_info = _parse_top_tracks(response_data)
+        prefix_index.remember_chart(tracks=tracks_info)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error (Tracks API): {e}")
     except json.JSONDecodeError:
@@ -624,86 +951,181 @@ def get_top_tracks(limit=10):
         logger.error(f"Unexpected error (Tracks API): {e}", exc_info=True)
     return tracks_info
 
-def search_deezer(query, limit_tracks=10, limit_artists=6, limit_albums=6):
+def _parse_search_items(items, limit_tracks, limit_artists, limit_albums):
     search_results = {'tracks': [], 'artists': [], 'albums': []}
-    search_endpoint = f"{DEEZER_API_URL}/search"
-    params = {'q': query, 'limit': max(limit_tracks, limit_artists, limit_albums) + 15} 
-    logger.info(f"Searching Deezer for: '{query}'")
-    try:
-        response = requests.get(search_endpoint, params=params, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        if 'data' in data and isinstance(data['data'], list):
-            for item in data['data']:
-                item_type = item.get('type')
-                if item_type == 'track' and len(search_results['tracks']) < limit_tracks:
-                    artist_data = item.get('artist')
-                    album_data = item.get('album')
-                    duration_seconds = item.get('duration')
-                    if not all([item.get('id'), item.get('title'), artist_data, album_data, duration_seconds is not None]): continue
-                    search_results['tracks'].append({
-                        'id': item.get('id'),
-                        'title': item.get('title_short') or item.get('title'),
-                        'artist_name': artist_data.get('name'),
-                        'artist_id': artist_data.get('id'),
-                        'album_cover_medium': album_data.get('cover_medium'),
-                        'duration_formatted': format_duration_helper(duration_seconds),
-                        'preview_url': item.get('preview'),
-                        'rank': item.get('rank'),
-                        'duration_seconds': duration_seconds
-                    })
-                elif item_type == 'artist' and len(search_results['artists']) < limit_artists:
-                    if not item.get('id') or not item.get('name'): continue
-                    search_results['artists'].append({
-                        'id': item.get('id'),
-                        'name': item.get('name'),
-                        'picture_medium': item.get('picture_medium'),
-                    })
-                elif item_type == 'album' and len(search_results['albums']) < limit_albums:
-                     artist_data = item.get('artist')
-                     if not item.get('id') or not item.get('title') or not artist_data: continue
-                     search_results['albums'].append({
-                        'id': item.get('id'),
-                        'title': item.get('title'),
-                        'picture_medium': item.get('cover_medium'),
-                        'artist_name': artist_data.get('name'),
-                        'artist_id': artist_data.get('id'),
-                     })
-        elif 'error' in data:
-             logger.error(f"Search API Error for query '{query}': {data.get('error')}")
-             return None 
-        else:
-             logger.warning(f"Warning: 'data' key not found or not a list in Deezer Search API response for query '{query}'.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error making Deezer Search API request for query '{query}': {e}")
+    for item in items:
+        if not isinstance(item, dict): continue
+        item_type = item.get('type')
+        if item_type == 'track' and len(search_results['tracks']) < limit_tracks:
+            artist_data = item.get('artist')
+            album_data = item.get('album')
+            duration_seconds = item.get('duration')
+            if not all([item.get('id'), item.get('title'), artist_data, album_data, duration_seconds is not None]): continue
+            search_results['tracks'].append({
+                'id': item.get('id'),
+                'title': item.get('title_short') or item.get('title'),
+                'artist_name': artist_data.get('name'),
+                'artist_id': artist_data.get('id'),
+                'album_cover_medium': album_data.get('cover_medium'),
+                'duration_formatted': format_duration_helper(duration_seconds),
+                'preview_url': item.get('preview'),
+                'rank': item.get('rank'),
+                'duration_seconds': duration_seconds
+            })
+        elif item_type == 'artist' and len(search_results['artists']) < limit_artists:
+            if not item.get('id') or not item.get('name'): continue
+            search_results['artists'].append({
+                'id': item.get('id'),
+                'name': item.get('name'),
+                'picture_medium': item.get('picture_medium'),
+            })
+        elif item_type == 'album' and len(search_results['albums']) < limit_albums:
+             artist_data = item.get('artist')
+             if not item.get('id') or not item.get('title') or not artist_data: continue
+             search_results['albums'].append({
+                'id': item.get('id'),
+                'title': item.get('title'),
+                'picture_medium': item.get('cover_medium'),
+                'artist_name': artist_data.get('name'),
+                'artist_id': artist_data.get('id'),
+             })
+    return search_results
+
+def _search_requests(query, limit_tracks, limit_artists, limit_albums):
+    """
+    Endpoint/params pairs for a search. /search only returns tracks; artists
+    and albums come from their own endpoints and are fetched concurrently.
+    """
+    search_requests = {'track': ("/search", {'q': query, 'limit': max(limit_tracks, limit_artists, limit_albums) + 15})}
+    if limit_artists:
+        search_requests['artist'] = ("/search/artist", {'q': query, 'limit': limit_artists})
+    if limit_albums:
+        search_requests['album'] = ("/search/album", {'q': query, 'limit': limit_albums})
+    return search_requests
+
+def _parse_search_responses(query, responses, limit_tracks, limit_artists, limit_albums):
+    """Parses the responses (None when failed or late) of the _search_requests() fetches; None when /search failed."""
+    data = responses.pop('track')
+    if data is None:
+        logger.error(f"Deezer Search API request for query '{query}' failed or timed out.")
         return None
-    except json.JSONDecodeError:
-        logger.error(f"Error decoding JSON from Deezer Search API for query '{query}'.")
+    if 'error' in data:
+        logger.error(f"Search API Error for query '{query}': {data.get('error')}")
         return None
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during Deezer search for query '{query}': {e}", exc_info=True)
+    if not isinstance(data.get('data'), list):
+        logger.warning(f"Warning: 'data' key not found or not a list in Deezer Search API response for query '{query}'.")
+        return {'tracks': [], 'artists': [], 'albums': []}
+    items = list(data['data'])
+    for secondary_data in responses.values():
+        if isinstance(secondary_data, dict):
+            items.extend(secondary_data.get('data', []))
+    return _parse_search_items(items, limit_tracks, limit_artists, limit_albums)
+
+def search_deezer(query, limit_tracks=10, limit_artists=6, limit_albums=6, timeout=None):
+    """
+    Searches tracks, artists and albums as sibling fan-out tasks, each a
+    single Deezer call, given up on after `timeout` seconds (the fan-out
+    deadline by default). Tasks never wait on other pool tasks, so a late
+    search holds one worker per call and no more.
+    """
+    logger.info(f"Searching Deezer for: '{query}'")
+    responses = deezer.gather({
+        item_type: functools.partial(deezer.get_json, endpoint, params=params)
+        for item_type, (endpoint, params) in _search_requests(query, limit_tracks, limit_artists, limit_albums).items()
+    }, timeout=timeout)
+    return _parse_search_responses(query, responses, limit_tracks, limit_artists, limit_albums)
+
+def _merge_local_tracks(search_results, local_tracks, limit_tracks):
+    """
+    Merges local catalog hits into Deezer search results: local hits the
+    user liked come first, then Deezer's tracks, then the other local hits,
+    without duplicates. Without Deezer results (error or deadline) the
+    local hits are returned on their own.
+    """
+    if search_results is None and not local_tracks:
         return None
-    return search_results
+    merged = dict(search_results or {'tracks': [], 'artists': [], 'albums': []})
+    liked_local = [track for track in local_tracks if track.get('is_liked')]
+    other_local = [track for track in local_tracks if not track.get('is_liked')]
+    tracks, seen_ids = [], set()
+    for track in liked_local + list(merged.get('tracks', [])) + other_local:
+        if str(track.get('id')) not in seen_ids:
+            seen_ids.add(str(track.get('id')))
+            tracks.append(track)
+    merged['tracks'] = tracks[:limit_tracks]
+    return merged
+
+def _needs_local_tracks(cached_results, limit_tracks):
+    """False when the search cache already holds a full page of tracks, so the full-text query can be skipped."""
+    return cached_results is None or len(cached_results.get('tracks', [])) < limit_tracks
+
+def _local_search_deadline(local_tracks):
+    """How long to wait for Deezer: not past SEARCH_LOCAL_DEEZER_DEADLINE once local hits can be shown."""
+    return getattr(settings, 'SEARCH_LOCAL_DEEZER_DEADLINE', 1.5) if local_tracks else None
+
+def search_catalog(request, query, limit_tracks=10, limit_artists=6, limit_albums=6):
+    """search_deezer() merged with local catalog hits for the current user."""
+    user_id = request.user.pk if request.user.is_authenticated else None
+    local_tracks = local_search.search_songs(query, limit_tracks, user_id)
+    search_results = search_deezer(query, limit_tracks, limit_artists, limit_albums, timeout=_local_search_deadline(local_tracks))
+    return _merge_local_tracks(search_results, local_tracks, limit_tracks)
+
+def _parse_artist(artist_data):
+    return {
+        'id': artist_data.get('id'), 'name': artist_data.get('name'),
+        'picture_small': artist_data.get('picture_small'), 'picture_medium': artist_data.get('picture_medium'),
+        'picture_big': artist_data.get('picture_big'), 'picture_xl': artist_data.get('picture_xl'),
+        'nb_album': artist_data.get('nb_album'), 'nb_fan': artist_data.get('nb_fan'),
+        'link': artist_data.get('link')
+    }
+
+def _parse_artist_top_tracks(tracks_data, artist_details):
+    top_tracks = []
+    artist_id = artist_details.get('id')
+    if 'data' in tracks_data and isinstance(tracks_data['data'], list):
+        for track_data in tracks_data['data']:
+             if not isinstance(track_data, dict): continue
+             track_id = track_data.get('id')
+             track_title = track_data.get('title_short') or track_data.get('title')
+             duration_seconds = track_data.get('duration')
+             album_data = track_data.get('album')
+             rank = track_data.get('rank')
+             if not track_id or not track_title or not album_data: continue 
+             top_tracks.append({
+                 'id': track_id, 'title': track_title,
+                 'artist_name': artist_details.get('name'), 
+                 'album_cover_medium': album_data.get('cover_medium'),
+                 'duration_formatted': format_duration_helper(duration_seconds), 
+                 'preview_url': track_data.get('preview'),
+                 'rank': rank, 
+                 'duration_seconds': duration_seconds 
+             })
+    elif 'error' in tracks_data:
+         logger.error(f"API Error fetching artist top tracks for artist ID {artist_id}: {tracks_data.get('error')}")
+    else:
+         logger.warning(f"Warning: 'data' key not found or not a list in Deezer Artist Top Tracks response for artist ID {artist_id}.")
+    return top_tracks
 
+@last_known_good()
 def get_artist_details(artist_id):
     artist_details = None
     top_tracks = []
-    artist_endpoint = f"{DEEZER_API_URL}/artist/{artist_id}"
-    logger.info(f"Requesting artist details from: {artist_endpoint}")
+    artist_endpoint = f"/artist/{artist_id}"
+    top_tracks_endpoint = f"/artist/{artist_id}/top"
+    params_top = {'limit': 10}
+    logger.info(f"Requesting artist details and top tracks from: {artist_endpoint}")
+    deadline = time.monotonic() + deezer.fanout_deadline()
+    artist_future = deezer.submit(deezer.get_json, artist_endpoint)
+    top_tracks_future = deezer.submit(deezer.get_json, top_tracks_endpoint, params=params_top)
     try:
-        response_artist = requests.get(artist_endpoint, timeout=10)
-        response_artist.raise_for_status()
-        artist_data = response_artist.json()
+        artist_data = artist_future.result(timeout=max(deadline - time.monotonic(), 0))
         if 'error' in artist_data:
              logger.error(f"API Error fetching artist details for ID {artist_id}: {artist_data.get('error')}")
              return None
-        artist_details = {
-            'id': artist_data.get('id'), 'name': artist_data.get('name'),
-            'picture_small': artist_data.get('picture_small'), 'picture_medium': artist_data.get('picture_medium'),
-            'picture_big': artist_data.get('picture_big'), 'picture_xl': artist_data.get('picture_xl'),
-            'nb_album': artist_data.get('nb_album'), 'nb_fan': artist_data.get('nb_fan'),
-            'link': artist_data.get('link')
-        }
+        artist_details = _parse_artist(artist_data)
+    except FuturesTimeoutError:
+        logger.error(f"Artist details (ID: {artist_id}) missed the fan-out deadline.")
+        return None
     except requests.exceptions.RequestException as e:
         logger.error(f"Error making Deezer API request for artist details (ID: {artist_id}): {e}")
         return None
@@ -714,85 +1136,62 @@ def get_artist_details(artist_id):
         logger.error(f"An unexpected error occurred fetching artist details (ID: {artist_id}): {e}", exc_info=True)
         return None
     if not artist_details: return None
-    top_tracks_endpoint = f"{DEEZER_API_URL}/artist/{artist_id}/top"
-    params_top = {'limit': 10}
-    logger.info(f"Requesting artist top tracks from: {top_tracks_endpoint}")
     try:
-        response_tracks = requests.get(top_tracks_endpoint, params=params_top, timeout=10)
-        response_tracks.raise_for_status()
-        tracks_data = response_tracks.json()
-        if 'data' in tracks_data and isinstance(tracks_data['data'], list):
-            for track_data in tracks_data['data']:
-                 if not isinstance(track_data, dict): continue
-                 track_id = track_data.get('id')
-                 track_title = track_data.get('title_short') or track_data.get('title')
-                 duration_seconds = track_data.get('duration')
-                 album_data = track_data.get('album')
-                 rank = track_data.get('rank')
-                 if not track_id or not track_title or not album_data: continue 
-                 top_tracks.append({
-                     'id': track_id, 'title': track_title,
-                     'artist_name': artist_details.get('name'), 
-                     'album_cover_medium': album_data.get('cover_medium'),
-                     'duration_formatted': format_duration_helper(duration_seconds), 
-                     'preview_url': track_data.get('preview'),
-                     'rank': rank, 
-                     'duration_seconds': duration_seconds 
-                 })
-        elif 'error' in tracks_data:
-             logger.error(f"API Error fetching artist top tracks for artist ID {artist_id}: {tracks_data.get('error')}")
-        else:
-             logger.warning(f"Warning: 'data' key not found or not a list in Deezer Artist Top Tracks response for artist ID {artist_id}.")
+        tracks_data = top_tracks_future.result(timeout=max(deadline - time.monotonic(), 0))
+        top_tracks = _parse_artist_top_tracks(tracks_data, artist_details)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error for artist top tracks (Artist ID: {artist_id}): {e}")
     except json.JSONDecodeError:
         logger.error(f"Error decoding JSON for artist top tracks (Artist ID: {artist_id}).")
+    except FuturesTimeoutError:
+        logger.warning(f"Artist top tracks (Artist ID: {artist_id}) missed the fan-out deadline; rendering without them.")
     except Exception as e:
         logger.error(f"Unexpected error fetching artist top tracks (Artist ID: {artist_id}): {e}", exc_info=True)
     artist_details['top_tracks'] = top_tracks
     return artist_details
 
+def _parse_deezer_playlist(playlist_data):
+    creator_data = playlist_data.get('creator', {})
+    tracks_data_list = playlist_data.get('tracks', {}).get('data', [])
+    playlist_details = {
+        'id': playlist_data.get('id'), 'title': playlist_data.get('title'),
+        'description': playlist_data.get('description'),
+        'duration_total_formatted': format_duration_helper(playlist_data.get('duration', 0)),
+        'nb_tracks': playlist_data.get('nb_tracks'), 'fans': playlist_data.get('fans'),
+        'link': playlist_data.get('link'), 'picture_small': playlist_data.get('picture_small'),
+        'picture_medium': playlist_data.get('picture_medium'), 'picture_big': playlist_data.get('picture_big'),
+        'picture_xl': playlist_data.get('picture_xl'),
+        'creator_name': creator_data.get('name', 'Deezer'), 'creator_id': creator_data.get('id'),
+        'tracks': []
+    }
+    for track_data in tracks_data_list:
+        if not isinstance(track_data, dict): continue
+        track_id = track_data.get('id')
+        track_title = track_data.get('title_short') or track_data.get('title')
+        artist_data = track_data.get('artist')
+        album_data = track_data.get('album')
+        duration_seconds = track_data.get('duration')
+        if not all([track_id, track_title, artist_data, album_data]): continue
+        playlist_details['tracks'].append({
+             'id': track_id, 'title': track_title,
+             'artist_name': artist_data.get('name', 'Unknown Artist'),
+             'album_cover_medium': album_data.get('cover_medium'),
+             'duration_formatted': format_duration_helper(duration_seconds),
+             'preview_url': track_data.get('preview'),
+             'duration_seconds': duration_seconds
+         })
+    return playlist_details
+
+@last_known_good()
 def get_deezer_playlist_details(playlist_id):
-    playlist_details = None
-    playlist_endpoint = f"{DEEZER_API_URL}/playlist/{playlist_id}"
+    playlist_endpoint = f"/playlist/{playlist_id}"
     logger.info(f"Requesting Deezer playlist details from: {playlist_endpoint}")
     try:
-        response = requests.get(playlist_endpoint, timeout=15)
-        response.raise_for_status()
-        playlist_data = response.json()
+        playlist_data = deezer.get_json(playlist_endpoint)
         if 'error' in playlist_data:
              logger.error(f"API Error fetching Deezer playlist details for ID {playlist_id}: {playlist_data.get('error')}")
              return None
-        creator_data = playlist_data.get('creator', {})
-        tracks_data_list = playlist_data.get('tracks', {}).get('data', [])
-        playlist_details = {
-            'id': playlist_data.get('id'), 'title': playlist_data.get('title'),
-            'description': playlist_data.get('description'),
-            'duration_total_formatted': format_duration_helper(playlist_data.get('duration', 0)),
-            'nb_tracks': playlist_data.get('nb_tracks'), 'fans': playlist_data.get('fans'),
-            'link': playlist_data.get('link'), 'picture_small': playlist_data.get('picture_small'),
-            'picture_medium': playlist_data.get('picture_medium'), 'picture_big': playlist_data.get('picture_big'),
-            'picture_xl': playlist_data.get('picture_xl'),
-            'creator_name': creator_data.get('name', 'Deezer'), 'creator_id': creator_data.get('id'),
-            'tracks': []
-        }
-        for track_data in tracks_data_list:
-            if not isinstance(track_data, dict): continue
-            track_id = track_data.get('id')
-            track_title = track_data.get('title_short') or track_data.get('title')
-            artist_data = track_data.get('artist')
-            album_data = track_data.get('album')
-            duration_seconds = track_data.get('duration')
-            if not all([track_id, track_title, artist_data, album_data]): continue
-            playlist_details['tracks'].append({
-                 'id': track_id, 'title': track_title,
-                 'artist_name': artist_data.get('name', 'Unknown Artist'),
-                 'album_cover_medium': album_data.get('cover_medium'),
-                 'duration_formatted': format_duration_helper(duration_seconds),
-                 'preview_url': track_data.get('preview'),
-                 'duration_seconds': duration_seconds
-             })
-        return playlist_details
+        return _parse_deezer_playlist(playlist_data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error (Deezer Playlist Details API ID: {playlist_id}): {e}")
         return None
@@ -803,6 +1202,69 @@ def get_deezer_playlist_details(playlist_id):
         logger.error(f"Unexpected error (Deezer Playlist Details API ID: {playlist_id}): {e}", exc_info=True)
         return None
 
+def _missing_top_track_artist_id(tracks, artists_from_search):
+    """
+    Returns the artist ID of the first track when that artist is not part of
+    the artist search results (and therefore needs its own lookup).
+    """
+    if not tracks or not tracks[0].get('artist_id'):
+        return None
+    top_track_artist_id_str = str(tracks[0].get('artist_id'))
+    for artist_from_search in artists_from_search:
+        if str(artist_from_search.get('id')) == top_track_artist_id_str:
+            return None
+    return top_track_artist_id_str
+
+def _prioritize_artists(tracks, artists_from_search, max_artists, detailed_artist=None):
+    final_artists_list = []
+    processed_artist_ids = set() 
+
+    if tracks: 
+        top_track = tracks[0]
+        top_track_artist_id = top_track.get('artist_id') 
+        top_track_artist_name = top_track.get('artist_name')
+
+        if top_track_artist_id:
+            top_track_artist_id_str = str(top_track_artist_id)
+            found_in_general_search = False
+            
+            for artist_from_search in artists_from_search:
+                if str(artist_from_search.get('id')) == top_track_artist_id_str:
+                    final_artists_list.append(artist_from_search)
+                    processed_artist_ids.add(top_track_artist_id_str)
+                    found_in_general_search = True
+                    logger.info(f"Prioritized top track artist '{top_track_artist_name}' (ID: {top_track_artist_id_str}) from general search.")
+                    break 
+            
+            if not found_in_general_search and len(final_artists_list) < max_artists:
+                if detailed_artist and detailed_artist.get('id'):
+                    artist_to_add = {
+                        'id': detailed_artist.get('id'),
+                        'name': detailed_artist.get('name'),
+                        'picture_medium': detailed_artist.get('picture_medium')
+                    }
+                    final_artists_list.append(artist_to_add)
+                    processed_artist_ids.add(str(detailed_artist.get('id')))
+                    logger.info(f"Added top track artist '{detailed_artist.get('name')}' after fetching details.")
+                else:
+                    logger.warning(f"Could not fetch details for top track artist ID: {top_track_artist_id_str}. Adding without picture if name exists.")
+                    if top_track_artist_name: 
+                        final_artists_list.append({
+                            'id': top_track_artist_id_str, 
+                            'name': top_track_artist_name, 
+                            'picture_medium': None
+                        })
+                        processed_artist_ids.add(top_track_artist_id_str)
+
+    for artist_from_search in artists_from_search:
+        if len(final_artists_list) >= max_artists:
+            break
+        artist_id_str = str(artist_from_search.get('id'))
+        if artist_id_str not in processed_artist_ids:
+            final_artists_list.append(artist_from_search)
+            processed_artist_ids.add(artist_id_str)
+    return final_artists_list
+
 def ajax_search_view(request):
     query = request.GET.get('q', None)
     results = {'tracks': [], 'artists': []}
@@ -810,8 +1272,17 @@ def ajax_search_view(request):
 
     if query and len(query.strip()) > 0:
         logger.info(f"AJAX search initiated for query: '{query}'")
-       
-        search_results_dict = search_deezer(query, limit_tracks=10, limit_artists=MAX_ARTISTS_DISPLAY, limit_albums=0) 
+        search_limits = (10, MAX_ARTISTS_DISPLAY, 0)
+        search_results_dict = get_search_cache().get(query, search_limits)
+        local_tracks = []
+        if _needs_local_tracks(search_results_dict, 10):
+            local_tracks = local_search.search_songs(query, 10, request.user.pk if request.user.is_authenticated else None)
+        if search_results_dict is None:
+            search_results_dict = search_deezer(query, 10, MAX_ARTISTS_DISPLAY, 0, timeout=_local_search_deadline(local_tracks))
+            if search_results_dict is not None:
+                get_search_cache().set(query, search_limits, search_results_dict)
+        # The search cache is shared by all users; local hits are per user, so merge after it.
+        search_results_dict = _merge_local_tracks(search_results_dict, local_tracks, 10)
 
         if search_results_dict:
             raw_tracks = search_results_dict.get('tracks', [])
@@ -819,59 +1290,13 @@ def ajax_search_view(request):
                 tracks_copy = list(raw_tracks) 
                 results['tracks'] = _add_is_liked_status_to_tracks(request, tracks_copy)
 
-            final_artists_list = []
-            processed_artist_ids = set() 
-
-            if results['tracks']: 
-                top_track = results['tracks'][0]
-                top_track_artist_id = top_track.get('artist_id') 
-                top_track_artist_name = top_track.get('artist_name')
-
-                if top_track_artist_id:
-                    top_track_artist_id_str = str(top_track_artist_id)
-                    found_in_general_search = False
-                    
-                    original_artists_from_search = search_results_dict.get('artists', [])
-                    for artist_from_search in original_artists_from_search:
-                        if str(artist_from_search.get('id')) == top_track_artist_id_str:
-                            final_artists_list.append(artist_from_search)
-                            processed_artist_ids.add(top_track_artist_id_str)
-                            found_in_general_search = True
-                            logger.info(f"Prioritized top track artist '{top_track_artist_name}' (ID: {top_track_artist_id_str}) from general search.")
-                            break 
-                    
-                    if not found_in_general_search and len(final_artists_list) < MAX_ARTISTS_DISPLAY:
-                        logger.info(f"Top track artist (ID: {top_track_artist_id_str}, Name: {top_track_artist_name}) not in general search. Fetching details.")
-                        detailed_artist = get_artist_details(top_track_artist_id_str) 
-                        if detailed_artist and detailed_artist.get('id'):
-                            artist_to_add = {
-                                'id': detailed_artist.get('id'),
-                                'name': detailed_artist.get('name'),
-                                'picture_medium': detailed_artist.get('picture_medium')
-                            }
-                            final_artists_list.append(artist_to_add)
-                            processed_artist_ids.add(str(detailed_artist.get('id')))
-                            logger.info(f"Added top track artist '{detailed_artist.get('name')}' after fetching details.")
-                        else:
-                            logger.warning(f"Could not fetch details for top track artist ID: {top_track_artist_id_str}. Adding without picture if name exists.")
-                            if top_track_artist_name: 
-                                final_artists_list.append({
-                                    'id': top_track_artist_id_str, 
-                                    'name': top_track_artist_name, 
-                                    'picture_medium': None
-                                })
-                                processed_artist_ids.add(top_track_artist_id_str)
-
-            original_artists_from_search = search_results_dict.get('artists', [])
-            for artist_from_search in original_artists_from_search:
-                if len(final_artists_list) >= MAX_ARTISTS_DISPLAY:
-                    break
-                artist_id_str = str(artist_from_search.get('id'))
-                if artist_id_str not in processed_artist_ids:
-                    final_artists_list.append(artist_from_search)
-                    processed_artist_ids.add(artist_id_str)
-            
-            results['artists'] = final_artists_list
+            artists_from_search = search_results_dict.get('artists', [])
+            detailed_artist = None
+            missing_artist_id = _missing_top_track_artist_id(results['tracks'], artists_from_search)
+            if missing_artist_id:
+                logger.info(f"Top track artist (ID: {missing_artist_id}) not in general search. Fetching details.")
+                detailed_artist = get_artist_details(missing_artist_id) 
+            results['artists'] = _prioritize_artists(results['tracks'], artists_from_search, MAX_ARTISTS_DISPLAY, detailed_artist)
             
             logger.info(f"AJAX search for '{query}' finalized. Tracks: {len(results['tracks'])}, Artists: {len(results['artists'])}.")
         else:
@@ -881,48 +1306,65 @@ def ajax_search_view(request):
     
     return JsonResponse(results)
 
+def ajax_instant_search_view(request):
+    """
+    Autocomplete answered from this worker's in-memory prefix index only,
+    without waiting on Deezer; the dropdown shows it while /api/search/ is
+    in flight. Returns an empty result while the index is being built.
+    """
+    query = request.GET.get('q', '')
+    index = prefix_index.get_prefix_index()
+    results = {'tracks': [], 'artists': [], 'instant': True, 'ready': index is not None}
+    if index is not None and query.strip():
+        results.update(index.lookup(query, limit_tracks=10, limit_artists=5))
+        if results['tracks']:
+            _add_is_liked_status_to_tracks(request, results['tracks'])
+    return JsonResponse(results)
+
+def _parse_new_release_albums(data):
+    albums_info = []
+    if 'data' in data and isinstance(data['data'], list):
+        for album_data in data['data']:
+            if not isinstance(album_data, dict):
+                continue
+            
+            artist_data = album_data.get('artist', {})
+            
+            album_info = {
+                'id': album_data.get('id'),
+                'title': album_data.get('title'),
+                'picture_medium': album_data.get('cover_medium'), 
+                'artist_name': artist_data.get('name', 'Various Artists'),
+                'artist_id': artist_data.get('id'),
+                'link': album_data.get('link'),
+                'release_date': album_data.get('release_date') 
+            }
+            if album_info['id'] and album_info['title']:
+                albums_info.append(album_info)
+            else:
+                logger.warning(f"Skipped new release album due to missing ID or title: {album_data}")
+        
+        logger.info(f"Fetched {len(albums_info)} new release albums.")
+    elif 'error' in data:
+        logger.error(f"API Error fetching new releases: {data.get('error')}")
+    else:
+        logger.warning(f"Warning: 'data' key not found or not a list in Deezer New Releases API response. Response: {data}")
+    return albums_info
+
+@stale_while_revalidate('editorial')
 def get_new_release_albums(limit=20):
     """
     Fetches new album releases from Deezer.
     """
     
-    endpoint = f"{DEEZER_API_URL}/editorial/0/releases"
+    endpoint = f"/editorial/0/releases"
     params = {'limit': limit}
     albums_info = []
     logger.info(f"Requesting {limit} new release albums from Deezer: {endpoint}")
 
     try:
-        response = requests.get(endpoint, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if 'data' in data and isinstance(data['data'], list):
-            for album_data in data['data']:
-                if not isinstance(album_data, dict):
-                    continue
-                
-                artist_data = album_data.get('artist', {})
-                
-                album_info = {
-                    'id': album_data.get('id'),
-                    'title': album_data.get('title'),
-                    'picture_medium': album_data.get('cover_medium'), 
-                    'artist_name': artist_data.get('name', 'Various Artists'),
-                    'artist_id': artist_data.get('id'),
-                    'link': album_data.get('link'),
-                    'release_date': album_data.get('release_date') 
-                }
-                if album_info['id'] and album_info['title']:
-                    albums_info.append(album_info)
-                else:
-                    logger.warning(f"Skipped new release album due to missing ID or title: {album_data}")
-            
-            logger.info(f"Fetched {len(albums_info)} new release albums.")
-        elif 'error' in data:
-            logger.error(f"API Error fetching new releases: {data.get('error')}")
-        else:
-            logger.warning(f"Warning: 'data' key not found or not a list in Deezer New Releases API response. Response: {data}")
-            
+        data = deezer.get_json(endpoint, params=params)
+        albums_info = _parse_new_release_albums(data)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error making Deezer API request for new releases: {e}")
     except json.JSONDecodeError:
@@ -947,9 +1389,34 @@ def new_releases_view(request):
         'api_error': not new_albums 
     }
     
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user).order_by('-id')
-    context['playlists'] = user_playlists
     
     return render(request, 'search.html', context)
+
+@staff_member_required
+def deezer_stats_view(request):
+    """Per-endpoint latency counters of the pooled Deezer client, plus cache hit rates and the slowest requests."""
+    return JsonResponse({
+        'endpoints': deezer.get_stats(),
+        'cache': caching.get_stats(),
+        'search_cache': get_search_cache().get_stats(),
+        'prefix_index': prefix_index.get_stats(),
+        'breaker': deezer.get_breaker().get_state(),
+        'slow_requests': timing.get_slow_requests(),
+    })
+
+def deezer_health_view(request):
+    """
+    Deezer circuit breaker state for monitoring. Always 200: the worker
+    itself is healthy (and serving cached pages) while the breaker is open.
+    """
+    return JsonResponse({'breaker': deezer.get_breaker().get_state()})
+
+def metrics_view(request):
+    """
+    Prometheus metrics (music/metrics.py), summed over the workers sharing
+    METRICS_DIR. When METRICS_TOKEN is set it must be sent as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,72 @@
+// Lazily appends keyset-paginated pages to a track list as its sentinel
+// element scrolls into view. The list carries data-page-url and, while more
+// pages exist, data-next-after; each page is JSON with the rendered rows in
+// `html` and the cursor of the following page in `next_after` (null at the end).
+function setupInfiniteScroll(listElement, sentinelElement, onPageAppended) {
+    if (!listElement || !sentinelElement || listElement.dataset.nextAfter === undefined) return;
+    let loading = false;
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+    }, { rootMargin: '600px 0px' });
+
+    function watchSentinel() {
+        // Re-observing fires the callback again if the sentinel is still in view.
+        observer.unobserve(sentinelElement);
+        observer.observe(sentinelElement);
+    }
+
+    async function loadNextPage() {
+        if (loading || listElement.dataset.nextAfter === undefined) return;
+        loading = true;
+        try {
+            const url = new URL(listElement.dataset.pageUrl, window.location.origin);
+            url.searchParams.set('after', listElement.dataset.nextAfter);
+            const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+            if (!response.ok) throw new Error(`Server error: ${response.status}`);
+            const data = await response.json();
+
+            const template = document.createElement('template');
+            template.innerHTML = data.html;
+            const newRows = Array.from(template.content.children);
+            listElement.append(template.content);
+
+            if (data.next_after === null || data.next_after === undefined) {
+                delete listElement.dataset.nextAfter;
+                observer.disconnect();
+            } else {
+                listElement.dataset.nextAfter = data.next_after;
+            }
+            if (typeof onPageAppended === 'function') onPageAppended(newRows);
+            loading = false;
+            if (listElement.dataset.nextAfter !== undefined) watchSentinel();
+        } catch (error) {
+            console.error('InfiniteScroll: Error loading the next page:', error);
+            if (typeof showFloatingNotification === 'function') {
+                showFloatingNotification('Could not load more songs. Retrying shortly...', 'error');
+            }
+            setTimeout(() => { loading = false; watchSentinel(); }, 5000);
+        }
+    }
+
+    observer.observe(sentinelElement);
+}
+
+// Binds the row buttons that are wired element by element rather than through a
+// delegated listener: like buttons (with `bindLikeButtons` when the page keeps its
+// own like state, handleLikeSong otherwise) and add-to-playlist buttons, whose
+// setup in add_to_playlist_modal.js only covers the rows present at load.
+function bindTrackRowActions(rows, bindLikeButtons) {
+    rows.forEach(row => {
+        const likeButtons = row.querySelectorAll('.like-button');
+        if (typeof bindLikeButtons === 'function') {
+            bindLikeButtons(likeButtons);
+        } else if (typeof handleLikeSong === 'function') {
+            likeButtons.forEach(button => button.addEventListener('click', handleLikeSong));
+        }
+    });
+    if (typeof window.setupAddToPlaylistButtons === 'function') window.setupAddToPlaylistButtons();
+}
+
+window.setupInfiniteScroll = setupInfiniteScroll;
+window.bindTrackRowActions = bindTrackRowActions;
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchForm = document.getElementById('search-form'); 
 
     let debounceTimer;
+    let latestQuery = null; // Responses for anything else arrived out of order and are dropped.
 
     if (!searchInputField || !resultsContainer || !searchForm) {
         console.error("Search page specific elements (input, results container, or form) not found.");
@@ -26,6 +27,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const query = this.value.trim();
 
         if (query.length === 0) {
+            latestQuery = null;
             clearResults();
             showInitialBrowseContent();
             return;
@@ -35,14 +37,38 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
+        latestQuery = query;
+        performInstantSearch(query);
         debounceTimer = setTimeout(() => {
             performLiveSearch(query);
         }, 500); 
     });
 
+    // Local prefix-index results, shown on every keystroke until the debounced
+    // full search (which also asks Deezer) comes back and replaces them.
+    async function performInstantSearch(query) {
+        const instantUrl = window.appUrls && window.appUrls.ajaxInstantSearch
+                           ? `${window.appUrls.ajaxInstantSearch}?q=${encodeURIComponent(query)}`
+                           : `/api/search/instant/?q=${encodeURIComponent(query)}`;
+        try {
+            const response = await fetch(instantUrl);
+            if (!response.ok) return;
+            const data = await response.json();
+            if (query !== latestQuery || !data.ready) return;
+            if ((data.tracks && data.tracks.length) || (data.artists && data.artists.length)) {
+                renderResults(data, query);
+            }
+        } catch (error) {
+            console.warn("Instant search failed; waiting for the full search.", error);
+        }
+    }
+
     async function performLiveSearch(query) {
         console.log(`Performing live search for: ${query}`);
-        resultsContainer.innerHTML = '<p style="color: var(--text-muted); text-align: center;">Searching...</p>';
+        latestQuery = query;
+        if (!resultsContainer.querySelector('.track-item, .artist-card')) {
+            resultsContainer.innerHTML = '<p style="color: var(--text-muted); text-align: center;">Searching...</p>';
+        }
 
         const searchUrl = window.appUrls && window.appUrls.ajaxSearch 
                           ? `${window.appUrls.ajaxSearch}?q=${encodeURIComponent(query)}`
@@ -59,8 +85,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(errorMsg);
             }
             const data = await response.json();
+            if (query !== latestQuery) return;
             renderResults(data, query);
         } catch (error) {
+            if (query !== latestQuery) return;
             console.error("Error during live search:", error);
             resultsContainer.innerHTML = `<p style="color: var(--text-muted); text-align: center;">Error fetching results: ${error.message}. Please try again.</p>`;
         }